@@ -16,9 +16,11 @@
 
 import gymnasium
 from .envs.v1.qwop_env import QwopEnv
+from .envs.v1.qwop_vec_env import QwopVecEnv
+from .envs.v1.async_qwop_env import AsyncQwopEnv
 from .wrappers.verbose_wrapper import VerboseWrapper
 from .wrappers.record_wrapper import RecordWrapper
 
-all = [QwopEnv, VerboseWrapper, RecordWrapper]
+all = [QwopEnv, QwopVecEnv, AsyncQwopEnv, VerboseWrapper, RecordWrapper]
 
 gymnasium.register(id="QWOP-v1", entry_point="qwop_gym:QwopEnv")
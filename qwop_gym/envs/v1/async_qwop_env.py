@@ -0,0 +1,168 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import io
+import asyncio
+import numpy as np
+import PIL.Image
+
+from .util.wsproto import WSProto, to_bytes
+from .util.wsclient import AsyncWSClient, AsyncWSClientMock
+from .util.metrics import AsyncMeteredClient
+from .qwop_env import (
+    QwopEnv,
+    BYTES_RELOAD,
+    BYTES_SEED,
+    BYTES_RESET,
+    BYTES_DRAW,
+    BYTES_RENDER,
+    INT_IMG,
+    INT_JPG,
+)
+
+
+class _QwopState(QwopEnv):
+    # The game state and the (non-I/O) logic of an AsyncQwopEnv: action
+    # encoding, observation parsing, rewards. Its client is asynchronous,
+    # so the inherited sync reset/step/render/close must not be called.
+    client_cls = AsyncWSClient
+    client_mock_cls = AsyncWSClientMock
+    metered_client_cls = AsyncMeteredClient
+
+
+class AsyncQwopEnv:
+    """
+    An asyncio-native counterpart of QwopEnv: `reset`, `step`, `render`
+    and `close` are coroutines, so a single thread can drive many envs
+    (ie. browsers) concurrently, without a subprocess per env:
+
+        obs, info = await env.reset()
+        obs, rew, term, trunc, info = await env.step(action)
+
+    To fan out actions to many envs and gather the results as they arrive,
+    use `step_async` (which sends the action right away) and `step_wait`:
+
+        for env, action in zip(envs, actions):
+            env.step_async(action)
+
+        results = await asyncio.gather(*[env.step_wait() for env in envs])
+
+    As its methods are coroutines, this is not a gym.Env (and can't be
+    used with gym wrappers). Only the "relay" transport is supported, with
+    neither wire capture nor replay (see QwopEnv's `capture_file`) nor a
+    synthetic game. The constructor arguments are the same as QwopEnv's.
+    """
+
+    metadata = QwopEnv.metadata
+
+    def __init__(self, *args, transport="relay", **kwargs):
+        if transport != "relay":
+            raise ValueError("AsyncQwopEnv supports the relay transport only")
+
+        if kwargs.get("capture_file"):
+            raise ValueError("AsyncQwopEnv does not support capture_file")
+
+        if isinstance(kwargs.get("browser_mock"), str):
+            raise ValueError(
+                "AsyncQwopEnv does not support replayed or synthetic games,"
+                " only browser_mock=True"
+            )
+
+        self.qwop = _QwopState(*args, transport=transport, **kwargs)
+        self.client = self.qwop.client
+        self.action_space = self.qwop.action_space
+        self.observation_space = self.qwop.observation_space
+        self.render_mode = self.qwop.render_mode
+        self.pending_step = None
+
+    async def reset(self, seed=None, options=None):
+        reload_page, reseed = self.qwop._begin_reset(seed)
+        reaction = await self._restart_game(reload_page, reseed)
+        return reaction.ndata, self.qwop._build_info(reaction)
+
+    async def _restart_game(self, reload_page=False, reseed=False):
+        qwop = self.qwop
+        autoreset_data = qwop.autoreset_data
+        qwop.autoreset_data = None
+
+        if autoreset_data and not (reload_page or reseed):
+            # the game was already reset by the browser
+            return qwop._parse_obs(autoreset_data, 0)
+
+        if reload_page:
+            data = await self.client.send(BYTES_RELOAD + to_bytes(qwop.seedval, 4))
+            assert data[0] == WSProto.H_ACK, f"expected an ACK header, got: {data[0]}"
+
+        if reseed:
+            # restarts the game as well
+            data = await self.client.send(BYTES_SEED + to_bytes(qwop.seedval, 4))
+            return qwop._build_reaction(data)
+
+        return qwop._build_reaction(await self.client.send(BYTES_RESET))
+
+    async def step(self, action, out=None):
+        qwop = self.qwop
+
+        if qwop.terminal_return is not None:
+            return qwop.terminal_return
+
+        qwop.steps += 1
+        data = await self.client.send(qwop._encode_action(action))
+        return qwop._complete_step(action, qwop._build_reaction(data, out))
+
+    def step_async(self, action, out=None):
+        """
+        Starts a step in the background (requires a running event loop).
+        Its result is returned by `.step_wait()`.
+        """
+        assert self.pending_step is None, "a step is already in progress"
+        self.pending_step = asyncio.ensure_future(self.step(action, out))
+
+    async def step_wait(self):
+        """Waits for the step started by `.step_async()` and returns its result."""
+        assert self.pending_step is not None, "no step in progress"
+
+        try:
+            return await self.pending_step
+        finally:
+            self.pending_step = None
+
+    async def render(self):
+        match self.render_mode:
+            case "rgb_array":
+                return await self.render_rgb()
+            case "browser":
+                await self.client.send(BYTES_DRAW)
+            case _:
+                return self.qwop.render()
+
+    async def render_rgb(self):
+        data = await self.client.send(BYTES_RENDER)
+        assert data[0] == INT_IMG, f"expected an IMG header, got: {data[0]}"
+        assert data[1] == INT_JPG, f"expected JPEG format, got: {data[1]}"
+        return np.array(PIL.Image.open(io.BytesIO(data[2:])))
+
+    async def close(self):
+        if self.pending_step:
+            self.pending_step.cancel()
+
+        await self.client.close()
+        qwop = self.qwop
+
+        if qwop.proc and qwop.proc.is_alive():
+            qwop.shutdown.set()
+            qwop.proc.join(timeout=2)
+            qwop.proc.terminate()
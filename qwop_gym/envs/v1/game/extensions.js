@@ -74,6 +74,23 @@ const CONFIG = {
 
     // Display the game window itself
     "game": urlparam_bool("game", true),
+
+    // Index of this game when embedded in QWOPVec.html (-1 if standalone)
+    "index": urlparam_int("index", -1),
+
+    // Reset the game right after a step ends it (see WS.handle_cmd)
+    "autoreset": urlparam_bool("autoreset", false),
+
+    // Session id, used to route messages when connected to a WSHub
+    "session": urlparam_int("session", 0),
+
+    // Physics-only mode: the game is never painted (unless requested)
+    "headless": urlparam_bool("headless", false),
+}
+
+// No DOM updates on each step in physics-only mode
+if (CONFIG.headless) {
+    CONFIG.stat = false;
 }
 
 /** Advances N timesteps in the game. */
@@ -101,11 +118,243 @@ function FN_STEP_AND_DRAW() {
 // explanation, but calling on_internal_update seems to fix it
 /** Restarts the game */
 function FN_RESET() {
+    // The draws made before the first reset must be replayed on reseed
+    if (RNG.boot_draws === null) {
+        RNG.boot_draws = RNG.draws;
+    }
+
     START_TIME = new Date();
     CORE.game.reset();
     CORE.app.host.on_internal_update();
 }
 
+/**
+ * Seeds Math.random(), counting the numbers drawn from it.
+ * @param {int} seed
+ */
+function FN_SEED(seed) {
+    // {state: true} allows to snapshot the RNG state
+    Math.seedrandom(seed, {state: true});
+    RNG.draws = 0;
+    count_draws();
+}
+
+/** Wraps Math.random() to count the numbers drawn from it. */
+function count_draws() {
+    const prng = RNG.prng = Math.random;
+
+    Math.random = function() {
+        RNG.draws++;
+        return prng();
+    };
+}
+
+/**
+ * Reseeds Math.random() as if the page was loaded with the given seed,
+ * i.e. also replays the numbers drawn during page load. The game must be
+ * reset afterwards.
+ * @param {int} seed
+ */
+function FN_RESEED(seed) {
+    if (RNG.boot_draws === null) {
+        RNG.boot_draws = RNG.draws;
+    }
+
+    CONFIG.seed = seed;
+    FN_SEED(seed);
+
+    for (let i = RNG.boot_draws; i--; ) {
+        Math.random();
+    }
+}
+
+/** Returns the physics body of a game object (eg. a body part). */
+function body(obj) {
+    return obj._components.get("physicsBody", false);
+}
+
+/** Returns the physics world all bodyparts live in. */
+function world() {
+    return body(CORE.game.torso).getWorld();
+}
+
+/**
+ * Returns the items of a physics world's linked list (bodies, joints or
+ * contacts), in the (deterministic) order the world keeps them in.
+ */
+function linked(first) {
+    const items = [];
+
+    for (let item = first; item; item = item.getNext()) {
+        items.push(item);
+    }
+
+    return items;
+}
+
+const PRIMITIVES = ["number", "boolean", "string"];
+
+/** Returns the primitive (own) fields of an object. */
+function primitives(obj) {
+    const fields = {};
+
+    for (const [k, v] of Object.entries(obj)) {
+        if (PRIMITIVES.includes(typeof v)) {
+            fields[k] = v;
+        }
+    }
+
+    return fields;
+}
+
+/**
+ * Captures a joint's state: its motor and limits (set by the keys) and the
+ * impulses accumulated by the solver (used to warm-start the next step).
+ */
+function joint_state(j) {
+    const imp = j.m_impulse;
+    return [
+        j.m_enableMotor, j.m_motorSpeed, j.m_maxMotorTorque, j.m_motorImpulse,
+        j.m_enableLimit, j.m_lowerAngle, j.m_upperAngle, j.m_limitState,
+        imp.x, imp.y, imp.z,
+    ];
+}
+
+function set_joint_state(j, s) {
+    [
+        j.m_enableMotor, j.m_motorSpeed, j.m_maxMotorTorque, j.m_motorImpulse,
+        j.m_enableLimit, j.m_lowerAngle, j.m_upperAngle, j.m_limitState,
+        j.m_impulse.x, j.m_impulse.y, j.m_impulse.z,
+    ] = s;
+}
+
+/**
+ * Captures the touching contacts: the bodies involved (as indexes into the
+ * world's body list) and the impulses of each contact point.
+ */
+function contact_states(bodies) {
+    return linked(world().getContactList())
+        .filter((c) => c.isTouching())
+        .map((c) => {
+            const m = c.getManifold();
+            const points = m.m_points.slice(0, m.m_pointCount).map((p) => (
+                [p.m_normalImpulse, p.m_tangentImpulse]
+            ));
+
+            return [contact_key(c, bodies), m.m_pointCount, points];
+        });
+}
+
+function contact_key(c, bodies) {
+    const a = bodies.indexOf(c.getFixtureA().getBody());
+    const b = bodies.indexOf(c.getFixtureB().getBody());
+    return `${a}:${b}`;
+}
+
+/**
+ * Restores the contact impulses captured by contact_states(). Contacts not
+ * found in the world are created by the next step's collision detection,
+ * but without their warm-starting impulses.
+ */
+function set_contact_states(states, bodies) {
+    const contacts = new Map(
+        linked(world().getContactList()).map((c) => [contact_key(c, bodies), c])
+    );
+
+    for (const [key, count, points] of states) {
+        const c = contacts.get(key);
+
+        if (!c) {
+            console.log("Contact not found on restore: ", key);
+            continue;
+        }
+
+        const m = c.getManifold();
+        m.m_pointCount = count;
+
+        points.forEach(([normal, tangent], i) => {
+            m.m_points[i].m_normalImpulse = normal;
+            m.m_points[i].m_tangentImpulse = tangent;
+        });
+    }
+}
+
+/**
+ * Captures the game state, ie. the state of the bodyparts' physics bodies,
+ * joints and contacts, the game's primitive fields (timers, flags, etc.),
+ * the primitive fields of its objects (eg. nested timers) and the RNG state.
+ * @return {Object} A JSON-serializable object.
+ */
+function FN_SNAPSHOT() {
+    const bodies = OBS_PARTS.map((p) => {
+        const b = body(CORE.game[p]);
+        const pos = b.getPosition();
+        const vel = b.getLinearVelocity();
+        return [pos.x, pos.y, b.getAngle(), vel.x, vel.y, b.getAngularVelocity()];
+    });
+
+    const game = primitives(CORE.game);
+    const nested = {};
+
+    for (const [k, v] of Object.entries(CORE.game)) {
+        if (v && typeof v === "object" && !Array.isArray(v) && !v._components) {
+            nested[k] = primitives(v);
+        }
+    }
+
+    const w = world();
+    const world_bodies = linked(w.getBodyList());
+
+    return {
+        bodies: bodies,
+        joints: linked(w.getJointList()).map(joint_state),
+        contacts: contact_states(world_bodies),
+        game: game,
+        nested: nested,
+        rng: RNG.prng.state(),
+        draws: RNG.draws,
+    };
+}
+
+/**
+ * Restores a game state captured by FN_SNAPSHOT().
+ * @param {Object} state
+ */
+function FN_RESTORE(state) {
+    state.bodies.forEach(([x, y, angle, vx, vy, av], i) => {
+        const b = body(CORE.game[OBS_PARTS[i]]);
+        const pos = b.getPosition().copy();
+        const vel = b.getLinearVelocity().copy();
+
+        pos.x = x, pos.y = y;
+        vel.x = vx, vel.y = vy;
+
+        b.setPositionAndAngle(pos, angle);
+        b.setLinearVelocity(vel);
+        b.setAngularVelocity(av);
+        b.setAwake(true);
+    });
+
+    const w = world();
+    const joints = linked(w.getJointList());
+    state.joints.forEach((s, i) => set_joint_state(joints[i], s));
+
+    // the contacts of the restored positions must exist before their
+    // impulses can be restored
+    w.m_contactManager.findNewContacts();
+    set_contact_states(state.contacts, linked(w.getBodyList()));
+
+    Object.assign(CORE.game, state.game);
+
+    for (const [k, fields] of Object.entries(state.nested)) {
+        Object.assign(CORE.game[k], fields);
+    }
+
+    Math.seedrandom("", {state: state.rng});
+    RNG.draws = state.draws;
+    count_draws();
+}
+
 /**
  * Gathers observation for the current state
  * @return {DataView} Raw observation data:
@@ -169,7 +418,7 @@ function FN_OBSERVATION() {
     let byte = 10;
 
     for (const bodypart of bodyparts) {
-        const b = bodypart._components.get("physicsBody", false);
+        const b = body(bodypart);
         const pos = b.getPosition();
         const ang = b.getAngle();
         const vel = b.getLinearVelocity();
@@ -254,8 +503,12 @@ function FN_UPDATE_STATS(dv_in, dv_out) {
 // Main
 //
 
+// The seeded Math.random() and the number of draws since seeded / before the
+// first reset
+const RNG = {"prng": null, "draws": 0, "boot_draws": null};
+
 // Make the game deterministic by seeding Math.random()
-Math.seedrandom(CONFIG.seed);
+FN_SEED(CONFIG.seed);
 
 // Used to mark the game's start time (used only in visualized stats)
 let START_TIME;
@@ -298,9 +551,15 @@ const ws = new WS(
     FN_KEYDOWN,
     FN_KEYUP,
     FN_OBSERVATION,
-    CONFIG.stat ? FN_UPDATE_STATS : () => {}
+    CONFIG.stat ? FN_UPDATE_STATS : () => {},
+    FN_RESEED,
+    FN_SNAPSHOT,
+    FN_RESTORE
 );
 
+ws.autoreset = CONFIG.autoreset;
+ws.session = CONFIG.session;
+
 const _oninputup = CORE.game.oninputup.bind(CORE.game);
 CORE.game.oninputup = function(t) {
     switch(t) {
@@ -330,7 +589,11 @@ CORE.app.window.handle.addEventListener("doneLoading", (_e) => {
         document.getElementById("stat").style.display = "inline-block";
     }
 
-    if (!CONFIG.game) {
+    if (CONFIG.headless) {
+        // Unlike moving it off-screen, this spares the compositor as well.
+        // Frames are still drawn on demand (CMD_DRW), eg. for CMD_IMG
+        document.getElementById("gameContent").style.visibility = "hidden";
+    } else if (!CONFIG.game) {
         document.getElementById("gameContent").style.position = "absolute";
         document.getElementById("gameContent").style.left = "-1000px";
         document.getElementById("gameContent").style.display = "block";
@@ -346,5 +609,19 @@ CORE.app.window.handle.addEventListener("doneLoading", (_e) => {
     START_TIME = new Date();
     console.log("seed:", CONFIG.seed);
     FN_STEP();
-    ws.connect(CONFIG.port);
+
+    if (CONFIG.index >= 0) {
+        // The hosting page (QWOPVec.html) owns the WebSocket connection
+        window.parent.VEC.add_game(CONFIG.index, ws);
+    } else if (CONFIG.port) {
+        ws.connect(CONFIG.port);
+    } else {
+        // port=0 means the page is driven via the DevTools protocol (CDP)
+        window.CDP_READY = true;
+    }
 });
+
+/** Entry point for the DevTools protocol (CDP) transport, see ws.js */
+function CDP_HANDLE(b64) {
+    return ws.handle_b64(b64);
+}
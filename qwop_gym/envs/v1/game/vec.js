@@ -0,0 +1,145 @@
+/*=============================================================================
+Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+=============================================================================*/
+
+
+//
+// Hosts multiple QWOP games in a single page (one game per iframe) and
+// steps all of them via a single H_VCMD message, replying with a single
+// H_VOBS message. Must be loaded *after* ws.js.
+//
+// NOTE: the games are accessed directly (not via postMessage), which
+//       requires the browser to treat file:// iframes as same-origin
+//       (ie. the "allow-file-access-from-files" option).
+//
+
+/** Parses a URL param into a number value. */
+function urlparam_int(name, fallback) {
+    const v = (new URLSearchParams(window.location.search)).get(name);
+    return v === null ? fallback : parseInt(v);
+}
+
+const CONFIG = {
+    // WebSocket port to communicate with the RL env
+    "port": urlparam_int("port"),
+
+    // Number of games to host
+    "n": urlparam_int("n", 1),
+
+    // Seed for Math.random() of the first game (game i uses seed+i)
+    "seed": urlparam_int("seed"),
+
+    // Reset games right after a step ends them
+    "autoreset": urlparam_int("autoreset", 0) == 1,
+
+    // Session id, used to route messages when connected to a WSHub
+    "session": urlparam_int("session", 0),
+}
+
+// boolean indicator for little-endian
+const LE = new Float32Array([1])[0] === (new DataView((new Float32Array([1])).buffer)).getFloat32(0, true)
+
+class VecWS extends WS {
+  constructor(n) {
+    super();
+    this.games = new Array(n);
+    this.n_registered = 0;
+    this.autoreset = CONFIG.autoreset;
+    this.session = CONFIG.session;
+  }
+
+  /** Called by each embedded game once it has loaded. */
+  add_game(index, game) {
+    this.games[index] = game;
+    this.n_registered += 1;
+    console.log(`[vec] game ${index} ready (${this.n_registered}/${this.games.length})`);
+
+    if (this.n_registered < this.games.length)
+      return;
+
+    // port=0 means the page is driven via the DevTools protocol (CDP)
+    if (CONFIG.port)
+      this.connect(CONFIG.port);
+    else
+      window.CDP_READY = true;
+  }
+
+  /**
+   * Handles an incoming message. The page itself hosts no game, so the
+   * messages for a single game (CMD, SEQ, SEED, SAV, RES) are rejected.
+   */
+  handle(dv_in) {
+    const header = dv_in.getUint8(0);
+
+    if (header == WS.H_VCMD)
+      return this.handle_vcmd(dv_in);
+
+    throw new Error(`Unsupported header on QWOPVec.html: ${header}`);
+  }
+
+  /**
+   * Applies the i-th cmdflags to the i-th game and replies with the
+   * observations of all games. Games with cmdflags=0 are left untouched
+   * and are omitted from the reply. CMD_IMG is not supported.
+   * In autoreset mode, games ended by a step are reset and their first
+   * observations are appended to the reply (in order of their index).
+   */
+  handle_vcmd(dv_in) {
+    const cmds = new Uint8Array(dv_in.buffer, 1);
+    const obs = [];
+    const ended = [];
+
+    cmds.forEach((cmd, i) => {
+      if (!cmd)
+        return;
+
+      const game = this.games[i];
+      game.apply(cmd & ~WS.CMD_IMG);
+
+      const dv = game.fn_observation();
+      obs.push(dv);
+
+      if (this.autoreset && (cmd & WS.CMD_STP) && (dv.getUint8(1) & WS.OBS_END))
+        ended.push(game);
+    });
+
+    for (const game of ended) {
+      game.reset();
+      obs.push(game.fn_observation());
+    }
+
+    return WS.vobs(obs);
+  }
+};
+
+//
+// Main
+//
+
+const VEC = new VecWS(CONFIG.n);
+const CDP_HANDLE = (b64) => VEC.handle_b64(b64);
+const container = document.getElementById("games");
+
+for (let i = 0; i < CONFIG.n; i++) {
+  const params = new URLSearchParams(window.location.search);
+  params.delete("n");
+  params.set("port", 0);  // the games themselves are not connected
+  params.set("index", i);
+  params.set("seed", CONFIG.seed + i);
+
+  const iframe = document.createElement("iframe");
+  iframe.src = `QWOP.html?${params}`;
+  container.appendChild(iframe);
+}
@@ -21,7 +21,7 @@ class WS {
   // Header (uint8)
   //
 
-  static H_REG = 0    // reg req    (**->**) payload: id (uint8)
+  static H_REG = 0    // reg req    (**->**) payload: id (uint8) + session (uint32, optional)
   static H_ACK = 1    // reg ack    (**->**)
   static H_REJ = 2    // reg rej    (**->**)
   static H_CMD = 3    // cmd        (py->js) payload: cmdflags (uint8) + step (uint16) + rew (float32) + tot_rew (float32)
@@ -30,11 +30,23 @@ class WS {
   static H_LOG = 6    // log        (js->py) payload: msg (utf-8)
   static H_ERR = 7    // error      (js->py) payload: msg (utf-8)
   static H_RLD = 8    // reload     (js->srv) payload: seed (uint32)
+  static H_VCMD = 9   // vec cmd    (py->js) payload: cmdflags ([N]uint8)
+  static H_VOBS = 10  // vec obs    (js->py) payload: count (uint16) + [count]obs (OBS payloads)
+                      //            + steps (uint32, in reply to a SEQ only)
+  static H_SEQ = 11   // cmd seq    (py->js) payload: [K](cmdflags (uint8) + repeat (uint8))
+  static H_SEED = 12  // reseed     (py->js) payload: seed (uint32)
+  static H_SAV = 13   // snapshot   (py->js) payload: export (uint8)
+                      //            (js->py) payload: id (uint32) + blob (utf-8 JSON, if export)
+  static H_RES = 14   // restore    (py->js) payload: id (uint32) + blob (optional)
 
   //
   // Data
   //
 
+  // CMD and OBS messages may end with a timing trailer:
+  // [K]timestamps (float64, ms since epoch) + K (uint8)
+  // Each hop on the way appends a timestamp to it (see handle_cmd_timed)
+
   // REG payload: id (uint8)
   static REG_JS = 0   // js client
   static REG_PY = 1   // py client
@@ -54,6 +66,12 @@ class WS {
   static OBS_END = 0b00000010  // game has ended
   static OBS_SUC = 0b00000100  // run was successful (100+m)
 
+  // OBS payload size: flags (uint8) + time (float32) + distance (float32) + obs ([60]float32)
+  static OBS_PAYLOAD_SIZE = 1 + 4 + 4 + 60*4;
+
+  // CMD message size: header + cmdflags (uint8) + step (uint16) + rew (float32) + tot_rew (float32)
+  static CMD_SIZE = 1 + 1 + 2 + 4 + 4;
+
   // IMG payload: format (uint8)
   static IMG_JPG = 0
   static IMG_PNG = 1
@@ -62,6 +80,9 @@ class WS {
   // Default header to send
   static H_DEFAULT = 0;
 
+  // Max number of snapshots kept in the page (least recently used are evicted)
+  static MAX_SNAPSHOTS = 1000;
+
   // kb/mouse events
   static DOWN_Q = new KeyboardEvent("keydown",  {keyCode: 81});
   static DOWN_W = new KeyboardEvent("keydown",  {keyCode: 87});
@@ -73,7 +94,7 @@ class WS {
   static UP_P   = new KeyboardEvent("keyup",    {keyCode: 80});
 
 
-  constructor(fn_reset, fn_step, fn_draw, fn_keydown, fn_keyup, fn_observation, fn_update_stats) {
+  constructor(fn_reset, fn_step, fn_draw, fn_keydown, fn_keyup, fn_observation, fn_update_stats, fn_reseed, fn_snapshot, fn_restore) {
     this.fn_reset = fn_reset;
     this.fn_step = fn_step;
     this.fn_draw = fn_draw;
@@ -81,6 +102,16 @@ class WS {
     this.fn_keyup = fn_keyup;
     this.fn_observation = fn_observation;
     this.fn_update_stats = fn_update_stats;
+    this.fn_reseed = fn_reseed;
+    this.fn_snapshot = fn_snapshot;
+    this.fn_restore = fn_restore;
+    this.snapshots = new SnapshotStore(WS.MAX_SNAPSHOTS);
+
+    // Reset the game right after a step ends it (see handle_cmd)
+    this.autoreset = false;
+
+    // Session id (only used when connected to a WSHub)
+    this.session = 0;
   }
 
   connect(port) {
@@ -98,13 +129,77 @@ class WS {
 
   onmessage(event) {
     const dv_in = new DataView(this.recv(event));
+
+    if (dv_in.getUint8(0) == WS.H_ACK)
+      return true;
+
+    try {
+      const reply = this.handle(dv_in);
+
+      if (reply instanceof Promise)
+        reply.then((dv) => this.send(dv)).catch((e) => this.error(e));
+      else if (reply)
+        this.send(reply);
+    } catch (e) {
+      this.error(e);
+    }
+  }
+
+  /**
+   * Handles an incoming message.
+   * @return {DataView|Promise<DataView>|undefined} The reply (if any).
+   */
+  handle(dv_in) {
     const header = dv_in.getUint8(0);
 
-    // Don't do anything on non-cmd requests
-    if (header != WS.H_CMD)
-      return (header == WS.H_ACK) ? true : console.log("Unexpected WS header: ", header);
+    switch (header) {
+    case WS.H_CMD:
+      return this.handle_cmd(dv_in);
+    case WS.H_SEQ:
+      return this.handle_seq(dv_in);
+    case WS.H_SEED:
+      return this.handle_seed(dv_in);
+    case WS.H_SAV:
+      return this.handle_sav(dv_in);
+    case WS.H_RES:
+      return this.handle_res(dv_in);
+    default:
+      console.log("Unexpected WS header: ", header);
+    }
+  }
+
+  /**
+   * Entry point for the DevTools protocol (CDP) transport. Same as
+   * onmessage(), but for a base64-encoded message, whose base64-encoded
+   * reply is returned (possibly as a Promise) instead of sent.
+   */
+  handle_b64(b64) {
+    const reply = this.handle(new DataView(WS.b64decode(b64)));
+
+    return (reply instanceof Promise)
+      ? reply.then((dv) => WS.b64encode(dv))
+      : WS.b64encode(reply);
+  }
+
+  static b64decode(b64) {
+    const str = atob(b64);
+    const ary = new Uint8Array(str.length);
+
+    for (let i = 0; i < str.length; i++)
+      ary[i] = str.charCodeAt(i);
 
-    this.process_cmd(dv_in)
+    return ary.buffer;
+  }
+
+  static b64encode(dv) {
+    const ary = new Uint8Array(dv.buffer, dv.byteOffset, dv.byteLength);
+    let str = "";
+
+    // String.fromCharCode(...ary) may exceed the max number of args
+    for (let i = 0; i < ary.length; i += 0x8000)
+      str += String.fromCharCode.apply(null, ary.subarray(i, i + 0x8000));
+
+    return btoa(str);
   }
 
   recv(event) {
@@ -133,26 +228,220 @@ class WS {
     this.send(dv);
   }
 
-  process_cmd(dv_in) {
+  /**
+   * Applies a CMD message to the game.
+   * If a step ends the game in autoreset mode, the game is reset and the
+   * reply is a VOBS message with the terminal observation and the first
+   * observation of the new game.
+   * @return {DataView|Promise<DataView>} An OBS (VOBS, IMG) message.
+   */
+  handle_cmd(dv_in) {
     const cmd = dv_in.getUint8(1);
 
-    try {
-      (cmd & WS.CMD_RST) && this.reset();
-      (cmd & WS.CMD_K_Q) ? this.fn_keydown(WS.DOWN_Q) : this.fn_keyup(WS.UP_Q);
-      (cmd & WS.CMD_K_W) ? this.fn_keydown(WS.DOWN_W) : this.fn_keyup(WS.UP_W);
-      (cmd & WS.CMD_K_O) ? this.fn_keydown(WS.DOWN_O) : this.fn_keyup(WS.UP_O);
-      (cmd & WS.CMD_K_P) ? this.fn_keydown(WS.DOWN_P) : this.fn_keyup(WS.UP_P);
-      (cmd & WS.CMD_STP) && this.fn_step();
-      (cmd & WS.CMD_DRW) && this.fn_draw();
-      (cmd & WS.CMD_IMG) ? this.image() : this.observe(dv_in);
-    } catch (e) {
-      console.log(e.stack)
-      // insert a space (1 byte) be re-written as header
-      const buf = new TextEncoder().encode(" " + e.stack).buffer;
-      const dv_out = new DataView(buf);
-      dv_out.setUint8(0, WS.H_ERR);
-      this.ws.send(dv_out);
+    if (dv_in.byteLength > WS.CMD_SIZE && !(cmd & WS.CMD_IMG) && !this.autoreset)
+      return this.handle_cmd_timed(dv_in, cmd);
+
+    this.apply(cmd);
+
+    if (cmd & WS.CMD_IMG)
+      return this.image();
+
+    const dv_out = this.observe(dv_in);
+
+    if (this.autoreset && (cmd & WS.CMD_STP) && (dv_out.getUint8(1) & WS.OBS_END)) {
+      this.reset();
+      return WS.vobs([dv_out, this.observe(WS.cmd_dv(WS.CMD_RST))]);
     }
+
+    return dv_out;
+  }
+
+  /**
+   * Same as handle_cmd, but for a CMD message with a timing trailer.
+   * The reply is an OBS message whose trailer has the CMD's timestamps,
+   * followed by these: received, keys injected, stepped, observed.
+   */
+  handle_cmd_timed(dv_in, cmd) {
+    const t_recv = WS.now();
+    this.apply(cmd & ~(WS.CMD_STP | WS.CMD_DRW));
+    const t_keys = WS.now();
+    (cmd & WS.CMD_STP) && this.fn_step();
+    (cmd & WS.CMD_DRW) && this.fn_draw();
+    const t_step = WS.now();
+    const obs = this.observe(dv_in);
+    const t_obs = WS.now();
+
+    const count = dv_in.getUint8(dv_in.byteLength - 1);
+    const ary = new Uint8Array(obs.byteLength + 8*(count + 4) + 1);
+    const dv_out = new DataView(ary.buffer);
+
+    ary.set(new Uint8Array(obs.buffer, obs.byteOffset, obs.byteLength));
+    ary.set(new Uint8Array(dv_in.buffer, dv_in.byteOffset + WS.CMD_SIZE, 8*count), obs.byteLength);
+
+    let byte = obs.byteLength + 8*count;
+
+    for (const t of [t_recv, t_keys, t_step, t_obs])
+      dv_out.setFloat64(byte, t, LE), byte += 8;
+
+    dv_out.setUint8(byte, count + 4);
+    return dv_out;
+  }
+
+  // Current time in ms since epoch, comparable to python's time.time()
+  static now() {
+    return performance.timeOrigin + performance.now();
+  }
+
+  /**
+   * Applies a sequence of (cmdflags, repeat) pairs to the game, where
+   * each cmdflags is applied `repeat` times in a row. Replies with a
+   * VOBS message containing the observation after each pair, stopping
+   * early at game over, followed by the number of steps performed (uint32).
+   * If the game ended in autoreset mode, the game is reset and the first
+   * observation of the new game (without its header) is appended.
+   * CMD_IMG is not supported.
+   */
+  handle_seq(dv_in) {
+    const pairs = new Uint8Array(dv_in.buffer, 1);
+    const k = pairs.length >> 1;
+    const size = WS.OBS_PAYLOAD_SIZE;
+    const ary = new Uint8Array(3 + k*size + 4 + size);
+    const dv_out = new DataView(ary.buffer);
+
+    let count = 0;
+    let steps = 0;
+    let ended = false;
+
+    while (count < k) {
+      const cmd = pairs[2*count] & ~WS.CMD_IMG;
+      const [obs, applied] = this.apply_n(cmd, pairs[2*count + 1]);
+
+      // copy the OBS message without its header
+      ary.set(new Uint8Array(obs.buffer, 1), 3 + count*size);
+      count += 1;
+      steps += applied;
+      ended = (cmd & WS.CMD_STP) && (obs.getUint8(1) & WS.OBS_END);
+
+      if (obs.getUint8(1) & WS.OBS_END)
+        break;
+    }
+
+    dv_out.setUint8(0, WS.H_VOBS);
+    dv_out.setUint16(1, count, LE);
+    dv_out.setUint32(3 + count*size, steps, LE);
+
+    let end = 3 + count*size + 4;
+
+    if (this.autoreset && ended) {
+      this.reset();
+      const obs = this.observe(WS.cmd_dv(WS.CMD_RST));
+      ary.set(new Uint8Array(obs.buffer, 1, size), end);
+      end += size;
+    }
+
+    return new DataView(ary.buffer, 0, end);
+  }
+
+  /**
+   * Reseeds Math.random() and restarts the game without a page reload.
+   * Replies with an OBS message (same as a CMD_RST).
+   */
+  handle_seed(dv_in) {
+    this.fn_reseed(dv_in.getUint32(1, LE));
+    return this.handle_cmd(WS.cmd_dv(WS.CMD_RST));
+  }
+
+  /**
+   * Saves the game state in the page's snapshot store.
+   * Replies with the snapshot's id and, if requested, the state itself.
+   */
+  handle_sav(dv_in) {
+    const state = this.fn_snapshot();
+    const id = this.snapshots.add(state);
+    const blob = dv_in.getUint8(1)
+      ? new TextEncoder().encode(JSON.stringify(state))
+      : new Uint8Array(0);
+
+    const ary = new Uint8Array(5 + blob.length);
+    const dv_out = new DataView(ary.buffer);
+    dv_out.setUint8(0, WS.H_SAV);
+    dv_out.setUint32(1, id, LE);
+    ary.set(blob, 5);
+    return dv_out;
+  }
+
+  /**
+   * Restores a game state from the given blob (eg. a state saved on another
+   * page) or, if there is none, from the page's snapshot store.
+   * The blob is never stored, as its id may refer to a different state here.
+   * Replies with an OBS message.
+   */
+  handle_res(dv_in) {
+    const id = dv_in.getUint32(1, LE);
+    const state = (dv_in.byteLength > 5)
+      ? JSON.parse(new TextDecoder().decode(new Uint8Array(dv_in.buffer, 5)))
+      : this.snapshots.get(id);
+
+    if (state === undefined)
+      throw new Error(`Snapshot not found: ${id}`);
+
+    this.fn_restore(state);
+    return this.observe(WS.cmd_dv(0));
+  }
+
+  // Returns a VOBS message with the payloads of the given OBS messages
+  static vobs(dvs) {
+    const size = WS.OBS_PAYLOAD_SIZE;
+    const ary = new Uint8Array(3 + dvs.length*size);
+    const dv_out = new DataView(ary.buffer);
+
+    dv_out.setUint8(0, WS.H_VOBS);
+    dv_out.setUint16(1, dvs.length, LE);
+    dvs.forEach((dv, i) => ary.set(new Uint8Array(dv.buffer, 1, size), 3 + i*size));
+    return dv_out;
+  }
+
+  // Returns a CMD message with the given cmdflags
+  static cmd_dv(cmd) {
+    return new DataView(new Uint8Array([WS.H_CMD, cmd]).buffer);
+  }
+
+  // Applies cmdflags up to n times (less on game over), returns the last OBS
+  // and the number of times the cmdflags were applied
+  apply_n(cmd, n) {
+    let obs;
+    let i = 0;
+
+    while (i < Math.max(n, 1)) {
+      this.apply(cmd);
+      obs = this.fn_observation();
+      i++;
+
+      if (obs.getUint8(1) & WS.OBS_END)
+        break;
+    }
+
+    return [obs, i];
+  }
+
+  // Applies all cmdflags except CMD_IMG to the game
+  apply(cmd) {
+    (cmd & WS.CMD_RST) && this.reset();
+    (cmd & WS.CMD_K_Q) ? this.fn_keydown(WS.DOWN_Q) : this.fn_keyup(WS.UP_Q);
+    (cmd & WS.CMD_K_W) ? this.fn_keydown(WS.DOWN_W) : this.fn_keyup(WS.UP_W);
+    (cmd & WS.CMD_K_O) ? this.fn_keydown(WS.DOWN_O) : this.fn_keyup(WS.UP_O);
+    (cmd & WS.CMD_K_P) ? this.fn_keydown(WS.DOWN_P) : this.fn_keyup(WS.UP_P);
+    (cmd & WS.CMD_STP) && this.fn_step();
+    (cmd & WS.CMD_DRW) && this.fn_draw();
+  }
+
+  error(e) {
+    console.log(e.stack)
+    // insert a space (1 byte) be re-written as header
+    const buf = new TextEncoder().encode(" " + e.stack).buffer;
+    const dv_out = new DataView(buf);
+    dv_out.setUint8(0, WS.H_ERR);
+    this.ws.send(dv_out);
   }
 
   reset() {
@@ -164,28 +453,33 @@ class WS {
   }
 
   image() {
-    document.getElementById("window1").toBlob((blob) => {
-      blob.arrayBuffer().then((buf) => {
-        const ary = new Uint8Array(2 + buf.byteLength);
-
-        ary[0] = WS.H_IMG;
-        ary[1] = WS.IMG_JPG;
-        // ary.set(buf, 2); // does not work
-        ary.set(new Uint8Array(buf), 2);
-        this.send(new DataView(ary.buffer))
-      });
-    }, "image/jpeg");
+    return new Promise((resolve, reject) => {
+      document.getElementById("window1").toBlob((blob) => {
+        blob.arrayBuffer().then((buf) => {
+          const ary = new Uint8Array(2 + buf.byteLength);
+
+          ary[0] = WS.H_IMG;
+          ary[1] = WS.IMG_JPG;
+          // ary.set(buf, 2); // does not work
+          ary.set(new Uint8Array(buf), 2);
+          resolve(new DataView(ary.buffer));
+        }).catch(reject);
+      }, "image/jpeg");
+    });
   }
 
   observe(dv_in) {
     const dv_out = this.fn_observation();
     this.fn_update_stats(dv_in, dv_out);
-    this.send(dv_out);
+    return dv_out;
   }
 
   register() {
-    const ary = new Uint8Array([WS.H_REG, WS.REG_JS]);
-    this.send(new DataView(ary.buffer));
+    const dv = new DataView(new ArrayBuffer(6));
+    dv.setUint8(0, WS.H_REG);
+    dv.setUint8(1, WS.REG_JS);
+    dv.setUint32(2, this.session, LE);
+    this.send(dv);
   }
 
   log(msg) {
@@ -196,3 +490,37 @@ class WS {
     this.ws.send(dv);
   }
 };
+
+/** An LRU store of game states, keyed by random uint32 ids. */
+class SnapshotStore {
+  constructor(capacity) {
+    this.capacity = capacity;
+    this.map = new Map();  // iterates in insertion order
+  }
+
+  add(state) {
+    const id = crypto.getRandomValues(new Uint32Array(1))[0];
+    this.set(id, state);
+    return id;
+  }
+
+  set(id, state) {
+    this.map.delete(id);
+    this.map.set(id, state);
+
+    while (this.map.size > this.capacity)
+      this.map.delete(this.map.keys().next().value);
+  }
+
+  get(id) {
+    const state = this.map.get(id);
+
+    if (state !== undefined) {
+      // mark as most recently used
+      this.map.delete(id);
+      this.map.set(id, state);
+    }
+
+    return state;
+  }
+};
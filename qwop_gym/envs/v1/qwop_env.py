@@ -14,6 +14,7 @@
 # limitations under the License.
 # =============================================================================
 
+import sys
 import socket
 import numpy as np
 import multiprocessing
@@ -29,22 +30,64 @@ import logging
 from .util.wsproto import WSProto, to_bytes
 from .util.wsserver import WSServer
 from .util.wsclient import WSClient, WSClientMock
+from .util.wsdirect import WSDirectClient
+from .util.cdpclient import CDPClient
+from .util.wshub import WSHubClient
+from .util.wirecap import CaptureClient, ReplayClient
+from .util.synthetic import SyntheticClient
+from .util.metrics import MeteredClient
+from .util import metrics
 from .util.log import Log
 
 BYTES_RESET = to_bytes(WSProto.H_CMD) + to_bytes(WSProto.CMD_RST)
 BYTES_DRAW = to_bytes(WSProto.H_CMD) + to_bytes(WSProto.CMD_DRW)
 BYTES_RENDER = to_bytes(WSProto.H_CMD) + to_bytes(WSProto.CMD_DRW | WSProto.CMD_IMG)
 BYTES_RELOAD = to_bytes(WSProto.H_RLD)
+BYTES_SEQ = to_bytes(WSProto.H_SEQ)
+BYTES_SEED = to_bytes(WSProto.H_SEED)
+BYTES_SAVE = to_bytes(WSProto.H_SAV) + to_bytes(0)
+BYTES_SAVE_EXPORT = to_bytes(WSProto.H_SAV) + to_bytes(1)
+BYTES_RESTORE = to_bytes(WSProto.H_RES)
 INT_OBS = int(WSProto.H_OBS)
+INT_VOBS = int(WSProto.H_VOBS)
+
+# flags (uint8) + time (float32) + distance (float32) + obs ([60]float32)
+OBS_PAYLOAD_SIZE = 1 + 4 + 4 + 60 * 4
 INT_IMG = int(WSProto.H_IMG)
 INT_JPG = int(WSProto.IMG_JPG)
 
+# CMD payload after the cmdflags: step (uint16) + rew (float32) + tot_rew (float32)
+CMD_PAYLOAD = struct.Struct("=Hff")
+
 # the numpy data type
 # it seems pytorch is optimized for float32
 DTYPE = np.float32
 
+# Normalization limits for each of the 5 floats of a body part
+BODYPART_LIMITS = [
+    ("pos_x", -10, 1050),
+    ("pos_y", -10, 10),
+    ("angle", -6, 6),
+    ("vel_x", -20, 60),
+    ("vel_y", -25, 60),
+]
+
+N_BODYPARTS = 12
+
+# A single observation within a VOBS message (ie. an OBS payload)
+OBS_RECORD = np.dtype(
+    [
+        ("flags", np.uint8),
+        ("time", DTYPE),
+        ("distance", DTYPE),
+        ("obs", DTYPE, 60),
+    ]
+)
+
 
 class Reaction:
+    __slots__ = ("data", "ndata", "time", "distance", "game_over", "is_success")
+
     def __init__(self, flags, time, distance, data, ndata):
         self.data = data
         self.ndata = ndata
@@ -58,6 +101,26 @@ class Reaction:
         self.is_success = bool(flags & WSProto.OBS_SUC)
 
 
+class Snapshot:
+    """
+    A handle to a game state saved via QwopEnv.snapshot().
+
+    The state itself is kept in the browser page (see SnapshotStore in
+    ws.js), unless exported as `blob`, which allows to restore it even if
+    the page has evicted it or has been reloaded since. When given, the
+    blob is always used instead of the page's copy.
+    """
+
+    __slots__ = ("id", "blob", "steps", "last_reward", "total_reward")
+
+    def __init__(self, id, blob, steps, last_reward, total_reward):
+        self.id = id
+        self.blob = blob
+        self.steps = steps
+        self.last_reward = last_reward
+        self.total_reward = total_reward
+
+
 class Normalizable:
     def __init__(self, name, limit_min, limit_max):
         self.name = name
@@ -65,25 +128,276 @@ class Normalizable:
         self.limit_max = limit_max
         self.center = DTYPE((limit_min + limit_max) / 2)
         self.maxdev = DTYPE(limit_max - self.center)
-        self.min = DTYPE(0)
-        self.max = DTYPE(0)
 
     def normalize(self, value):
-        norm = (value - self.center) / self.maxdev
-
-        if value > self.max:
-            # assert value < self.limit_max, f"{self.name} max overflow: {value}"
-            self.max = value
-        elif value < self.min:
-            # assert value > self.limit_min, f"{self.name} min overflow: {value}"
-            self.min = value
-
-        return norm
+        return (value - self.center) / self.maxdev
 
     def denormalize(self, norm):
         return norm * self.maxdev + self.center
 
 
+class Normalizer:
+    """
+    Normalizes whole observations at once.
+
+    The `center` and `maxdev` of each Normalizable in `fields` are tiled
+    `nparts` times into vectors, so normalizing an observation (or a batch
+    of observations) is a single numpy expression.
+
+    Running stats for the raw (non-normalized) values are tracked with
+    array ops and can be inspected via `.stats()`.
+    """
+
+    def __init__(self, fields, nparts):
+        self.fields = fields
+        self.nparts = nparts
+        self.center = np.tile([f.center for f in fields], nparts).astype(DTYPE)
+        self.maxdev = np.tile([f.maxdev for f in fields], nparts).astype(DTYPE)
+        self.size = len(self.center)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.count = 0
+        self.min = np.full(self.size, np.inf, dtype=DTYPE)
+        self.max = np.full(self.size, -np.inf, dtype=DTYPE)
+        self._sum = np.zeros(self.size)
+        self._sumsq = np.zeros(self.size)
+        self._sq = np.zeros(self.size)
+
+    def normalize(self, obs, out=None):
+        """Normalize a single observation of shape (size,)"""
+        self.count += 1
+        np.minimum(self.min, obs, out=self.min)
+        np.maximum(self.max, obs, out=self.max)
+        np.add(self._sum, obs, out=self._sum)
+        np.square(obs, out=self._sq)
+        np.add(self._sumsq, self._sq, out=self._sumsq)
+
+        return self._normalize(obs, out)
+
+    def normalize_batch(self, obs, out=None):
+        """Normalize N observations at once, ie. obs of shape (N, size)"""
+        self.count += len(obs)
+        np.minimum(self.min, obs.min(axis=0), out=self.min)
+        np.maximum(self.max, obs.max(axis=0), out=self.max)
+        self._sum += obs.sum(axis=0, dtype=np.float64)
+        self._sumsq += np.square(obs, dtype=np.float64).sum(axis=0)
+
+        return self._normalize(obs, out)
+
+    def _normalize(self, obs, out):
+        out = np.subtract(obs, self.center, out=out)
+        np.divide(out, self.maxdev, out=out)
+        # np.clip() is notably slower than the two ufuncs below
+        np.maximum(out, -1, out=out)
+        return np.minimum(out, 1, out=out)
+
+    def denormalize(self, nobs):
+        return nobs * self.maxdev + self.center
+
+    def stats(self):
+        """Running min/max/mean/var of the raw values, shaped (nparts, nfields)"""
+        shape = (self.nparts, len(self.fields))
+        n = max(self.count, 1)
+        mean = self._sum / n
+        var = np.maximum(self._sumsq / n - np.square(mean), 0)
+
+        return {
+            "count": self.count,
+            "fields": [f.name for f in self.fields],
+            "min": self.min.reshape(shape),
+            "max": self.max.reshape(shape),
+            "mean": mean.reshape(shape),
+            "var": var.reshape(shape),
+        }
+
+
+def build_action_set(reduced_action_set, t_for_terminate):
+    """
+    Returns the (keycodes, keyflags, cmdflags) lists for all actions.
+    """
+
+    keymap = {
+        "q": WSProto.CMD_K_Q,
+        "w": WSProto.CMD_K_W,
+        "o": WSProto.CMD_K_O,
+        "p": WSProto.CMD_K_P,
+    }
+
+    keycodes = [ord(x) for x in keymap.keys()]
+    keyflags = keymap.values()
+
+    # All possible key combinations represented as lists of tuples
+    keycodes_c = (
+        list(itertools.combinations(keycodes, 0))  # 0
+        + list(itertools.combinations(keycodes, 1))  # 4: Q, W, O, P
+        + list(itertools.combinations(keycodes, 2))  # 6: QW, QO, ...
+        + list(itertools.combinations(keycodes, 3))  # 4: QWO, QWP, ...
+        + list(itertools.combinations(keycodes, 4))  # 1: QWOP
+    )
+
+    keyflags_c = (
+        list(itertools.combinations(keyflags, 0))
+        + list(itertools.combinations(keyflags, 1))
+        + list(itertools.combinations(keyflags, 2))
+        + list(itertools.combinations(keyflags, 3))
+        + list(itertools.combinations(keyflags, 4))
+    )
+
+    if reduced_action_set:
+        # Remove useless key combinations instead of
+        # letting agents work it out on their own
+        redundant_combinations = [
+            ("q", "o"),
+            ("w", "p"),
+            ("q", "w", "o"),
+            ("q", "w", "p"),
+            ("q", "o", "p"),
+            ("w", "o", "p"),
+            ("q", "w", "o", "p"),
+        ]
+
+        for rc in redundant_combinations:
+            keycodes_c.remove(tuple(ord(x) for x in rc))
+            keyflags_c.remove(tuple(keymap.get(x) for x in rc))
+
+    # Key combinations represented as WSProto cmdflags
+    action_cmdflags = [functools.reduce(lambda a, e: a | e, t, 0) for t in keyflags_c]
+
+    if t_for_terminate:
+        # add an extra "T" key which terminates env immediately
+        keycodes_c.append((ord("t"),))
+        keyflags_c.append(0)
+        action_cmdflags.append(0)
+
+    return keycodes_c, keyflags_c, action_cmdflags
+
+
+def parse_vobs(data):
+    """
+    Returns the observations in a VOBS message as an array of OBS_RECORD.
+    """
+
+    assert data[0] == INT_VOBS, f"expected a VOBS header, got: {data[0]}"
+    count = int.from_bytes(data[1:3], sys.byteorder)
+    return np.frombuffer(data, dtype=OBS_RECORD, count=count, offset=3)
+
+
+def parse_seq_steps(data, count):
+    """
+    Returns the number of steps performed for a SEQ message, which follows
+    the `count` observations in the VOBS reply.
+    """
+
+    offset = 3 + count * OBS_RECORD.itemsize
+    return int.from_bytes(data[offset : offset + 4], sys.byteorder)
+
+
+def _concat_many(a, b):
+    # Concatenates step_many results (arrays or dicts of arrays)
+    if isinstance(a, dict):
+        return {key: np.concatenate([a[key], b[key]]) for key in a}
+
+    return np.concatenate([a, b])
+
+
+def create_normalizer():
+    fields = [Normalizable(n, DTYPE(lo), DTYPE(hi)) for n, lo, hi in BODYPART_LIMITS]
+    return Normalizer(fields, nparts=N_BODYPARTS)
+
+
+def create_client(
+    transport,
+    seed,
+    driver,
+    browser,
+    loglevel,
+    tab_pool=False,
+    seed_schedule=None,
+    client_cls=WSClient,
+    **kwargs,
+):
+    """
+    Launches the browser and returns a (client, process, shutdown) tuple.
+
+    With the "relay" transport, a WSServer is started in a separate process
+    and relays messages between the client and the browser. Only this
+    transport supports `tab_pool` and `seed_schedule` (see QwopEnv).
+    With the "direct" transport, the client accepts the browser's connection
+    itself (process and shutdown are None).
+    With the "cdp" transport, the client drives the page via the Chrome
+    DevTools Protocol (process and shutdown are None).
+    With the "hub" transport, the client registers with a WSHub process
+    shared by all envs on the host, which is started on first use (process
+    and shutdown are None).
+    """
+
+    if browser is None:
+        raise ValueError(
+            "please specify a valid path to a chrome-based browser executable"
+            + " via the `browser` constructor argument"
+        )
+    if driver is None:
+        raise ValueError(
+            "please specify a valid path to a chromedriver executable via"
+            + " the `driver` constructor argument"
+        )
+
+    if tab_pool and transport != "relay":
+        raise ValueError("tab_pool requires the relay transport")
+
+    match transport:
+        case "relay":
+            sock = socket.socket()
+            sock.bind(("localhost", 0))
+            server = WSServer(
+                sock,
+                seed=seed,
+                driver=driver,
+                browser=browser,
+                loglevel=loglevel,
+                tab_pool=tab_pool,
+                seed_schedule=seed_schedule,
+                **kwargs,
+            )
+            shutdown = multiprocessing.Event()
+            proc = multiprocessing.Process(
+                target=server.start, kwargs={"shutdown": shutdown}
+            )
+            proc.start()
+            client = client_cls(sock.getsockname()[1], loglevel, shutdown)
+            return client, proc, shutdown
+        case "direct":
+            client = WSDirectClient(
+                seed=seed,
+                driver=driver,
+                browser=browser,
+                loglevel=loglevel,
+                **kwargs,
+            )
+            return client, None, None
+        case "cdp":
+            client = CDPClient(
+                seed=seed,
+                driver=driver,
+                browser=browser,
+                loglevel=loglevel,
+                **kwargs,
+            )
+            return client, None, None
+        case "hub":
+            client = WSHubClient(
+                seed=seed,
+                driver=driver,
+                browser=browser,
+                loglevel=loglevel,
+                **kwargs,
+            )
+            return client, None, None
+        case _:
+            raise ValueError("Unknown transport: %s" % transport)
+
+
 class QwopEnv(gym.Env):
     """
     A Gym environment for Bennet Foddy's game called _QWOP_.
@@ -116,10 +430,51 @@ class QwopEnv(gym.Env):
         the env (useful when a human is playing)
     loglevel: Logger level (DEBUG|INFO|WARN|ERROR).
     seed: Initial seed for QWOP.min.js's RNG.
+    browser_mock: Use a mock instead of a real browser (for debugging).
+        If a path to a file written via `capture_file`, the captured browser
+        responses are replayed instead (eg. for profiling the python side).
+        If "synthetic", a simulated game with seeded, time-advancing
+        observations is used instead (eg. for load-testing pipelines).
+    mock_kwargs: Extra arguments for the "synthetic" browser_mock, such as
+        episode_steps, success_rate and latency_ms (see SyntheticClient),
+        or for a replayed capture file, such as strict (see ReplayClient).
+    obs_buffers: Number of preallocated arrays that observations are written
+        into in a round-robin fashion (0 means a new array on each step).
+        An observation is valid only until `obs_buffers` more are returned.
+    transport: How messages reach the browser: "relay" (via a WSServer
+        process), "direct" (the env accepts the browser's connection),
+        "cdp" (via the Chrome DevTools Protocol) or "hub" (via a WSHub
+        process shared by all envs on the host).
+    reseed_in_place: On `.reset(seed=...)`, reseed the game without
+        reloading the page (see `qwop-gym check_determinism`).
+    autoreset: Let the browser reset the game as soon as a step ends it.
+        The first observation of the new game is sent along with the
+        terminal one and is returned by the next `.reset()` without
+        a browser round-trip.
+    absorbing: Never terminate, but enter an absorbing state instead: once
+        the game is over, each step returns the terminal observation and
+        reward (with terminated=False) with no browser traffic. Useful for
+        fixed-horizon training in combination with TimeLimit.
+    headless: Physics-only mode for training: run the browser headless and
+        never paint the game, except when a frame is rendered explicitly.
+        Implies stat_in_browser=False.
+    tab_pool: Keep a second browser page preloaded with the next seed, so
+        that a page reload (`reload_on_reset` or `.reset(seed=...)`) just
+        swaps the two pages. Requires the "relay" transport.
+    capture_file: Path to a file to capture all messages exchanged with the
+        browser into (see `browser_mock`).
+    seed_schedule: The seeds that `.reset(seed=...)` will be called with,
+        in order (the next one is preloaded when `tab_pool` is enabled).
+        Without a schedule, the page for the current seed is preloaded.
     """
 
     metadata = {"render_modes": ["browser", "rgb_array"], "render_fps": 30}
 
+    # Clients for the "relay" transport and for browser_mock=True
+    client_cls = WSClient
+    client_mock_cls = WSClientMock
+    metered_client_cls = MeteredClient
+
     def __init__(
         self,
         browser=None,
@@ -139,6 +494,16 @@ class QwopEnv(gym.Env):
         loglevel="WARN",
         seed=None,
         browser_mock=False,
+        obs_buffers=0,
+        transport="relay",
+        reseed_in_place=False,
+        autoreset=False,
+        absorbing=False,
+        headless=False,
+        tab_pool=False,
+        seed_schedule=None,
+        capture_file=None,
+        mock_kwargs=None,
     ):
         seedval = seed or np.random.default_rng().integers(2**31)
         assert seedval >= 0 and seedval <= np.iinfo(np.int32).max
@@ -146,24 +511,22 @@ class QwopEnv(gym.Env):
 
         self.frames_per_step = frames_per_step
 
-        if browser_mock:
-            self.client = WSClientMock()
-        else:
-            if browser is None:
-                raise ValueError(
-                    "please specify a valid path to a chrome-based browser executable"
-                    + " via the `browser` constructor argument"
-                )
-            if driver is None:
-                raise ValueError(
-                    "please specify a valid path to a chromedriver executable via"
-                    + " the `driver` constructor argument"
-                )
+        self.proc = None
 
-            sock = socket.socket()
-            sock.bind(("localhost", 0))
-            server = WSServer(
-                sock,
+        if browser_mock == "synthetic":
+            self.client = SyntheticClient(
+                seed=self.seedval,
+                stepsize=frames_per_step,
+                autoreset=autoreset,
+                **(mock_kwargs or {}),
+            )
+        elif isinstance(browser_mock, str):
+            self.client = ReplayClient(browser_mock, **(mock_kwargs or {}))
+        elif browser_mock:
+            self.client = self.client_mock_cls()
+        else:
+            self.client, self.proc, self.shutdown = create_client(
+                transport=transport,
                 seed=self.seedval,
                 stepsize=frames_per_step,
                 stat_in_browser=stat_in_browser,
@@ -172,21 +535,32 @@ class QwopEnv(gym.Env):
                 driver=driver,
                 browser=browser,
                 loglevel=loglevel,
+                autoreset=autoreset,
+                headless=headless,
+                tab_pool=tab_pool,
+                seed_schedule=seed_schedule,
+                client_cls=self.client_cls,
             )
-            self.shutdown = multiprocessing.Event()
-            self.proc = multiprocessing.Process(
-                target=server.start, kwargs={"shutdown": self.shutdown}
-            )
-            self.proc.start()
-            self.client = WSClient(sock.getsockname()[1], loglevel, self.shutdown)
+
+        if capture_file:
+            self.client = CaptureClient(self.client, capture_file)
 
         self.auto_draw = auto_draw
         self.t_for_terminate = t_for_terminate
         self.reload_on_reset = reload_on_reset
+        self.reseed_in_place = reseed_in_place
+
+        # OBS payload of the next game's first observation (see autoreset)
+        self.autoreset_data = None
+
+        # The step result to repeat while in the absorbing state
+        self.absorbing = absorbing
+        self.terminal_return = None
         self.logger = Log.get_logger(__name__, loglevel)
 
         self.reduced_action_set = reduced_action_set
         self._set_keycodes()
+        self._set_cmd_templates()
 
         self.render_mode = render_mode
         self.action_space = gym.spaces.Discrete(len(self.action_cmdflags))
@@ -199,11 +573,13 @@ class QwopEnv(gym.Env):
         self.failure_cost = DTYPE(failure_cost)
         self.success_reward = DTYPE(success_reward)
 
-        self.pos_x = Normalizable("pos_x", DTYPE(-10), DTYPE(1050))
-        self.pos_y = Normalizable("pos_y", DTYPE(-10), DTYPE(10))
-        self.angle = Normalizable("angle", DTYPE(-6), DTYPE(6))
-        self.vel_x = Normalizable("vel_x", DTYPE(-20), DTYPE(60))
-        self.vel_y = Normalizable("vel_y", DTYPE(-25), DTYPE(60))
+        self.normalizer = create_normalizer()
+        self.pos_x, self.pos_y, self.angle, self.vel_x, self.vel_y = (
+            self.normalizer.fields
+        )
+
+        self.obs_buffers = np.zeros((obs_buffers, 60), dtype=DTYPE)
+        self.obs_buffer_i = 0
 
         zeros = np.zeros(self.observation_space.shape, dtype=DTYPE)
         self.noop_reaction = Reaction(0, 0, 0, zeros, zeros)
@@ -219,96 +595,120 @@ class QwopEnv(gym.Env):
         self.last_reward = DTYPE(0)
         self.total_reward = DTYPE(0)
 
+        metrics.maybe_start_exporter()
+
+        if metrics.REGISTRY.enabled:
+            self._enable_metrics()
+
         self.logger.info("Initialized with seed: %d" % self.seedval)
 
-    def _set_keycodes(self):
-        keymap = {
-            "q": WSProto.CMD_K_Q,
-            "w": WSProto.CMD_K_W,
-            "o": WSProto.CMD_K_O,
-            "p": WSProto.CMD_K_P,
-        }
+    def _enable_metrics(self):
+        # The instrumented methods are set on the instance only, so that
+        # disabled metrics add no overhead (see util/metrics.py)
+        self.client = self.metered_client_cls(self.client)
+        self._normalize = metrics.timed(self._normalize, metrics.NORMALIZE)
+        self._normalize_batch = metrics.timed(self._normalize_batch, metrics.NORMALIZE)
+        self._calc_reward = metrics.timed(self._calc_reward, metrics.REWARD)
+        self._complete_step = metrics.counted(self._complete_step, metrics.STEPS)
+        begin_reset = self._begin_reset
 
-        keycodes = [ord(x) for x in keymap.keys()]
-        keyflags = keymap.values()
+        def _begin_reset(seed):
+            reload_page, reseed = begin_reset(seed)
+            metrics.RESETS.inc()
 
-        # All possible key combinations represented as lists of tuples
-        self.keycodes_c = (
-            list(itertools.combinations(keycodes, 0))  # 0
-            + list(itertools.combinations(keycodes, 1))  # 4: Q, W, O, P
-            + list(itertools.combinations(keycodes, 2))  # 6: QW, QO, ...
-            + list(itertools.combinations(keycodes, 3))  # 4: QWO, QWP, ...
-            + list(itertools.combinations(keycodes, 4))  # 1: QWOP
-        )
+            if reload_page:
+                metrics.RELOADS.inc()
+
+            return reload_page, reseed
+
+        self._begin_reset = _begin_reset
 
-        self.keyflags_c = (
-            list(itertools.combinations(keyflags, 0))
-            + list(itertools.combinations(keyflags, 1))
-            + list(itertools.combinations(keyflags, 2))
-            + list(itertools.combinations(keyflags, 3))
-            + list(itertools.combinations(keyflags, 4))
+    def _set_keycodes(self):
+        self.keycodes_c, self.keyflags_c, self.action_cmdflags = build_action_set(
+            self.reduced_action_set, self.t_for_terminate
         )
 
-        if self.reduced_action_set:
-            # Remove useless key combinations instead of
-            # letting agents work it out on their own
-            redundant_combinations = [
-                ("q", "o"),
-                ("w", "p"),
-                ("q", "w", "o"),
-                ("q", "w", "p"),
-                ("q", "o", "p"),
-                ("w", "o", "p"),
-                ("q", "w", "o", "p"),
-            ]
-
-            for rc in redundant_combinations:
-                self.keycodes_c.remove(tuple(ord(x) for x in rc))
-                self.keyflags_c.remove(tuple(keymap.get(x) for x in rc))
-
-        # Key combinations represented as WSProto cmdflags
-        self.action_cmdflags = [
-            functools.reduce(lambda a, e: a | e, t, 0) for t in self.keyflags_c
-        ]
+    def _set_cmd_templates(self):
+        # Preallocated CMD frames for each action (with and without CMD_DRW).
+        # Only the payload after the cmdflags is packed into them on each step
+        self.action_cmds = []
+        self.action_cmds_draw = []
 
-        if self.t_for_terminate:
-            # add an extra "T" key which terminates env immediately
-            self.keycodes_c.append((ord("t"),))
-            self.keyflags_c.append(0)
-            self.action_cmdflags.append(0)
+        for cmdflags in self.action_cmdflags:
+            cmd = bytearray(2 + CMD_PAYLOAD.size)
+            cmd[0] = WSProto.H_CMD
+            cmd[1] = WSProto.CMD_STP | cmdflags
+            self.action_cmds.append(cmd)
+
+            cmd_draw = bytearray(cmd)
+            cmd_draw[1] |= WSProto.CMD_DRW
+            self.action_cmds_draw.append(cmd_draw)
+
+        # The same cmdflags as arrays indexed by action (for step_many)
+        self.action_seqflags = np.array([c[1] for c in self.action_cmds], np.uint8)
+        self.action_seqflags_draw = self.action_seqflags | WSProto.CMD_DRW
 
     def reset(self, seed=None, options=None):
+        reload_page, reseed = self._begin_reset(seed)
+        reaction = self._restart_game(reload_page, reseed)
+        return reaction.ndata, self._build_info(reaction)
+
+    def _begin_reset(self, seed):
+        # Returns the (reload_page, reseed) args for _restart_game
         super().reset(seed=seed)
 
         self._reset_env()
         needs_reload = self.reload_on_reset
+        needs_reseed = False
 
         if seed is not None:
-            # QWOP's seed can be changed ONLY if reloading the page
+            # QWOP's seed can be changed either by reloading the page
+            # or by reseeding it in-place (H_SEED)
             assert seed >= 0 and seed <= np.iinfo(np.int32).max
             self.seedval = seed
-            needs_reload = True
+            needs_reseed = self.reseed_in_place
+            needs_reload = needs_reload or not needs_reseed
 
-        reaction = self._restart_game(reload_page=needs_reload)
-        return reaction.ndata, self._build_info(reaction)
+        return needs_reload, needs_reseed and not needs_reload
 
     def _reset_env(self):
+        self.terminal_return = None
         self.steps = 0
         self.last_reaction = self.noop_reaction
         self.last_reward = DTYPE(0)
         self.total_reward = DTYPE(0)
 
-    def _restart_game(self, reload_page=False):
+    def _restart_game(self, reload_page=False, reseed=False):
+        autoreset_data = self.autoreset_data
+        self.autoreset_data = None
+
+        if autoreset_data and not (reload_page or reseed):
+            # the game was already reset by the browser
+            return self._parse_obs(autoreset_data, 0)
+
         if reload_page:
             data = self.client.send(BYTES_RELOAD + to_bytes(self.seedval, 4))
             assert data[0] == WSProto.H_ACK, f"expected an ACK header, got: {data[0]}"
 
+        if reseed:
+            # restarts the game as well
+            data = self.client.send(BYTES_SEED + to_bytes(self.seedval, 4))
+            return self._build_reaction(data)
+
         return self._build_reaction(self.client.send(BYTES_RESET))
 
-    def step(self, action):
+    def step(self, action, out=None):
+        """
+        Like gym.Env.step, but the observation can optionally be written
+        into a caller-supplied `out` array of shape (60,).
+        """
+        if self.terminal_return is not None:
+            return self.terminal_return
+
         self.steps += 1
+        return self._complete_step(action, self._perform_action(action, out))
 
-        reaction = self._perform_action(action)
+    def _complete_step(self, action, reaction):
         reward = self._calc_reward(reaction, self.last_reaction)
         terminated = reaction.game_over or action == self.action_t
         info = self._build_info(reaction)
@@ -317,50 +717,205 @@ class QwopEnv(gym.Env):
         self.total_reward += reward  # QWOP stats
         self.last_reaction = reaction  # needed for reward calc
 
+        if terminated and self.absorbing:
+            obs = reaction.ndata.copy()  # ndata may be a reused buffer
+            self.terminal_return = (obs, reward, False, False, info)
+            return self.terminal_return
+
         return reaction.ndata, reward, terminated, False, info
 
-    def _perform_action(self, action):
-        cmdflags = WSProto.CMD_STP | self.action_cmdflags[action]
+    def step_many(self, actions):
+        """
+        Performs a sequence of K actions with a single browser round-trip.
+
+        `actions` is a sequence of actions or (action, repeat) pairs, where
+        `repeat` (1..255) is the number of consecutive steps to perform the
+        action for. Stops early at game over (or at the "T" action), so the
+        returned (obs, rewards, terminated, truncated, info) tuple contains
+        arrays of length k <= K: one entry per (action, repeat) pair. The
+        observation and `info` (whose values are arrays too) correspond to
+        the pair's last step and the reward is the sum of its steps' rewards,
+        as if the pair was performed via `.step()`.
+
+        In absorbing mode, the results are always K long instead, where the
+        entries after game over are those of the absorbing state.
+
+        In autoreset mode, a sequence which ends the game also resets it,
+        same as `.step()`.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        n = len(actions)
+        assert n, "expected at least one action"
+
+        if self.terminal_return is not None:
+            return self._absorbed_many(n)
+
+        if actions.ndim == 1:
+            repeats = np.ones_like(actions)
+        else:
+            actions, repeats = actions[:, 0], actions[:, 1]
+
+            # repeats are sent as uint8
+            if repeats.min() < 1 or repeats.max() > 255:
+                raise ValueError("repeat must be 1..255, got: %s" % repeats)
+
+        if self.action_t is not None:
+            # "T" terminates the env, so anything after it is not performed
+            (i_t,) = np.nonzero(actions == self.action_t)
+            if len(i_t):
+                actions, repeats = actions[: i_t[0] + 1], repeats[: i_t[0] + 1]
+
+        seqflags = self.action_seqflags_draw if self.auto_draw else self.action_seqflags
+        pairs = np.empty((len(actions), 2), dtype=np.uint8)
+        pairs[:, 0] = seqflags[actions]
+        pairs[:, 1] = repeats
+
+        data = self.client.send(BYTES_SEQ + pairs.tobytes())
+        records = parse_vobs(data)
+        k = len(records)
+        time = records["time"]
+        distance = records["distance"]
+        flags = records["flags"]
+
+        last_time = np.empty(k, dtype=DTYPE)
+        last_time[0] = self.last_reaction.time
+        last_time[1:] = time[:-1]
+
+        last_distance = np.empty(k, dtype=DTYPE)
+        last_distance[0] = self.last_reaction.distance
+        last_distance[1:] = distance[:-1]
+
+        # the game may end before the last action's repeats are over
+        steps = parse_seq_steps(data, k)
+        counts = repeats[:k].astype(DTYPE)
+        counts[-1] = steps - repeats[: k - 1].sum()
+
+        game_over = (flags & WSProto.OBS_END) != 0
+        is_success = (flags & WSProto.OBS_SUC) != 0
+        rewards = self._calc_rewards(
+            time, distance, last_time, last_distance, game_over, is_success, counts
+        )
 
-        if self.auto_draw:
-            cmdflags |= WSProto.CMD_DRW
+        terminated = game_over | (actions[:k] == self.action_t)
+        truncated = np.zeros(k, dtype=bool)
+        obs = self._normalize_batch(records["obs"])
+        info = {
+            "time": time,
+            "distance": distance,
+            "avgspeed": distance / time,
+            "is_success": is_success,
+        }
 
-        data = (
-            to_bytes(WSProto.H_CMD)
-            + to_bytes(cmdflags)
-            + to_bytes(self.steps, 2)
-            + struct.pack("=f", self.last_reward)
-            + struct.pack("=f", self.total_reward)
+        self.steps += steps
+
+        # browser autoreset: the next game's first OBS follows the steps
+        offset = 3 + k * OBS_PAYLOAD_SIZE + 4
+        if len(data) > offset:
+            self.autoreset_data = data[offset:]
+        self.last_reward = rewards[-1]  # QWOP stats
+        self.total_reward += rewards.sum()  # QWOP stats
+        self.last_reaction = Reaction(
+            flags[-1], time[-1], distance[-1], records["obs"][-1], obs[-1]
         )
 
-        resp = self.client.send(data)
-        return self._build_reaction(resp)
+        if terminated[-1] and self.absorbing:
+            terminated[-1] = False
+            last_info = {key: v[-1] for key, v in info.items()}
+            self.terminal_return = (obs[-1], rewards[-1], False, False, last_info)
+
+            if k < n:
+                absorbed = self._absorbed_many(n - k)
+                result = (obs, rewards, terminated, truncated, info)
+                return tuple(_concat_many(a, b) for a, b in zip(result, absorbed))
+
+        return obs, rewards, terminated, truncated, info
+
+    def _absorbed_many(self, n):
+        # Results of n steps in the absorbing state (see step_many)
+        obs, reward, _, _, info = self.terminal_return
+
+        return (
+            np.tile(obs, (n, 1)),
+            np.full(n, reward, dtype=DTYPE),
+            np.zeros(n, dtype=bool),
+            np.zeros(n, dtype=bool),
+            {key: np.full(n, v) for key, v in info.items()},
+        )
+
+    def snapshot(self, export=False):
+        """
+        Saves the current game state and returns a Snapshot handle for it.
+        With `export=True`, the handle also contains the state itself.
+        """
+        data = self.client.send(BYTES_SAVE_EXPORT if export else BYTES_SAVE)
+        assert data[0] == WSProto.H_SAV, f"expected a SAV header, got: {data[0]}"
+
+        return Snapshot(
+            id=int.from_bytes(data[1:5], sys.byteorder),
+            blob=bytes(data[5:]) if export else None,
+            steps=self.steps,
+            last_reward=self.last_reward,
+            total_reward=self.total_reward,
+        )
+
+    def restore(self, snapshot):
+        """
+        Restores a game state saved via `.snapshot()`.
+        Returns (obs, info), as if the state was the result of a `.reset()`.
+        """
+        data = BYTES_RESTORE + to_bytes(snapshot.id, 4) + (snapshot.blob or b"")
+        self.autoreset_data = None
+        self.terminal_return = None
+        reaction = self._build_reaction(self.client.send(data))
+
+        self.steps = snapshot.steps
+        self.last_reward = snapshot.last_reward
+        self.total_reward = snapshot.total_reward
+        self.last_reaction = reaction
+
+        return reaction.ndata, self._build_info(reaction)
+
+    def _perform_action(self, action, out=None):
+        resp = self.client.send(self._encode_action(action))
+        return self._build_reaction(resp, out)
+
+    def _encode_action(self, action):
+        cmds = self.action_cmds_draw if self.auto_draw else self.action_cmds
+        cmd = cmds[action]
+        # the step is sent as uint16 (it is used only for stats in the browser)
+        steps = self.steps & 0xFFFF
+        CMD_PAYLOAD.pack_into(cmd, 2, steps, self.last_reward, self.total_reward)
+        return cmd
+
+    def _build_reaction(self, data, out=None):
+        if data[0] == INT_VOBS:
+            # browser autoreset: the terminal OBS + the next game's first OBS
+            self.autoreset_data = data[3 + OBS_PAYLOAD_SIZE :]
+            return self._parse_obs(data, 3, out)
 
-    def _build_reaction(self, data):
         assert data[0] == INT_OBS, f"expected an OBS header, got: {data[0]}"
+        return self._parse_obs(data, 1, out)
+
+    def _parse_obs(self, data, offset, out=None):
+        # OBS payload at `offset`: flags, time, distance and 60 floats
+        # (12 bodyparts, 5 floats per part)
+        flags = data[offset]
+        floats = np.frombuffer(data, dtype=DTYPE, count=62, offset=offset + 1)
+        obsdata = floats[2:]
+        nobsdata = self._normalize(obsdata, out)
+        return Reaction(flags, floats[0], floats[1], obsdata, nobsdata)
 
-        flags = data[1]
-        floats = np.frombuffer(data[2:], dtype=DTYPE)
-        time = floats[0]
-        distance = floats[1]
-        obsdata = floats[2:]  # 60 floats (12 bodyparts, 5 floats per part)
-        nobsdata = self._normalize(obsdata)
-        return Reaction(flags, time, distance, obsdata, nobsdata)
-
-    def _normalize(self, obs):
-        length = len(obs)
-        nobs = np.zeros(length, dtype=DTYPE)
-
-        for i in range(0, len(obs), 5):
-            nobs[i] = self.pos_x.normalize(obs[i])
-            nobs[i + 1] = self.pos_y.normalize(obs[i + 1])
-            nobs[i + 2] = self.angle.normalize(obs[i + 2])
-            nobs[i + 3] = self.vel_x.normalize(obs[i + 3])
-            nobs[i + 4] = self.vel_y.normalize(obs[i + 4])
-
-        # Clamp values to -1..1
-        np.clip(nobs, -1, 1, out=nobs)
-        return nobs
+    def _normalize(self, obs, out=None):
+        if out is None and len(self.obs_buffers):
+            out = self.obs_buffers[self.obs_buffer_i]
+            self.obs_buffer_i = (self.obs_buffer_i + 1) % len(self.obs_buffers)
+
+        # Values are also clamped to -1..1
+        return self.normalizer.normalize(obs, out)
+
+    def _normalize_batch(self, obs):
+        # Vectorized version of _normalize (for step_many)
+        return self.normalizer.normalize_batch(obs)
 
     # r = reaction, lr = last_reaction
     def _calc_reward(self, reaction, last_reaction):
@@ -377,6 +932,23 @@ class QwopEnv(gym.Env):
 
         return rew
 
+    # Vectorized version of _calc_reward, for entries of `counts` steps each:
+    # the speed rewards of a step add up, the time costs add up via `dt`
+    def _calc_rewards(
+        self, time, distance, last_time, last_distance, game_over, is_success, counts
+    ):
+        ds = distance - last_distance
+        dt = time - last_time
+        v = ds / dt * counts
+        rew = v * self.speed_rew_mult - dt * self.time_cost_mult / self.frames_per_step
+        rew += np.where(
+            game_over,
+            np.where(is_success, self.success_reward, -self.failure_cost),
+            DTYPE(0),
+        )
+
+        return rew
+
     def _build_info(self, reaction):
         return {
             "time": reaction.time,
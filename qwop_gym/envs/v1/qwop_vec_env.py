@@ -0,0 +1,249 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import numpy as np
+import gymnasium as gym
+
+from .util.wsproto import WSProto, to_bytes
+from .util.wsclient import WSClientMock
+from .util.synthetic import SyntheticClient
+from .util.log import Log
+from .qwop_env import (
+    DTYPE,
+    BYTES_RELOAD,
+    parse_vobs,
+    build_action_set,
+    create_normalizer,
+    create_client,
+)
+
+
+class QwopVecEnv(gym.vector.VectorEnv):
+    """
+    A vectorized QwopEnv which hosts `num_envs` QWOP games within a single
+    browser (see QWOPVec.html) and steps all of them with a single message.
+
+    The i-th game is seeded with `seed + i`. Games are reset automatically
+    when terminated, in which case the final observation and info are
+    stored in `info["final_observation"]` and `info["final_info"]`.
+    Reseeding in-place and snapshots are not supported: the games can only
+    be reseeded via `.reset(seed=...)`, which reloads the page.
+
+    num_envs: Number of QWOP games to host.
+    All other arguments have the same meaning as in QwopEnv.
+    """
+
+    metadata = {"render_modes": [], "autoreset": True}
+
+    def __init__(
+        self,
+        num_envs,
+        browser=None,
+        driver=None,
+        failure_cost=10,
+        success_reward=50,
+        time_cost_mult=10,
+        frames_per_step=1,
+        game_in_browser=False,
+        text_in_browser=None,
+        reduced_action_set=False,
+        loglevel="WARN",
+        seed=None,
+        browser_mock=False,
+        transport="relay",
+        headless=False,
+        mock_kwargs=None,
+    ):
+        assert num_envs > 0 and num_envs < 2**16, "num_envs must be in 1..65535"
+
+        seedval = seed or np.random.default_rng().integers(2**31 - num_envs)
+        assert seedval >= 0 and seedval + num_envs - 1 <= np.iinfo(np.int32).max
+        self.seedval = int(seedval)
+
+        self.frames_per_step = frames_per_step
+        self.logger = Log.get_logger(__name__, loglevel)
+        self.proc = None
+
+        if browser_mock == "synthetic":
+            self.client = SyntheticClient(
+                seed=self.seedval,
+                stepsize=frames_per_step,
+                n_games=num_envs,
+                autoreset=True,
+                **(mock_kwargs or {}),
+            )
+        elif browser_mock:
+            self.client = WSClientMock()
+        else:
+            self.client, self.proc, self.shutdown = create_client(
+                transport=transport,
+                seed=self.seedval,
+                stepsize=frames_per_step,
+                stat_in_browser=False,
+                game_in_browser=game_in_browser,
+                text_in_browser=text_in_browser,
+                driver=driver,
+                browser=browser,
+                loglevel=loglevel,
+                n_games=num_envs,
+                autoreset=True,
+                headless=headless,
+            )
+
+        _, _, action_cmdflags = build_action_set(reduced_action_set, False)
+
+        super().__init__(
+            num_envs=num_envs,
+            observation_space=gym.spaces.Box(shape=(60,), low=-1, high=1, dtype=DTYPE),
+            action_space=gym.spaces.Discrete(len(action_cmdflags)),
+        )
+
+        self.speed_rew_mult = DTYPE(0.01)
+        self.time_cost_mult = DTYPE(time_cost_mult)
+        self.failure_cost = DTYPE(failure_cost)
+        self.success_reward = DTYPE(success_reward)
+        self.normalizer = create_normalizer()
+
+        # cmdflags for each action, indexed by the action itself
+        self.action_cmdflags = np.array(
+            [WSProto.CMD_STP | f for f in action_cmdflags], dtype=np.uint8
+        )
+
+        self.cmd = bytearray(1 + num_envs)
+        self.cmd[0] = WSProto.H_VCMD
+        self.actions = None
+
+        self.last_time = np.zeros(num_envs, dtype=DTYPE)
+        self.last_distance = np.zeros(num_envs, dtype=DTYPE)
+
+        self.logger.info("Initialized %d games with seed: %d" % (num_envs, seedval))
+
+    def reset_async(self, seed=None, options=None):
+        pass
+
+    def reset_wait(self, seed=None, options=None):
+        if seed is not None:
+            # QWOP's seed can be changed ONLY if reloading the page,
+            # where game i is always seeded with seed+i
+            if isinstance(seed, int):
+                seed = [seed + i for i in range(self.num_envs)]
+
+            assert list(seed) == list(range(seed[0], seed[0] + self.num_envs)), (
+                "seeds must be consecutive, got: %s" % seed
+            )
+            assert seed[0] >= 0 and seed[-1] <= np.iinfo(np.int32).max
+            self.seedval = seed[0]
+
+            data = self.client.send(BYTES_RELOAD + to_bytes(self.seedval, 4))
+            assert data[0] == WSProto.H_ACK, f"expected an ACK header, got: {data[0]}"
+
+        records = self._send_cmd(np.full(self.num_envs, WSProto.CMD_RST))
+        self.last_time[:] = records["time"]
+        self.last_distance[:] = records["distance"]
+
+        obs = self.normalizer.normalize_batch(records["obs"])
+        info = self._build_info(records["time"], records["distance"], records["flags"])
+        return obs, info
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        records = self._send_cmd(self.action_cmdflags[self.actions])
+
+        # Games reset by the browser (autoreset) are appended to the reply
+        first_records = records[self.num_envs :]
+        records = records[: self.num_envs]
+
+        time = records["time"]
+        distance = records["distance"]
+        flags = records["flags"]
+
+        game_over = (flags & WSProto.OBS_END) != 0
+        is_success = (flags & WSProto.OBS_SUC) != 0
+
+        obs = self.normalizer.normalize_batch(records["obs"])
+        rewards = self._calc_rewards(time, distance, game_over, is_success)
+        info = self._build_info(time, distance, flags)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+
+        self.last_time[:] = time
+        self.last_distance[:] = distance
+
+        if game_over.any():
+            self._autoreset(game_over, obs, info, first_records)
+
+        return obs, rewards, game_over, truncated, info
+
+    def _autoreset(self, game_over, obs, info, records):
+        if len(records) == 0:
+            # Only games with non-zero cmdflags are reset (and observed)
+            records = self._send_cmd(np.where(game_over, WSProto.CMD_RST, 0))
+
+        final_obs = np.full(self.num_envs, None, dtype=object)
+        final_info = np.full(self.num_envs, None, dtype=object)
+
+        for i in np.flatnonzero(game_over):
+            final_obs[i] = obs[i].copy()
+            final_info[i] = {k: v[i] for k, v in info.items() if k[0] != "_"}
+
+        info["final_observation"] = final_obs
+        info["_final_observation"] = game_over
+        info["final_info"] = final_info
+        info["_final_info"] = game_over
+
+        obs[game_over] = self.normalizer.normalize_batch(records["obs"])
+        self.last_time[game_over] = records["time"]
+        self.last_distance[game_over] = records["distance"]
+
+    def _send_cmd(self, cmdflags):
+        self.cmd[1:] = cmdflags.astype(np.uint8).tobytes()
+        return parse_vobs(self.client.send(self.cmd))
+
+    def _calc_rewards(self, time, distance, game_over, is_success):
+        ds = distance - self.last_distance
+        dt = time - self.last_time
+        v = ds / dt
+        rew = v * self.speed_rew_mult - dt * self.time_cost_mult / self.frames_per_step
+        rew += np.where(
+            game_over,
+            np.where(is_success, self.success_reward, -self.failure_cost),
+            DTYPE(0),
+        )
+
+        return rew
+
+    def _build_info(self, time, distance, flags):
+        mask = np.ones(self.num_envs, dtype=bool)
+
+        return {
+            "time": time,
+            "_time": mask,
+            "distance": distance,
+            "_distance": mask,
+            "avgspeed": distance / time,
+            "_avgspeed": mask,
+            "is_success": (flags & WSProto.OBS_SUC) != 0,
+            "_is_success": mask,
+        }
+
+    def close_extras(self, **kwargs):
+        self.client.close()
+
+        if self.proc and self.proc.is_alive():
+            self.shutdown.set()
+            self.proc.join(timeout=2)
+            self.proc.terminate()
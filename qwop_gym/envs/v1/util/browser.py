@@ -0,0 +1,183 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import os
+import time
+import uuid
+import pathlib
+import urllib.parse
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+
+GAME_DIR = pathlib.Path(__file__).parents[1].joinpath("game")
+
+
+def ensure_patched():
+    path = GAME_DIR.joinpath("QWOP.min.js")
+    if not os.path.exists(path):
+        msg = """
+Could not find patched QWOP.min.js. To fix this error, run the command:
+curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
+"""
+
+        raise Exception(msg)
+
+
+class Browser:
+    """
+    Manages the lifecycle of a chrome-based web browser (via chromedriver)
+    which loads the QWOP game page.
+    """
+
+    def __init__(
+        self,
+        driver,
+        browser,
+        stepsize,
+        stat_in_browser,
+        text_in_browser,
+        game_in_browser,
+        n_games=1,
+        autoreset=False,
+        headless=False,
+    ):
+        self.driver = driver
+        self.browser = browser
+        self.stepsize = stepsize
+        self.stat_in_browser = stat_in_browser
+        self.text_in_browser = text_in_browser
+        self.game_in_browser = game_in_browser
+        self.n_games = n_games
+        self.autoreset = autoreset
+        self.headless = headless
+
+        self._driver = None
+        self._window = None
+        self._tabs = {}  # tab name => window handle
+
+    def build_url(self, port, seed, session=0):
+        # Multiple games are hosted in iframes within QWOPVec.html
+        page = "QWOPVec.html" if self.n_games > 1 else "QWOP.html"
+        url = "file://%s" % GAME_DIR.joinpath(page)
+        url += "?port=%d" % port
+        url += "&seed=%d" % seed
+        url += "&game=%d" % self.game_in_browser
+        url += "&stat=%d" % self.stat_in_browser
+        url += "&text=%s" % urllib.parse.quote_plus(self.text_in_browser or "")
+        url += "&intro=0"
+        url += "&stepsize=%d" % self.stepsize
+        url += "&autoreset=%d" % self.autoreset
+        url += "&headless=%d" % self.headless
+
+        if self.n_games > 1:
+            url += "&n=%d" % self.n_games
+
+        if session:
+            url += "&session=%d" % session
+
+        return url
+
+    def launch(self, url, name=None):
+        options = webdriver.ChromeOptions()
+        options.add_argument("allow-file-access-from-files")
+        options.add_argument("allow-cross-origin-auth-prompt")
+        options.add_argument("user-agent=Chrome-%s" % uuid.uuid4())
+        options.add_argument("disable-infobars")
+        options.add_argument("disable-extensions")
+        options.add_argument("disable-popup-blocking")
+        options.add_argument("disable-notifications")
+
+        # keep background windows (see `load_tab`) running at full speed
+        options.add_argument("disable-background-timer-throttling")
+        options.add_argument("disable-backgrounding-occluded-windows")
+        options.add_argument("disable-renderer-backgrounding")
+
+        if self.headless:
+            options.add_argument("headless=new")
+
+        if self.n_games > 1:
+            options.add_argument("window-size=1300,850")
+            options.add_argument("window-position=650,130")
+        elif self.game_in_browser and (self.stat_in_browser or self.text_in_browser):
+            options.add_argument("window-size=1160,585")
+            options.add_argument("window-position=650,130")
+        else:
+            options.add_argument("window-size=660,585")
+            options.add_argument("window-position=650,130")
+
+        # keeping a ref to the driver keeps it running
+        # also, it allows to be explicitly closed on exit
+
+        # https://www.selenium.dev/documentation/webdriver/getting_started/upgrade_to_selenium_4/#python-1
+        service = ChromeService(executable_path=self.driver)
+
+        # https://community.brave.com/t/is-there-a-selenium-driver-for-brave-browser/49696/4
+        options.binary_location = self.browser
+        options.add_argument("--incognito")
+
+        self._driver = webdriver.Chrome(service=service, options=options)
+        self._window = self._driver.window_handles[0]
+        self._tabs = {}
+        self._driver.get(url)
+
+        if name:
+            # allows the window to be reused by `load_tab`
+            self._driver.execute_script("window.name = arguments[0]", name)
+            self._tabs[name] = self._window
+
+        return self._window
+
+    def debugger_address(self):
+        """Returns the "host:port" of the browser's DevTools protocol endpoint."""
+        return self._driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+
+    def load(self, url):
+        self._driver.get(url)
+
+    def load_tab(self, url, name):
+        """
+        Loads `url` in a background window called `name` (opened if needed)
+        without waiting for the page to load. Returns the window's handle.
+        """
+
+        # A popup window, as requestAnimationFrame is paused in hidden tabs
+        handles = set(self._driver.window_handles)
+        self._driver.execute_script(
+            "window.open(arguments[0], arguments[1], 'popup')", url, name
+        )
+
+        if name not in self._tabs:
+            deadline = time.time() + 5
+            while not (new_handles := set(self._driver.window_handles) - handles):
+                assert time.time() < deadline, "timed out opening tab: %s" % name
+                time.sleep(0.01)
+
+            self._tabs[name] = new_handles.pop()
+
+        return self._tabs[name]
+
+    def activate(self, handle):
+        """Makes the given window the active one (eg. for `is_alive`)."""
+        self._driver.switch_to.window(handle)
+        self._window = handle
+
+    def is_alive(self):
+        return self._driver is not None and self._window in self._driver.window_handles
+
+    def quit(self):
+        if self._driver:
+            self._driver.quit()
+            self._driver = None
@@ -0,0 +1,157 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import sys
+import json
+import time
+import base64
+import itertools
+import urllib.request
+from websockets.sync import client
+from websockets.exceptions import ConnectionClosed
+
+from .wsproto import WSProto, to_bytes
+from .log import Log
+from .browser import Browser, ensure_patched
+from . import metrics
+
+BYTES_ACK = to_bytes(WSProto.H_ACK)
+
+
+class CDPClient:
+    """
+    A drop-in replacement for WSClient which talks to the game page via the
+    Chrome DevTools Protocol (CDP) instead of a WebSocket connection opened
+    by the page itself. Each message is passed to the page's `CDP_HANDLE()`
+    function via a single `Runtime.evaluate` call and the (base64-encoded)
+    reply is returned by value.
+
+    The CDP endpoint is the one which chromedriver already enables in the
+    browser, so no extra browser flags are needed.
+    """
+
+    def __init__(self, seed, driver, browser, loglevel, **browser_kwargs):
+        ensure_patched()
+
+        self.seed = seed
+        self.logger = Log.get_logger(__name__, loglevel)
+        self.browser = Browser(driver=driver, browser=browser, **browser_kwargs)
+        self.ws = None
+        self.ids = itertools.count(1)
+        self._launch_browser()
+
+    def _launch_browser(self):
+        self.logger.info("Launching web browser...")
+        self.browser.quit()
+
+        # port=0 tells the page not to open a WebSocket connection
+        self.browser.launch(self.browser.build_url(0, self.seed))
+        self._connect()
+        self._wait_ready(timeout=30)
+
+    def _connect(self):
+        address = self.browser.debugger_address()
+        self.logger.info("Connecting to DevTools endpoint at %s" % address)
+
+        with urllib.request.urlopen("http://%s/json" % address) as resp:
+            targets = json.load(resp)
+
+        target = next(t for t in targets if t["type"] == "page")
+        self._close_ws()
+        self.ws = client.connect(target["webSocketDebuggerUrl"], max_size=None)
+
+    def _reload(self, seed):
+        self.logger.info("Reloading browser page with new seed: %s" % seed)
+        self.seed = seed
+        self.browser.load(self.browser.build_url(0, self.seed))
+        self._wait_ready(timeout=5)
+
+    def _wait_ready(self, timeout):
+        deadline = time.time() + timeout
+
+        while not self._evaluate("window.CDP_READY === true", await_promise=False):
+            if time.time() > deadline:
+                raise Exception("Timed out waiting for the browser page")
+            time.sleep(0.05)
+
+        self.logger.info("Browser page ready")
+
+    def _evaluate(self, expression, await_promise=True):
+        msg_id = next(self.ids)
+        params = {
+            "expression": expression,
+            "returnByValue": True,
+            "awaitPromise": await_promise,
+        }
+
+        self.ws.send(
+            json.dumps({"id": msg_id, "method": "Runtime.evaluate", "params": params})
+        )
+
+        while True:
+            resp = json.loads(self.ws.recv(timeout=3))
+
+            # skip events and replies to earlier (timed out) requests
+            if resp.get("id") == msg_id:
+                break
+
+        if "error" in resp:
+            raise Exception("CDP error: %s" % resp["error"])
+
+        result = resp["result"]
+
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            exception = details.get("exception", {})
+            msg = exception.get("description") or details.get("text")
+            raise Exception("JS error: %s" % msg)
+
+        return result["result"].get("value")
+
+    def send(self, data):
+        if data[0] == WSProto.H_RLD:
+            self._reload(int.from_bytes(data[1:5], sys.byteorder))
+            return BYTES_ACK
+
+        if data[0] == WSProto.H_SEED:
+            # a page reload (eg. browser relaunch) must use the new seed
+            self.seed = int.from_bytes(data[1:5], sys.byteorder)
+
+        expression = 'CDP_HANDLE("%s")' % base64.b64encode(data).decode()
+
+        while True:
+            try:
+                return base64.b64decode(self._evaluate(expression))
+            except (OSError, TimeoutError, ConnectionClosed) as e:
+                self.logger.warn("Failed to send/receive: %s" % str(e))
+                metrics.RECONNECTS.inc()
+
+                if self.browser.is_alive():
+                    self.logger.info("Reconnecting to DevTools endpoint...")
+                    self._connect()
+                else:
+                    self.logger.error("Browser window not found")
+                    self._close_ws()
+                    self._launch_browser()
+
+    def _close_ws(self):
+        if self.ws:
+            self.ws.close()
+            self.ws = None
+
+    def close(self):
+        self._close_ws()
+        self.browser.quit()
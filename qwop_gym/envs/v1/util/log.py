@@ -14,6 +14,8 @@
 # limitations under the License.
 # =============================================================================
 
+import os
+import time
 import logging
 import hashlib
 from datetime import datetime
@@ -51,11 +53,18 @@ class Log:
         WSProto.H_LOG: "H_LOG",
         WSProto.H_ERR: "H_ERR",
         WSProto.H_RLD: "H_RLD",
+        WSProto.H_VCMD: "H_VCMD",
+        WSProto.H_VOBS: "H_VOBS",
+        WSProto.H_SEQ: "H_SEQ",
+        WSProto.H_SEED: "H_SEED",
+        WSProto.H_SAV: "H_SAV",
+        WSProto.H_RES: "H_RES",
     }
 
     REGMAP = {
         WSProto.REG_JS: "REG_JS",
         WSProto.REG_PY: "REG_PY",
+        WSProto.REG_PROBE: "REG_PROBE",
     }
 
     CMDMAP = {
@@ -83,10 +92,14 @@ class Log:
         logger = logging.getLogger(name.split(".")[-1])
         logger.setLevel(getattr(logging, level))
 
+        # loggers are global: add the handler only once per logger
+        if any(isinstance(h, LogHandler) for h in logger.handlers):
+            return logger
+
         fmt = "-- %(reltime)ss [%(name)s] %(levelname)s: %(message)s"
         formatter = RelativeTimeFormatter(fmt)
 
-        loghandler = logging.StreamHandler()
+        loghandler = LogHandler()
         loghandler.setLevel(logging.DEBUG)
         loghandler.setFormatter(formatter)
         logger.addHandler(loghandler)
@@ -212,3 +225,65 @@ class Log:
         md5 = hashlib.md5()
         md5.update(data)
         return md5.hexdigest()
+
+
+class LogHandler(logging.StreamHandler):
+    """The handler added by Log.get_logger (used to avoid duplicates)."""
+
+
+class FrameTracer:
+    """
+    Logs the in/outbound frames of a relay (WSServer, WSHub).
+
+    By default, all frames are logged if `logger` is at DEBUG level.
+    For diagnosing long runs, the QWOP_GYM_TRACE env var enables a sampled
+    trace, regardless of the log level: "N" logs every Nth frame and "Ns"
+    logs at most one frame every N seconds (eg. "1000" or "2.5s").
+
+    Callers must check `.enabled` first, so that a disabled tracer costs
+    a single attribute lookup per frame:
+
+        if tracer.enabled:
+            tracer.inbound(data, peer)
+    """
+
+    def __init__(self, logger, spec=None):
+        spec = os.environ.get("QWOP_GYM_TRACE", "") if spec is None else spec
+        self.every = 1
+        self.interval = 0
+        self.count = 0
+        self.next_time = 0
+
+        if spec.endswith("s"):
+            self.interval = float(spec[:-1])
+        elif spec:
+            self.every = int(spec)
+
+        if spec:
+            self.logger = Log.get_logger("%s_trace" % logger.name, "DEBUG")
+            self.enabled = True
+        else:
+            self.logger = logger
+            self.enabled = logger.isEnabledFor(logging.DEBUG)
+
+    def inbound(self, data, client):
+        if self._sample():
+            self.logger.debug(Log.format_inbound(data, client))
+
+    def outbound(self, data, client):
+        if self._sample():
+            self.logger.debug(Log.format_outbound(data, client))
+
+    def _sample(self):
+        self.count += 1
+
+        if self.count % self.every:
+            return False
+
+        if self.interval:
+            now = time.monotonic()
+            if now < self.next_time:
+                return False
+            self.next_time = now + self.interval
+
+        return True
@@ -0,0 +1,278 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import os
+import json
+import time
+import bisect
+import atexit
+import threading
+
+# Histogram bucket upper bounds (seconds): 1us, ~3us, 10us, ..., 10s
+DEFAULT_BUCKETS = tuple(round(10 ** (e / 2), 7) for e in range(-12, 3))
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+    def prometheus(self):
+        return ["%s %s" % (self.name, self.value)]
+
+    def json(self):
+        return dict(type="counter", help=self.help, value=self.value)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def cumulative(self):
+        total = 0
+
+        for le, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield le, total
+
+    def prometheus(self):
+        lines = [
+            '%s_bucket{le="%s"} %d' % (self.name, le, count)
+            for le, count in self.cumulative()
+        ]
+
+        lines.append("%s_sum %s" % (self.name, self.sum))
+        lines.append("%s_count %d" % (self.name, sum(self.counts)))
+        return lines
+
+    def json(self):
+        return dict(
+            type="histogram",
+            help=self.help,
+            buckets={str(le): count for le, count in self.cumulative()},
+            sum=self.sum,
+            count=sum(self.counts),
+        )
+
+
+class Registry:
+    """
+    A process-wide set of metrics (see REGISTRY).
+
+    Metrics on the hot path (eg. per step) are collected only if the
+    registry is `.enabled` when the env is created, so that disabled
+    metrics cost nothing.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.enabled = False
+        self.lock = threading.Lock()
+
+    def counter(self, name, help):
+        return self._get_or_create(Counter, name, help)
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help, buckets)
+
+    def _get_or_create(self, cls, name, *args):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, *args)
+
+            metric = self.metrics[name]
+            assert isinstance(metric, cls), "%s is not a %s" % (name, cls.__name__)
+            return metric
+
+    def to_prometheus(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        kinds = {Counter: "counter", Histogram: "histogram"}
+
+        for metric in list(self.metrics.values()):
+            lines.append("# HELP %s %s" % (metric.name, metric.help))
+            lines.append("# TYPE %s %s" % (metric.name, kinds[type(metric)]))
+            lines.extend(metric.prometheus())
+
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        metrics = {m.name: m.json() for m in list(self.metrics.values())}
+        return json.dumps(dict(time=time.time(), metrics=metrics), indent=2)
+
+    def dump(self, path):
+        """
+        Writes all metrics to `path` as JSON (for a ".json" file) or in the
+        Prometheus text format (eg. for node_exporter's textfile collector).
+        A "{pid}" in the path is replaced by the process id.
+        """
+
+        path = path.format(pid=os.getpid())
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+
+        # readers must never see a partially written file
+        tmp = "%s.tmp" % path
+        with open(tmp, "w") as f:
+            f.write(text)
+
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+#
+# Metrics of the env and its browser client
+#
+
+ROUNDTRIP = REGISTRY.histogram(
+    "qwop_client_roundtrip_seconds", "Time from sending a message to the reply"
+)
+BYTES_SENT = REGISTRY.counter("qwop_client_sent_bytes_total", "Bytes sent")
+BYTES_RECEIVED = REGISTRY.counter("qwop_client_received_bytes_total", "Bytes received")
+RECONNECTS = REGISTRY.counter(
+    "qwop_client_reconnects_total", "Reconnects after a failed send/receive"
+)
+STEPS = REGISTRY.counter("qwop_env_steps_total", "Steps taken")
+RESETS = REGISTRY.counter("qwop_env_resets_total", "Resets")
+RELOADS = REGISTRY.counter("qwop_env_reloads_total", "Resets with a page reload")
+NORMALIZE = REGISTRY.histogram(
+    "qwop_env_normalize_seconds", "Time spent normalizing observations"
+)
+REWARD = REGISTRY.histogram("qwop_env_reward_seconds", "Time spent calculating rewards")
+
+
+def timed(fn, histogram):
+    """Returns `fn` wrapped to observe the duration of each call."""
+
+    def wrapper(*args, **kwargs):
+        t = time.perf_counter()
+        result = fn(*args, **kwargs)
+        histogram.observe(time.perf_counter() - t)
+        return result
+
+    return wrapper
+
+
+def counted(fn, counter):
+    """Returns `fn` wrapped to count its calls."""
+
+    def wrapper(*args, **kwargs):
+        counter.inc()
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class MeteredClient:
+    """
+    Wraps a client (WSClient, WSDirectClient, ...) and collects the
+    round-trip time and the size of the frames it exchanges.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def send(self, data):
+        t = time.perf_counter()
+        resp = self.client.send(data)
+        ROUNDTRIP.observe(time.perf_counter() - t)
+        BYTES_SENT.inc(len(data))
+        BYTES_RECEIVED.inc(len(resp))
+        return resp
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncMeteredClient(MeteredClient):
+    async def send(self, data):
+        t = time.perf_counter()
+        resp = await self.client.send(data)
+        ROUNDTRIP.observe(time.perf_counter() - t)
+        BYTES_SENT.inc(len(data))
+        BYTES_RECEIVED.inc(len(resp))
+        return resp
+
+    async def close(self):
+        await self.client.close()
+
+
+class Exporter(threading.Thread):
+    """Dumps the registry to a file every `interval` seconds and at exit."""
+
+    def __init__(self, registry, path, interval):
+        super().__init__(daemon=True)
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.pid = os.getpid()
+        atexit.register(self.registry.dump, path)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.registry.dump(self.path)
+
+
+_exporter = None
+
+
+def start_exporter(path, interval=10, registry=REGISTRY):
+    """
+    Enables the registry and starts dumping it to `path` (see
+    Registry.dump) every `interval` seconds, unless already started.
+    """
+
+    global _exporter
+
+    # a forked process needs its own exporter
+    if _exporter is None or _exporter.pid != os.getpid():
+        registry.enabled = True
+        _exporter = Exporter(registry, path, interval)
+        _exporter.start()
+
+    return _exporter
+
+
+def maybe_start_exporter():
+    """
+    Starts the exporter if the QWOP_GYM_METRICS env var is set to a file
+    path. QWOP_GYM_METRICS_INTERVAL sets the interval (10 seconds).
+    """
+
+    path = os.environ.get("QWOP_GYM_METRICS")
+
+    if path:
+        interval = float(os.environ.get("QWOP_GYM_METRICS_INTERVAL", 10))
+        start_exporter(path, interval)
@@ -0,0 +1,298 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import io
+import sys
+import copy
+import json
+import time
+import struct
+import numpy as np
+import PIL.Image
+
+from .wsproto import WSProto, to_bytes
+
+OBS_PAYLOAD = struct.Struct("=Bff")
+FRAME_DURATION = 1 / 30  # seconds, as in the browser (TIMESTEP_SIZE)
+N_BODYPARTS = 12
+SUCCESS_DISTANCE = 105
+
+
+class SyntheticGame:
+    """
+    A fake QWOP game whose episodes are planned on reset: a random length
+    and outcome, with the runner's distance moving towards the outcome.
+    """
+
+    def __init__(self, seed, stepsize, episode_steps, success_rate):
+        self.rng = np.random.default_rng(seed)
+        self.stepsize = stepsize
+        self.episode_steps = episode_steps
+        self.success_rate = success_rate
+        self.reset()
+
+    def reset(self):
+        lo, hi = self.episode_steps
+        self.length = int(self.rng.integers(lo, hi + 1))
+        self.success = bool(self.rng.random() < self.success_rate)
+        end = SUCCESS_DISTANCE if self.success else self.rng.uniform(-10, 60)
+        self.speed = end / self.length
+
+        self.steps = 0
+        self.time = 0.0
+        self.distance = 0.0
+        self.parts = np.zeros((N_BODYPARTS, 5), dtype=np.float32)
+        self.parts[:, 1] = self.rng.uniform(-5, 5, N_BODYPARTS)  # pos_y
+
+    def step(self, cmd):
+        self.steps += 1
+        self.time += FRAME_DURATION * self.stepsize
+
+        # keys add some action-dependent noise to the progress
+        keys = bin(cmd & 0b11110).count("1")
+        ds = self.speed * (1 + self.rng.normal(0, 0.5) + 0.1 * (keys - 2))
+        self.distance += ds
+
+        parts = self.parts
+        parts[:, 3] = ds * 10  # vel_x
+        parts[:, 4] = self.rng.normal(0, 5, N_BODYPARTS)  # vel_y
+        parts[:, 0] = self.distance * 10 + self.rng.normal(0, 5, N_BODYPARTS)
+        parts[:, 1] = np.clip(parts[:, 1] + parts[:, 4] * 0.01, -10, 10)
+        parts[:, 2] = np.clip(parts[:, 2] + self.rng.normal(0, 0.1), -6, 6)
+
+    def state(self):
+        """Returns the game state as a JSON-serializable dict."""
+        return dict(
+            rng=self.rng.bit_generator.state,
+            length=self.length,
+            success=self.success,
+            speed=self.speed,
+            steps=self.steps,
+            time=self.time,
+            distance=self.distance,
+            parts=self.parts.tolist(),
+        )
+
+    def set_state(self, state):
+        self.rng.bit_generator.state = state["rng"]
+        self.length = state["length"]
+        self.success = state["success"]
+        self.speed = state["speed"]
+        self.steps = state["steps"]
+        self.time = state["time"]
+        self.distance = state["distance"]
+        self.parts = np.array(state["parts"], dtype=np.float32)
+
+    def flags(self):
+        if self.steps < self.length:
+            return 0
+
+        return WSProto.OBS_END | (WSProto.OBS_SUC if self.success else 0)
+
+    def payload(self):
+        # On the last step, the distance is exactly the planned outcome
+        if self.steps >= self.length:
+            self.distance = self.speed * self.length
+
+        head = OBS_PAYLOAD.pack(self.flags(), self.time, self.distance)
+        return head + self.parts.tobytes()
+
+
+class SyntheticClient:
+    """
+    A WSClientMock-compatible client which simulates the browser with
+    seeded, time-advancing SyntheticGames, for load-testing the python side
+    (vec envs, training loops, recording) without a browser.
+
+    episode_steps: (min, max) number of steps of an episode.
+    success_rate: Probability of an episode ending with success.
+    latency_ms: Mean simulated browser round-trip latency.
+    latency_dist: Latency distribution: "const", "exponential" or
+        "lognormal" (with `latency_sigma` as its shape parameter).
+    autoreset: Reset games right after a step ends them, as the browser
+        does in autoreset mode.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        stepsize=1,
+        n_games=1,
+        episode_steps=(100, 1000),
+        success_rate=0.1,
+        latency_ms=0,
+        latency_dist="const",
+        latency_sigma=0.5,
+        autoreset=False,
+    ):
+        assert latency_dist in ("const", "exponential", "lognormal")
+        self.seed = seed
+        self.game_kwargs = dict(
+            stepsize=stepsize,
+            episode_steps=tuple(episode_steps),
+            success_rate=success_rate,
+        )
+        self.games = [
+            SyntheticGame(seed + i, **self.game_kwargs) for i in range(n_games)
+        ]
+        self.latency = latency_ms / 1000
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.autoreset = autoreset
+        self.latency_rng = np.random.default_rng(seed)
+        self.snapshots = {}
+        self.image = None
+
+    def send(self, data):
+        if self.latency:
+            time.sleep(self._sample_latency())
+
+        game = self.games[0]
+
+        if len(self.games) > 1 and data[0] not in (WSProto.H_VCMD, WSProto.H_RLD):
+            # as in the browser (see QWOPVec.html)
+            raise Exception(
+                "Unsupported header for %d games: %d" % (len(self.games), data[0])
+            )
+
+        match data[0]:
+            case WSProto.H_CMD:
+                if data[1] & WSProto.CMD_IMG:
+                    return self._image()
+
+                payload = self._apply(game, data[1])
+
+                # as in the browser: timed CMDs are never autoreset
+                if len(data) <= WSProto.CMD_SIZE and self._ended(game, data[1]):
+                    game.reset()
+                    return self._vobs([payload, game.payload()])
+
+                return to_bytes(WSProto.H_OBS) + payload
+            case WSProto.H_SEQ:
+                return self._sequence(game, data[1:])
+            case WSProto.H_VCMD:
+                payloads = []
+                ended = []
+
+                for g, cmd in zip(self.games, data[1:]):
+                    if cmd:
+                        payloads.append(self._apply(g, cmd))
+                        if self._ended(g, cmd):
+                            ended.append(g)
+
+                # reset games are appended to the reply (see vec.js)
+                for g in ended:
+                    g.reset()
+                    payloads.append(g.payload())
+
+                return self._vobs(payloads)
+            case WSProto.H_RLD | WSProto.H_SEED:
+                self.seed = int.from_bytes(data[1:5], sys.byteorder)
+                self.games = [
+                    SyntheticGame(self.seed + i, **self.game_kwargs)
+                    for i in range(len(self.games))
+                ]
+
+                if data[0] == WSProto.H_RLD:
+                    return to_bytes(WSProto.H_ACK)
+
+                return to_bytes(WSProto.H_OBS) + self.games[0].payload()
+            case WSProto.H_SAV:
+                sid = len(self.snapshots) + 1
+                self.snapshots[sid] = copy.deepcopy(game)
+                blob = json.dumps(game.state()).encode() if data[1] else b""
+                return to_bytes(WSProto.H_SAV) + to_bytes(sid, 4) + blob
+            case WSProto.H_RES:
+                # as in the browser: the blob takes precedence over the store
+                sid = int.from_bytes(data[1:5], sys.byteorder)
+
+                if len(data) > 5:
+                    self.games[0] = copy.deepcopy(game)
+                    self.games[0].set_state(json.loads(data[5:]))
+                elif sid in self.snapshots:
+                    self.games[0] = copy.deepcopy(self.snapshots[sid])
+                else:
+                    raise Exception("Unknown snapshot: %d" % sid)
+
+                return to_bytes(WSProto.H_OBS) + self.games[0].payload()
+            case _:
+                raise Exception("Unexpected header: %d" % data[0])
+
+    def _apply(self, game, cmd):
+        if cmd & WSProto.CMD_RST:
+            game.reset()
+
+        if cmd & WSProto.CMD_STP:
+            game.step(cmd)
+
+        return game.payload()
+
+    def _ended(self, game, cmd):
+        # Whether the game is to be reset after the step (autoreset)
+        return self.autoreset and cmd & WSProto.CMD_STP and game.flags()
+
+    def _sequence(self, game, pairs):
+        payloads = []
+        steps = 0
+
+        for cmd, repeat in zip(pairs[::2], pairs[1::2]):
+            for _ in range(max(repeat, 1)):
+                payload = self._apply(game, cmd)
+                steps += 1
+                if game.flags():
+                    break
+
+            payloads.append(payload)
+
+            if game.flags():
+                break
+
+        reply = self._vobs(payloads) + to_bytes(steps, 4)
+
+        if self._ended(game, cmd):
+            game.reset()
+            reply += game.payload()
+
+        return reply
+
+    def _vobs(self, payloads):
+        header = to_bytes(WSProto.H_VOBS) + to_bytes(len(payloads), 2)
+        return header + b"".join(payloads)
+
+    def _image(self):
+        if self.image is None:
+            buf = io.BytesIO()
+            PIL.Image.new("RGB", (640, 400)).save(buf, format="JPEG")
+            self.image = (
+                to_bytes(WSProto.H_IMG) + to_bytes(WSProto.IMG_JPG) + buf.getvalue()
+            )
+
+        return self.image
+
+    def _sample_latency(self):
+        match self.latency_dist:
+            case "const":
+                return self.latency
+            case "exponential":
+                return self.latency_rng.exponential(self.latency)
+            case "lognormal":
+                # scaled to have a mean of self.latency
+                sigma = self.latency_sigma
+                mu = np.log(self.latency) - sigma**2 / 2
+                return self.latency_rng.lognormal(mu, sigma)
+
+    def close(self):
+        pass
@@ -0,0 +1,153 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import time
+import struct
+
+from .wsproto import WSProto
+
+# File format: MAGIC, followed by records of:
+# direction (uint8) + timestamp in seconds (float64) + length (uint32) + data
+MAGIC = b"QWOPWIRE\x01"
+RECORD_HEADER = struct.Struct("<BdI")
+DIR_OUT = 0  # py->js
+DIR_IN = 1  # js->py
+
+# Command flags which change the kind of the browser's response
+CMD_KIND_FLAGS = WSProto.CMD_RST | WSProto.CMD_IMG | WSProto.CMD_DRW
+
+
+def read_capture(path):
+    """Returns the (direction, timestamp, data) records of a capture file."""
+    with open(path, "rb") as f:
+        buf = f.read()
+
+    assert buf.startswith(MAGIC), "not a wire capture file: %s" % path
+    offset = len(MAGIC)
+    records = []
+
+    while offset < len(buf):
+        direction, ts, length = RECORD_HEADER.unpack_from(buf, offset)
+        offset += RECORD_HEADER.size
+        records.append((direction, ts, buf[offset : offset + length]))
+        offset += length
+
+    return records
+
+
+def request_key(data):
+    """Returns what identifies the kind of response a request gets."""
+    if data[0] == WSProto.H_CMD:
+        return (data[0], data[1] & CMD_KIND_FLAGS)
+
+    return (data[0], None)
+
+
+def request_body(data):
+    """Returns a request without its timing trailer (if any)."""
+    if data[0] == WSProto.H_CMD:
+        return data[: WSProto.CMD_SIZE]
+
+    return data
+
+
+class CaptureClient:
+    """
+    Wraps a client (WSClient, WSDirectClient, ...) and captures all frames
+    it exchanges with the browser into a binary file (see ReplayClient).
+    """
+
+    def __init__(self, client, path):
+        self.client = client
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.t0 = time.perf_counter()
+
+    def send(self, data):
+        self._write(DIR_OUT, data)
+        resp = self.client.send(data)
+        self._write(DIR_IN, resp)
+        # a crashed process must not leave a truncated capture behind
+        self.file.flush()
+        return resp
+
+    def _write(self, direction, data):
+        ts = time.perf_counter() - self.t0
+        self.file.write(RECORD_HEADER.pack(direction, ts, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        self.client.close()
+
+
+class ReplayClient:
+    """
+    A WSClientMock-compatible client which replays the browser responses
+    from a file written by CaptureClient, at full speed.
+
+    Responses are replayed in the captured order, cycling back to the start
+    when exhausted. If a request is of a different kind than the next
+    captured one (eg. a RST instead of a step, see request_key), the next
+    captured exchange of the same kind is replayed instead. An error is
+    raised if there is no such exchange at all.
+
+    With `strict=True`, each request must be identical to the next captured
+    one (timing trailers aside), ie. the workload must be replayed exactly
+    as captured - an error is raised at the first mismatch.
+    """
+
+    def __init__(self, path, strict=False):
+        records = read_capture(path)
+        outs = [data for direction, _, data in records if direction == DIR_OUT]
+        ins = [data for direction, _, data in records if direction == DIR_IN]
+        self.exchanges = list(zip(outs, ins))
+        self.i = 0
+        self.strict = strict
+
+        assert self.exchanges, "no exchanges found in capture file: %s" % path
+
+    def send(self, data):
+        if self.strict:
+            return self._send_strict(data)
+
+        n = len(self.exchanges)
+        key = request_key(data)
+
+        for j in range(n):
+            i = (self.i + j) % n
+            req, resp = self.exchanges[i]
+
+            if request_key(req) == key:
+                self.i = (i + 1) % n
+                return resp
+
+        raise Exception("No captured response for request: %s" % data.hex())
+
+    def _send_strict(self, data):
+        req, resp = self.exchanges[self.i]
+
+        if request_body(req) != request_body(data):
+            raise Exception(
+                "Request #%d does not match the capture: %s (expected: %s)"
+                % (self.i, data.hex(), req.hex())
+            )
+
+        self.i = (self.i + 1) % len(self.exchanges)
+        return resp
+
+    def close(self):
+        pass
@@ -15,11 +15,15 @@
 # =============================================================================
 
 import numpy as np
+import json
 import time
 import struct
+import asyncio
+import websockets
 from websockets.sync import client
 from .wsproto import WSProto, to_bytes
 from .log import Log
+from . import metrics
 
 
 class Shutdown(Exception):
@@ -27,6 +31,10 @@ class Shutdown(Exception):
 
 
 class WSClient:
+    # Consecutive failed (re)connects or sends to give up after
+    # (None means retrying until shutdown)
+    max_retries = None
+
     def __init__(self, port, loglevel, shutdown):
         self.port = port
         self.logger = Log.get_logger(__name__, loglevel)
@@ -34,6 +42,8 @@ class WSClient:
         self.connect()
 
     def connect(self):
+        retries = 0
+
         while True:
             if self.shutdown.is_set():
                 raise Shutdown()
@@ -44,9 +54,15 @@ class WSClient:
                 break
             except Exception as e:
                 self.logger.warn("Failed to connect: %s" % str(e))
+                retries += 1
+                self._check_retries(retries, e)
                 time.sleep(5)
                 pass
 
+    def _check_retries(self, retries, error):
+        if self.max_retries is not None and retries > self.max_retries:
+            raise Exception("Giving up after %d retries" % self.max_retries) from error
+
     def _connect_attempt(self):
         self.ws = client.connect(f"ws://localhost:{self.port}", open_timeout=10)
         out = to_bytes(WSProto.H_REG) + to_bytes(WSProto.REG_PY)
@@ -60,6 +76,8 @@ class WSClient:
             raise Exception("Header error: expected %s, got: %s" % (exp, got))
 
     def send(self, data):
+        retries = 0
+
         while True:
             if self.shutdown.is_set():
                 raise Shutdown()
@@ -69,8 +87,11 @@ class WSClient:
                 return self.ws.recv(timeout=3)
             except Exception as e:
                 self.logger.warn("Failed to send/receive: %s" % str(e))
+                metrics.RECONNECTS.inc()
+                retries += 1
+                self._check_retries(retries, e)
                 try:
-                    self.close()
+                    self._disconnect()
                 except Exception as e1:
                     self.logger.warn("Failed to close connection: %s" % str(e1))
 
@@ -81,22 +102,135 @@ class WSClient:
         raise Shutdown()
 
     def close(self):
+        self._disconnect()
+
+    def _disconnect(self):
         self.ws.close()
         self.ws.recv_events_thread.join()
 
 
+class AsyncWSClient:
+    """
+    The asyncio counterpart of WSClient, built on the websockets asyncio API, so that a
+    single thread can wait on many browsers at once (see AsyncQwopEnv).
+    It connects lazily, ie. on the first call to `.send`.
+    """
+
+    def __init__(self, port, loglevel, shutdown):
+        self.port = port
+        self.logger = Log.get_logger(__name__, loglevel)
+        self.shutdown = shutdown
+        self.ws = None
+
+    async def connect(self):
+        while True:
+            if self.shutdown.is_set():
+                raise Shutdown()
+
+            try:
+                await self._connect_attempt()
+                self.logger.debug("Connected")
+                break
+            except Exception as e:
+                self.logger.warn("Failed to connect: %s" % str(e))
+                await asyncio.sleep(5)
+                pass
+
+    async def _connect_attempt(self):
+        self.ws = await websockets.connect(
+            f"ws://localhost:{self.port}", open_timeout=10
+        )
+        out = to_bytes(WSProto.H_REG) + to_bytes(WSProto.REG_PY)
+
+        await self.ws.send(out)
+        data = await self.ws.recv()
+
+        if data[0] != WSProto.H_ACK:
+            exp = np.binary_repr(WSProto.H_ACK)
+            got = np.binary_repr(data[0])
+            raise Exception("Header error: expected %s, got: %s" % (exp, got))
+
+    async def send(self, data):
+        if self.ws is None:
+            await self.connect()
+
+        while True:
+            if self.shutdown.is_set():
+                raise Shutdown()
+
+            try:
+                await self.ws.send(data)
+                return await asyncio.wait_for(self.ws.recv(), timeout=3)
+            except Exception as e:
+                self.logger.warn("Failed to send/receive: %s" % str(e))
+                metrics.RECONNECTS.inc()
+                try:
+                    await self.close()
+                except Exception as e1:
+                    self.logger.warn("Failed to close connection: %s" % str(e1))
+
+                self.logger.info("Reconnecting in 5s...")
+                await asyncio.sleep(5)
+                await self.connect()
+
+    async def close(self):
+        if self.ws:
+            await self.ws.close()
+
+
 class WSClientMock:
-    def send(self, _data):
+    RESPONSE = (
+        to_bytes(WSProto.H_OBS)
+        + to_bytes(0)  # flags
+        + struct.pack("=f", 1695977066)  # time
+        + struct.pack("=f", 5.0)  # distance
+        + np.zeros(60, dtype=np.float32).tobytes()  # obs
+    )
+
+    def send(self, data):
+        if data[0] == WSProto.H_RLD:
+            return to_bytes(WSProto.H_ACK)
+
+        if data[0] == WSProto.H_VCMD:
+            count = sum(1 for cmd in data[1:] if cmd)
+            return (
+                to_bytes(WSProto.H_VOBS)
+                + to_bytes(count, 2)
+                + self.RESPONSE[1:] * count
+            )
+
+        if data[0] == WSProto.H_SAV:
+            # the mock's only state is its (constant) observation
+            state = dict(obs=self.RESPONSE[1:].hex())
+            blob = json.dumps(state).encode() if data[1] else b""
+            return to_bytes(WSProto.H_SAV) + to_bytes(1, 4) + blob
+
+        if data[0] == WSProto.H_RES and len(data) > 5:
+            state = json.loads(data[5:])
+            return to_bytes(WSProto.H_OBS) + bytes.fromhex(state["obs"])
+
+        if data[0] == WSProto.H_SEQ:
+            count = (len(data) - 1) // 2
+            steps = sum(max(n, 1) for n in data[2::2])
+            return (
+                to_bytes(WSProto.H_VOBS)
+                + to_bytes(count, 2)
+                + self.RESPONSE[1:] * count
+                + to_bytes(steps, 4)
+            )
+
         return self.recv()
 
     def recv(self):
-        return (
-            to_bytes(WSProto.H_OBS)
-            + to_bytes(0)  # flags
-            + struct.pack("=f", 1695977066)  # time
-            + struct.pack("=f", 5.0)  # distance
-            + np.zeros(60, dtype=np.float32).tobytes()  # obs
-        )
+        return self.RESPONSE
 
     def close(self):
         pass
+
+
+class AsyncWSClientMock(WSClientMock):
+    async def send(self, data):
+        return super().send(data)
+
+    async def close(self):
+        pass
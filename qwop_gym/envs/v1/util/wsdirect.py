@@ -0,0 +1,140 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import sys
+import queue
+import threading
+from websockets.sync import server
+
+from .wsproto import WSProto, to_bytes
+from .log import Log
+from .browser import Browser, ensure_patched
+from . import metrics
+
+BYTES_ACK = to_bytes(WSProto.H_ACK)
+
+
+class WSDirectClient:
+    """
+    A drop-in replacement for WSClient which accepts the browser's
+    WebSocket connection itself, ie. without a WSServer relay process
+    in between. The browser is launched (and re-launched) via Browser.
+
+    Compared to WSClient, this saves one process hop, one asyncio dispatch
+    and two frame copies per message.
+    """
+
+    def __init__(self, seed, driver, browser, loglevel, **browser_kwargs):
+        ensure_patched()
+
+        self.seed = seed
+        self.logger = Log.get_logger(__name__, loglevel)
+        self.browser = Browser(driver=driver, browser=browser, **browser_kwargs)
+        self.ws = None
+
+        # Connections accepted by the server's threads are handed over
+        # to the env's thread, which is the only one using them
+        self.connections = queue.Queue()
+        self.server = server.serve(self._handler, "localhost", 0)
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.logger.info("Listening on port %d" % self.port)
+        self._launch_browser()
+
+    def _handler(self, ws):
+        ua = ws.request.headers.get("user-agent")
+        self.logger.info("Connection from: %s" % ua)
+        self.connections.put(ws)
+
+        # The connection is closed as soon as the handler returns
+        ws.recv_events_thread.join()
+
+    def _launch_browser(self):
+        self.logger.info("Launching web browser...")
+        self.browser.quit()
+        self.browser.launch(self.browser.build_url(self.port, self.seed))
+        self._accept(timeout=30)
+
+    def _reload(self, seed):
+        self.logger.info("Reloading browser page with new seed: %s" % seed)
+        self.seed = seed
+        self._close_ws()
+        self.browser.load(self.browser.build_url(self.port, self.seed))
+        self._accept(timeout=5)
+
+    def _accept(self, timeout):
+        ws = self.connections.get(timeout=timeout)
+        data = ws.recv(timeout=timeout)
+
+        assert data[0] == WSProto.H_REG, f"expected a REG header, got: {data[0]}"
+        assert data[1] == WSProto.REG_JS, f"expected a REG_JS id, got: {data[1]}"
+
+        ws.send(BYTES_ACK)
+        self.ws = ws
+        self.logger.info("Browser (js client) registration ACK")
+
+    def send(self, data):
+        if data[0] == WSProto.H_RLD:
+            self._reload(int.from_bytes(data[1:5], sys.byteorder))
+            return BYTES_ACK
+
+        if data[0] == WSProto.H_SEED:
+            # a page reload (eg. browser relaunch) must use the new seed
+            self.seed = int.from_bytes(data[1:5], sys.byteorder)
+
+        while True:
+            try:
+                self.ws.send(data)
+                resp = self._recv()
+                break
+            except Exception as e:
+                self.logger.warn("Failed to send/receive: %s" % str(e))
+                metrics.RECONNECTS.inc()
+
+                if self.browser.is_alive():
+                    self.logger.info("Waiting for browser to reconnect...")
+                    self._close_ws()
+                    self._accept(timeout=10)
+                else:
+                    self.logger.error("Browser window not found")
+                    self._close_ws()
+                    self._launch_browser()
+
+        if resp[0] == WSProto.H_ERR:
+            raise Exception("JS error: %s" % resp[1:].decode())
+
+        return resp
+
+    def _recv(self):
+        while True:
+            data = self.ws.recv(timeout=3)
+
+            if data[0] != WSProto.H_LOG:
+                return data
+
+            self.logger.info("[ js ] %s" % data[1:].decode("utf-8"))
+
+    def _close_ws(self):
+        if self.ws:
+            self.ws.close()
+            self.ws = None
+
+    def close(self):
+        self._close_ws()
+        self.server.shutdown()
+        self.browser.quit()
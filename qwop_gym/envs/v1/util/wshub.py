@@ -0,0 +1,516 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import threading
+import subprocess
+import websockets
+from websockets.sync import client
+
+from .wsproto import WSProto, to_bytes, stamp
+from .wsclient import WSClient
+from .log import Log, FrameTracer
+from .browser import Browser, ensure_patched
+from .wsserver import Peer
+
+DEFAULT_PORT = int(os.environ.get("QWOP_GYM_HUB_PORT", 25621))
+DEFAULT_POOL_SIZE = int(os.environ.get("QWOP_GYM_HUB_POOL_SIZE", 2))
+DEFAULT_IDLE_TIMEOUT = int(os.environ.get("QWOP_GYM_HUB_IDLE_TIMEOUT", 60))
+BYTES_ACK = to_bytes(WSProto.H_ACK)
+BYTES_REJ = to_bytes(WSProto.H_REJ)
+BYTES_SEED = to_bytes(WSProto.H_SEED)
+
+
+class Session:
+    """
+    A QwopEnv (py peer) and its browser page (js peer), identified by the
+    session id both of them send in their REG message.
+    """
+
+    def __init__(self, sid, config, pooled=False):
+        self.id = sid
+        self.page_sid = sid  # the session id the page was loaded with
+        self.seed = config.pop("seed")
+        self.key = json.dumps(config, sort_keys=True)
+        self.poolable = is_poolable(config)
+        self.browser = Browser(**config)
+        self.jspeer = Peer("js")
+        self.pypeer = Peer("py")
+        self.jspeer.other = self.pypeer
+        self.pypeer.other = self.jspeer
+        self.js_ready = asyncio.Event()
+        self.launched = False
+        self.orphaned_at = None
+        self.pooled = pooled
+        self.pending = None
+
+
+class WSHub:
+    """
+    A single WebSocket server (per host) which relays messages between
+    many QwopEnv instances and their browser pages, routed by session id.
+
+    Unlike WSServer, it runs in a standalone process shared by all envs,
+    which also performs the browser health checks for all sessions. It
+    outlives the envs, so that their pages can be reused by the next ones,
+    and exits after `idle_timeout` seconds without any envs, or on SIGTERM.
+
+    For each distinct browser config, up to `pool_size` pages are kept
+    warm (launched and fully loaded) in a pool: a new env is handed a
+    page from the pool, which is reseeded in-place instead of launched,
+    and the page is returned to the pool when the env is closed.
+    Multi-game pages (QwopVecEnv) can't be reseeded, so they aren't pooled.
+    """
+
+    def __init__(
+        self,
+        port,
+        loglevel,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT,
+        orphan_timeout=10,
+        pool_size=DEFAULT_POOL_SIZE,
+    ):
+        self.port = port
+        self.loglevel = loglevel
+        self.idle_timeout = idle_timeout
+        self.orphan_timeout = orphan_timeout
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.pools = {}  # browser config key => idle (pooled) sessions
+        self.aliases = {}  # page session id => current session id
+        self.logger = Log.get_logger(__name__, loglevel)
+        self.tracer = FrameTracer(self.logger)
+
+    def start(self):
+        ensure_patched()
+
+        try:
+            asyncio.run(self._start())
+        except OSError as e:
+            # eg. another env has just started a hub on the same port
+            self.logger.warn("Could not listen on port %d: %s" % (self.port, e))
+
+    async def _start(self):
+        # SIGTERM must not leave the browsers behind
+        self.stopping = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.stopping.set)
+
+        async with websockets.serve(self.handler, "localhost", self.port):
+            self.logger.info("Listening on port %d" % self.port)
+            await self._health_checks()
+
+        self.logger.info("Shutting down")
+
+        for session in self.sessions.values():
+            await asyncio.to_thread(session.browser.quit)
+
+    async def _health_checks(self):
+        idle_since = time.time()
+
+        while True:
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=2)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            for session in list(self.sessions.values()):
+                await self._check_session(session)
+
+            if any(not s.pooled for s in self.sessions.values()):
+                idle_since = time.time()
+            elif time.time() - idle_since > self.idle_timeout:
+                return
+
+    async def _check_session(self, session):
+        orphaned_at = session.orphaned_at
+
+        if orphaned_at and time.time() - orphaned_at > self.orphan_timeout:
+            self.logger.info("Closing session %d (env is gone)" % session.id)
+            await self._close_session(session)
+            return
+
+        if session.launched and not await asyncio.to_thread(self._is_alive, session):
+            self.logger.error("Browser window not found for session %d" % session.id)
+            await self._launch_browser(session)
+
+    def _is_alive(self, session):
+        try:
+            return session.browser.is_alive()
+        except Exception as e:
+            self.logger.error(str(e))
+            return False
+
+    def _url(self, session):
+        return session.browser.build_url(self.port, session.seed, session.id)
+
+    def _new_sid(self):
+        while True:
+            sid = int.from_bytes(os.urandom(4), sys.byteorder)
+            if sid and sid not in self.sessions and sid not in self.aliases:
+                return sid
+
+    async def _fill_pool(self, config):
+        pool = self.pools.setdefault(json.dumps(config, sort_keys=True), [])
+
+        while len(pool) < self.pool_size:
+            session = Session(self._new_sid(), dict(config, seed=0), pooled=True)
+            self.logger.info("Warming up pooled session %d" % session.id)
+            self.sessions[session.id] = session
+            pool.append(session)
+            await self._launch_browser(session)
+
+    def _rekey(self, session, sid):
+        # The page keeps the session id it was loaded with until it is
+        # reloaded (the new id is in the URL then), so it must be aliased
+        del self.sessions[session.id]
+        self.sessions[sid] = session
+        self.aliases[session.page_sid] = sid
+        session.id = sid
+
+    def _unalias(self, session):
+        # Called whenever the page is (re)loaded with the current id
+        self.aliases.pop(session.page_sid, None)
+        session.page_sid = session.id
+
+    async def _checkout(self, sid, seed, config):
+        """Hands out a warm page from the pool (reseeded), if there is one."""
+        if not is_poolable(config):
+            return None
+
+        pool = self.pools.get(json.dumps(config, sort_keys=True))
+
+        if not pool:
+            return None
+
+        # prefer pages which are already loaded
+        session = next((s for s in pool if s.js_ready.is_set()), pool[0])
+        pool.remove(session)
+        self.logger.info("Handing out pooled session %d" % session.id)
+
+        self._rekey(session, sid)
+        session.pooled = False
+        session.seed = seed
+
+        # reseeding in-place restarts the game as well
+        await asyncio.wait_for(session.js_ready.wait(), timeout=60)
+        data = await self._request(session, BYTES_SEED + to_bytes(seed, 4))
+
+        if data[0] != WSProto.H_OBS:
+            await self._discard(session)
+            raise Exception(
+                "Failed to reseed pooled session %d, got header: %d" % (sid, data[0])
+            )
+
+        return session
+
+    async def _close_session(self, session):
+        pool = self.pools.setdefault(session.key, [])
+
+        if (
+            not session.poolable
+            or len(pool) >= self.pool_size
+            or not session.js_ready.is_set()
+        ):
+            await self._discard(session)
+            return
+
+        self.logger.info("Returning session %d to the pool" % session.id)
+        self._rekey(session, self._new_sid())
+        session.pooled = True
+        session.orphaned_at = None
+        pool.append(session)
+
+    async def _discard(self, session):
+        del self.sessions[session.id]
+        self.aliases.pop(session.page_sid, None)
+        await asyncio.to_thread(session.browser.quit)
+
+    async def _request(self, session, data):
+        # The js reply is returned here instead of relayed to the py peer
+        session.pending = asyncio.get_running_loop().create_future()
+
+        try:
+            await self.send(session.jspeer, data)
+            return await asyncio.wait_for(session.pending, timeout=5)
+        finally:
+            session.pending = None
+
+    async def _launch_browser(self, session):
+        self.logger.info("Launching web browser for session %d..." % session.id)
+        session.js_ready.clear()
+        session.launched = False
+        await asyncio.to_thread(session.browser.quit)
+        self._unalias(session)
+        await asyncio.to_thread(session.browser.launch, self._url(session))
+        session.launched = True
+
+    async def _register(self, ws, data):
+        peer_id = data[1]
+        sid = int.from_bytes(data[2:6], sys.byteorder)
+        sid = self.aliases.get(sid, sid)
+        session = self.sessions.get(sid)
+
+        match peer_id:
+            case WSProto.REG_PROBE:
+                await ws.send(BYTES_ACK)
+                return None
+            case WSProto.REG_PY:
+                if not session:
+                    config = json.loads(data[6:].decode())
+                    seed = config.pop("seed")
+                    session = await self._checkout(sid, seed, config)
+
+                    if not session:
+                        session = Session(sid, dict(config, seed=seed))
+                        self.sessions[sid] = session
+                        await self._launch_browser(session)
+
+                    if self.pool_size and session.poolable:
+                        asyncio.create_task(self._fill_pool(config))
+
+                session.orphaned_at = None
+                peer = session.pypeer
+            case WSProto.REG_JS:
+                if not session:
+                    self.logger.warn("Rejecting page of unknown session %d" % sid)
+                    await ws.send(BYTES_REJ)
+                    return None
+
+                peer = session.jspeer
+
+        if peer.ws:
+            await peer.ws.close()
+
+        peer.ws = ws
+
+        if peer == session.jspeer:
+            await self.send(peer, BYTES_ACK)
+            session.js_ready.set()
+            self.logger.info("Browser (js client) registration ACK: %d" % sid)
+        else:
+            await asyncio.wait_for(session.js_ready.wait(), timeout=60)
+            await self.send(peer, BYTES_ACK)
+            self.logger.info("QwopEnv (py client) registration ACK: %d" % sid)
+
+        return session, peer
+
+    async def _reload(self, session, seed):
+        self.logger.info(
+            "Reloading page of session %d with seed: %s" % (session.id, seed)
+        )
+        session.seed = seed
+        session.js_ready.clear()
+
+        ws = session.jspeer.ws
+        session.jspeer.ws = None
+
+        if ws:
+            await ws.close()
+
+        self._unalias(session)
+        await asyncio.to_thread(session.browser.load, self._url(session))
+        await asyncio.wait_for(session.js_ready.wait(), timeout=5)
+        await self.send(session.pypeer, BYTES_ACK)
+
+    async def handler(self, ws):
+        session = None
+        peer = None
+        closed = False
+
+        try:
+            async for data in ws:
+                if peer is None:
+                    assert data[0] == WSProto.H_REG, "expected a REG message"
+                    reg = await self._register(ws, data)
+
+                    if not reg:
+                        return
+
+                    session, peer = reg
+                    continue
+
+                await self._route(session, peer, data)
+
+            # a clean close (ie. env.close()) frees the page immediately
+            closed = True
+        except Exception as e:
+            self.logger.error(str(e))
+        finally:
+            if peer and peer.ws == ws:
+                peer.ws = None
+
+                if peer != session.pypeer:
+                    session.js_ready.clear()
+                elif closed:
+                    await self._close_session(session)
+                else:
+                    session.orphaned_at = time.time()
+
+    async def _route(self, session, src, data):
+        if self.tracer.enabled:
+            self.tracer.inbound(data, src)
+
+        if session.pending and src == session.jspeer:
+            session.pending.set_result(data)
+            return
+
+        if src == session.pypeer and not session.js_ready.is_set():
+            # eg. the browser is being relaunched by the health checks
+            await asyncio.wait_for(session.js_ready.wait(), timeout=60)
+
+        match data[0]:
+            # put most common match cases on top
+            case WSProto.H_CMD:
+                if len(data) > WSProto.CMD_SIZE:
+                    data = stamp(data)
+                await self.send(src.other, data)
+            case WSProto.H_OBS:
+                if len(data) > WSProto.OBS_SIZE:
+                    data = stamp(data)
+                await self.send(src.other, data)
+            case WSProto.H_RLD:
+                await self._reload(session, int.from_bytes(data[1:5], sys.byteorder))
+            case WSProto.H_SEED:
+                # a page reload (eg. browser relaunch) must use the new seed
+                session.seed = int.from_bytes(data[1:5], sys.byteorder)
+                await self.send(src.other, data)
+            case WSProto.H_LOG:
+                longfmt = self.logger.level == logging.DEBUG
+                self.logger.info(Log.format_remote(data[1:], src, longfmt))
+            case WSProto.H_ERR:
+                raise Exception("JS error: %s" % data[1:].decode())
+            case _:
+                await self.send(src.other, data)
+
+    async def send(self, peer, data):
+        if self.tracer.enabled:
+            self.tracer.outbound(data, peer)
+
+        await peer.ws.send(data)
+
+
+def is_poolable(config):
+    # Pooled pages are reseeded in-place, which QWOPVec.html does not support
+    return config.get("n_games", 1) == 1
+
+
+def hub_is_running(port):
+    """Returns True if a WSHub (not just any server) is listening on `port`."""
+    try:
+        with client.connect(f"ws://localhost:{port}", open_timeout=1) as ws:
+            ws.send(to_bytes(WSProto.H_REG) + to_bytes(WSProto.REG_PROBE))
+            return ws.recv(timeout=1) == BYTES_ACK
+    except Exception:
+        return False
+
+
+def ensure_hub_running(port, loglevel, pool_size=DEFAULT_POOL_SIZE, timeout=10):
+    """
+    Starts a WSHub process on the given port, unless already running.
+    Returns the started process (None if a hub was already running).
+    Safe to call from several envs at once: only one hub can listen on the
+    port, the others exit and their envs use the hub which did start.
+    """
+
+    if hub_is_running(port):
+        return None
+
+    cmd = [
+        sys.executable,
+        "-m",
+        __name__,
+        "--port",
+        str(port),
+        "--loglevel",
+        loglevel,
+        "--pool-size",
+        str(pool_size),
+    ]
+
+    # start_new_session: the hub outlives its creator (it exits when idle),
+    # so it must not get the signals to its process group (eg. a Ctrl+C)
+    proc = subprocess.Popen(cmd, start_new_session=True)
+    deadline = time.time() + timeout
+
+    while not hub_is_running(port):
+        if time.time() > deadline:
+            proc.kill()
+            raise Exception(
+                "Timed out waiting for WSHub on port %d (is the port in use?)" % port
+            )
+        time.sleep(0.1)
+
+    # the hub which is running may have been started by another env
+    return proc if proc.poll() is None else None
+
+
+class WSHubClient(WSClient):
+    """
+    A WSClient which registers with a (shared) WSHub instead of a dedicated
+    WSServer. The hub is started on first use (or if it has exited since)
+    and keeps running after the client is closed, until it is idle.
+    """
+
+    # There is no process whose exit would set the shutdown event
+    max_retries = 3
+
+    def __init__(self, seed, driver, browser, loglevel, port=DEFAULT_PORT, **kwargs):
+        ensure_patched()
+        self.loglevel = loglevel
+        self.session = int.from_bytes(os.urandom(4), sys.byteorder) or 1
+        self.config = dict(seed=seed, driver=driver, browser=browser, **kwargs)
+        super().__init__(port, loglevel, threading.Event())
+
+    def _connect_attempt(self):
+        # the hub may have exited since (eg. when idle)
+        ensure_hub_running(self.port, self.loglevel)
+        self.ws = client.connect(f"ws://localhost:{self.port}", open_timeout=10)
+        out = (
+            to_bytes(WSProto.H_REG)
+            + to_bytes(WSProto.REG_PY)
+            + to_bytes(self.session, 4)
+            + json.dumps(self.config).encode()
+        )
+
+        self.ws.send(out)
+        data = self.ws.recv(timeout=90)
+
+        if data[0] != WSProto.H_ACK:
+            raise Exception("Header error: expected ACK, got: %d" % data[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--loglevel", default="WARN")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--idle-timeout", type=int, default=DEFAULT_IDLE_TIMEOUT)
+    args = parser.parse_args()
+
+    WSHub(
+        args.port,
+        args.loglevel,
+        idle_timeout=args.idle_timeout,
+        pool_size=args.pool_size,
+    ).start()
@@ -15,18 +15,51 @@
 # =============================================================================
 
 import sys
+import time
+import struct
+
+# Timing trailer: [K]timestamps (float64, ms since epoch) + K (uint8)
+STAMP = struct.Struct("=dB")
 
 
 def to_bytes(number, nbytes=1):
     return number.to_bytes(nbytes, sys.byteorder)
 
 
+def now_ms():
+    return time.time() * 1000
+
+
+def trailer(*timestamps):
+    """Returns a new timing trailer with the given timestamps."""
+    count = len(timestamps)
+    return struct.pack("=%ddB" % count, *timestamps, count)
+
+
+def stamp(data):
+    """Appends the current time to the timing trailer of a message."""
+    return data[:-1] + STAMP.pack(now_ms(), data[-1] + 1)
+
+
+def stamps(data, size):
+    """
+    Returns the timestamps in the timing trailer of a message whose size
+    without a trailer is `size` (empty if there is no trailer).
+    """
+
+    if len(data) <= size:
+        return ()
+
+    count = data[-1]
+    return struct.unpack_from("=%dd" % count, data, len(data) - 1 - 8 * count)
+
+
 class WSProto:
     #
     # Header (uint8)
     #
 
-    H_REG = 0  # reg req    (**->**) payload: id (uint8)
+    H_REG = 0  # reg req    (**->**) payload: id (uint8) + session (uint32, optional) + config (json, py->hub only)
     H_ACK = 1  # reg ack    (**->**)
     H_REJ = 2  # reg rej    (**->**)
     H_CMD = 3  # cmd        (py->js) payload: cmdflags (uint8) + step (uint16) + rew (float32) + tot_rew (float32)
@@ -35,14 +68,24 @@ class WSProto:
     H_LOG = 6  # log        (js->py) payload: msg (utf-8)
     H_ERR = 7  # error      (js->py) payload: msg (utf-8)
     H_RLD = 8  # reload     (js->srv) payload: seed (uint32)
+    H_VCMD = 9  # vec cmd    (py->js) payload: cmdflags ([N]uint8)
+    H_VOBS = 10  # vec obs    (js->py) payload: count (uint16) + [count]OBS payloads (+ steps (uint32), in reply to a SEQ)
+    H_SEQ = 11  # cmd seq    (py->js) payload: [K](cmdflags (uint8) + repeat (uint8))
+    H_SEED = 12  # reseed     (py->js) payload: seed (uint32)
+    H_SAV = 13  # snapshot   (py<->js) payload: export (uint8) / id (uint32) + blob
+    H_RES = 14  # restore    (py->js) payload: id (uint32) + blob (optional)
 
     #
     # Data
     #
 
+    # CMD and OBS messages may end with a timing trailer (see `stamp`),
+    # which is stamped by each hop on the way (eg. by `qwop-gym benchmark`)
+
     # REG payload: id (uint8)
     REG_JS = 0  # js client
     REG_PY = 1  # py client
+    REG_PROBE = 2  # liveness probe (hub only, see hub_is_running)
 
     # CMD payload: cmdflags (uint8)
     CMD_STP = 0b00000001  # advance 1 timestep
@@ -59,6 +102,10 @@ class WSProto:
     OBS_END = 0b00000010  # game has ended
     OBS_SUC = 0b00000100  # run was successful (100+m)
 
+    # Message sizes without a timing trailer (see `stamp`)
+    CMD_SIZE = 1 + 1 + 2 + 4 + 4
+    OBS_SIZE = 1 + 1 + 4 + 4 + 60 * 4
+
     # IMG payload: format (uint8)
     IMG_JPG = 0
     IMG_PNG = 1
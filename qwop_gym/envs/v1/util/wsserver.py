@@ -15,20 +15,16 @@
 # =============================================================================
 
 import signal
-import uuid
 import socket
 import asyncio
-import pathlib
 import websockets
 import sys
 import os
-import urllib.parse
 import logging
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
 
-from .wsproto import WSProto, to_bytes
-from .log import Log
+from .wsproto import WSProto, to_bytes, stamp
+from .log import Log, FrameTracer
+from .browser import Browser, ensure_patched
 
 
 class Peer:
@@ -37,6 +33,7 @@ class Peer:
         self.other = None
         self.name = name
         self.ua = None
+        self.session = 0
 
 
 class WSServer:
@@ -52,6 +49,11 @@ class WSServer:
         game_in_browser,
         loglevel,
         manual_client=False,
+        n_games=1,
+        autoreset=False,
+        headless=False,
+        tab_pool=False,
+        seed_schedule=None,
     ):
         seedmin = -9007199254740991  # js Number.MIN_SAFE_INTEGER
         seedmax = 9007199254740991  # js Number.MAX_SAFE_INTEGER
@@ -68,6 +70,17 @@ class WSServer:
         self.browser = browser
         self.stepsize = stepsize
         self.loglevel = loglevel
+        self._browser = Browser(
+            driver=driver,
+            browser=browser,
+            stepsize=stepsize,
+            stat_in_browser=stat_in_browser,
+            text_in_browser=text_in_browser,
+            game_in_browser=game_in_browser,
+            n_games=n_games,
+            autoreset=autoreset,
+            headless=headless,
+        )
 
         self._steps = 0
         self._event = asyncio.Event()
@@ -77,21 +90,22 @@ class WSServer:
         self._jspeer.other = self._pypeer
         self._pypeer.other = self._jspeer
         self._peers = {}
+
+        # A standby page, preloaded with the next seed (see _prefetch)
+        self.tab_pool = tab_pool
+        self.seed_schedule = list(seed_schedule or [])
+        self._tabpeer = Peer("js")
+        self._tabpeer.session = 1
+        self._tabpeer.other = self._pypeer
+        self._tabpeer.seed = None
+        self._tabpeer.handle = None
+        self._tab_event = asyncio.Event()
+
+        # Serializes the (blocking) browser calls, which run in threads
+        self._browser_lock = asyncio.Lock()
         self._manual_client = manual_client
-        self._window = None
-        self._driver = None
         self._initialized = False
-        self._ensure_patched()
-
-    def _ensure_patched(self):
-        path = pathlib.Path(__file__).parents[1].joinpath("game", "QWOP.min.js")
-        if not os.path.exists(path):
-            msg = """
-Could not find patched QWOP.min.js. To fix this error, run the command:
-curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
-"""
-
-            raise Exception(msg)
+        ensure_patched()
 
     def cleanup_and_exit(self):
         if not self._shutdown.is_set():
@@ -105,8 +119,9 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
     def start(self, shutdown):
         # must set logger here, as .start() is called in another process
         self.logger = Log.get_logger(__name__, self.loglevel)
+        self.tracer = FrameTracer(self.logger)
         self._shutdown = shutdown
-        self._ensure_patched()
+        ensure_patched()
         self._future = asyncio.Future()
 
         loop = asyncio.get_event_loop()
@@ -120,8 +135,7 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
             while not shutdown.is_set():
                 loop.run_until_complete(self._start())
 
-            if self._driver:
-                self._driver.quit()
+            self._browser.quit()
 
     async def check_shutdown(self):
         while not self._shutdown.is_set():
@@ -149,60 +163,76 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
             await self._future
             server.close()
 
-    def build_url(self):
-        file = pathlib.Path(__file__).parents[1].joinpath("game", "QWOP.html")
-        url = "file://%s" % file
-        url += "?port=%d" % self.port
-        url += "&seed=%d" % self.seed
-        url += "&game=%d" % self.game_in_browser
-        url += "&stat=%d" % self.stat_in_browser
-        url += "&text=%s" % urllib.parse.quote_plus(self.text_in_browser or "")
-        url += "&intro=0"
-        url += "&stepsize=%d" % self.stepsize
+    def build_url(self, seed=None, session=None):
+        seed = self.seed if seed is None else seed
+        session = self._jspeer.session if session is None else session
+        return self._browser.build_url(self.port, seed, session)
 
-        return url
+    async def _browser_call(self, fn, *args):
+        # Selenium calls block until the browser is done (eg. a page has
+        # loaded), so they must not block the event loop meanwhile
+        async with self._browser_lock:
+            return await asyncio.to_thread(fn, *args)
 
     async def _launch_browser(self):
         self.logger.info("Launching web browser...")
-
-        options = webdriver.ChromeOptions()
-        options.add_argument("allow-file-access-from-files")
-        options.add_argument("allow-cross-origin-auth-prompt")
-        options.add_argument("user-agent=Chrome-%s" % uuid.uuid4())
-        options.add_argument("disable-infobars")
-        options.add_argument("disable-extensions")
-        options.add_argument("disable-popup-blocking")
-        options.add_argument("disable-notifications")
-
-        if self.game_in_browser and (self.stat_in_browser or self.text_in_browser):
-            options.add_argument("window-size=1160,585")
-            options.add_argument("window-position=650,130")
-        else:
-            options.add_argument("window-size=660,585")
-            options.add_argument("window-position=650,130")
-
-        # keeping a ref to the driver keeps it running
-        # also, it allows to be explicitly closed on exit
-
-        # https://www.selenium.dev/documentation/webdriver/getting_started/upgrade_to_selenium_4/#python-1
-        service = ChromeService(executable_path=self.driver)
-
-        # https://community.brave.com/t/is-there-a-selenium-driver-for-brave-browser/49696/4
-        options.binary_location = self.browser
-        options.add_argument("--incognito")
-
-        self._driver = webdriver.Chrome(service=service, options=options)
-        self._window = self._driver.window_handles[0]
-        self._driver.get(self.build_url())
+        self._tabpeer.ws = None
+        self._tabpeer.seed = None
+        self._tabpeer.handle = None
+        self._jspeer.handle = await self._browser_call(
+            self._browser.launch, self.build_url(), self._tab_name(self._jspeer)
+        )
         self._initialized = True
 
-    def _maybe_relaunch_browser(self):
+    def _tab_name(self, peer):
+        return "qwop-%d" % peer.session
+
+    def _next_seed(self):
+        # Without a schedule, the next reload is likely a "hard reset"
+        if self.seed in self.seed_schedule:
+            i = self.seed_schedule.index(self.seed)
+            return self.seed_schedule[(i + 1) % len(self.seed_schedule)]
+
+        return self.seed
+
+    async def _prefetch(self):
+        """Loads the page for the next seed in the standby window."""
+        seed = self._next_seed()
+
+        if self._tabpeer.seed == seed:
+            return
+
+        self.logger.info("Preloading page with seed: %s" % seed)
+        self._tab_event.clear()
+        self._tabpeer.seed = seed
+        self._tabpeer.handle = await self._browser_call(
+            self._browser.load_tab,
+            self.build_url(seed, self._tabpeer.session),
+            self._tab_name(self._tabpeer),
+        )
+
+    async def _swap_pages(self):
+        """Makes the standby page the active one and vice versa."""
+        active, standby = self._jspeer, self._tabpeer
+
+        for attr in ("ws", "ua", "session", "handle"):
+            a, b = getattr(active, attr), getattr(standby, attr)
+            setattr(active, attr, b)
+            setattr(standby, attr, a)
+
+        self._peers[active.ws] = active
+        self._peers[standby.ws] = standby
+        self.seed = standby.seed
+        standby.seed = None
+        await self._browser_call(self._browser.activate, active.handle)
+
+    async def _maybe_relaunch_browser(self):
         if not self._initialized:
             self.cleanup_and_exit()
             return
 
         try:
-            if self._driver and self._window in self._driver.window_handles:
+            if await self._browser_call(self._browser.is_alive):
                 # window is alive
                 return
             else:
@@ -216,10 +246,19 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
             self._event.clear()
             asyncio.create_task(self._launch_browser())
 
-    async def _register_peer(self, ws, peer_id):
+    async def _register_peer(self, ws, peer_id, session):
         ua = ws.request.headers.get("user-agent")
 
         match peer_id:
+            case WSProto.REG_JS if self.tab_pool and session == self._tabpeer.session:
+                self._tabpeer.ws = ws
+                self._tabpeer.ua = ua
+                self._peers[ws] = self._tabpeer
+
+                await self.send(self._tabpeer, to_bytes(WSProto.H_ACK))
+                self.logger.info("Standby browser page registration ACK")
+                self._tab_event.set()
+
             case WSProto.REG_JS:
                 if self._jspeer.ws:
                     await self._jspeer.ws.close()
@@ -233,6 +272,10 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
                 self.logger.info("Browser (js client) registration ACK")
                 self._event.set()  # Unblock self._start()
 
+                if self.tab_pool:
+                    # in the background, the env may be stepping meanwhile
+                    self._prefetch_task = asyncio.create_task(self._prefetch())
+
             case WSProto.REG_PY:
                 if self._pypeer.ws:
                     await self._pypeer.ws.close()
@@ -242,7 +285,7 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
                 self._peers[ws] = self._pypeer
 
                 # If py client reconnects, maybe the browser is dead
-                self._maybe_relaunch_browser()
+                await self._maybe_relaunch_browser()
 
                 if not self._manual_client:
                     self.logger.info("Waiting for browser...")
@@ -255,6 +298,14 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
         assert src_peer == self._pypeer, "Received RELOAD from a non-py peer"
         self.logger.info("Reloading browser page with new seed: %s" % seed)
 
+        if self.tab_pool and self._tabpeer.seed == seed:
+            self.logger.info("Waiting for preloaded page...")
+            await asyncio.wait_for(self._tab_event.wait(), timeout=5)
+            await self._swap_pages()
+            await self.send(self._pypeer, to_bytes(WSProto.H_ACK))
+            self._prefetch_task = asyncio.create_task(self._prefetch())
+            return
+
         self.seed = seed
 
         self.logger.info("Closing JS connection")
@@ -264,7 +315,7 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
         self._event.clear()
 
         await ws.close()
-        self._driver.get(self.build_url())
+        await self._browser_call(self._browser.load, self.build_url())
         self.logger.info("Waiting for browser ready...")
         await asyncio.wait_for(self._event.wait(), timeout=5)
         await self.send(self._pypeer, to_bytes(WSProto.H_ACK))
@@ -281,17 +332,29 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
 
         async for data in ws:
             src = self._peers.get(ws)
-            self.logger.debug(Log.format_inbound(data, src))
+            if self.tracer.enabled:
+                self.tracer.inbound(data, src)
 
             header = data[0]
             payload = data[1:]
 
             match header:
                 # put most common match cases on top
-                case WSProto.H_OBS | WSProto.H_CMD:
+                case WSProto.H_CMD:
+                    if len(data) > WSProto.CMD_SIZE:
+                        data = stamp(data)
+                    await self.send(src.other, data)
+                case WSProto.H_OBS:
+                    if len(data) > WSProto.OBS_SIZE:
+                        data = stamp(data)
                     await self.send(src.other, data)
                 case WSProto.H_REG:
-                    await self._register_peer(ws, payload[0])
+                    session = int.from_bytes(payload[1:5], sys.byteorder)
+                    await self._register_peer(ws, payload[0], session)
+                case WSProto.H_SEED:
+                    # a page reload (eg. browser relaunch) must use the new seed
+                    self.seed = int.from_bytes(payload[0:4], sys.byteorder)
+                    await self.send(src.other, data)
                 case WSProto.H_RLD:
                     await self._reload(src, int.from_bytes(payload[0:4], sys.byteorder))
                 case WSProto.H_LOG:
@@ -303,7 +366,9 @@ curl -sL https://www.foddy.net/QWOP.min.js | qwop-gym patch
                     await self.send(src.other, data)
 
     async def send(self, peer, data):
-        self.logger.debug(Log.format_outbound(data, peer))
+        if self.tracer.enabled:
+            self.tracer.outbound(data, peer)
+
         await peer.ws.send(data)
 
 
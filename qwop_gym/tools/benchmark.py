@@ -15,11 +15,38 @@
 # =============================================================================
 
 import gymnasium as gym
+import numpy as np
+import json
 import time
 
+from ..envs.v1.util.wsproto import WSProto, now_ms, trailer, stamps
+from ..envs.v1.util.wshub import DEFAULT_PORT, hub_is_running
 
-def benchmark(steps):
-    env = gym.make("local/QWOP-v1")
+# Names of the stages between consecutive timestamps of a step, by the
+# number of timestamps in the OBS timing trailer (K). The env stamps 2,
+# the page 4 and each relay hop 1 - browser_mock clients stamp none.
+STAGES = {
+    # browser_mock
+    2: ["encode", "roundtrip", "decode"],
+    # direct, cdp
+    6: ["encode", "py_to_js", "keys", "step", "observation", "js_to_py", "decode"],
+    # relay, hub
+    8: [
+        "encode",
+        "py_to_relay",
+        "relay_to_js",
+        "keys",
+        "step",
+        "observation",
+        "js_to_relay",
+        "relay_to_py",
+        "decode",
+    ],
+}
+
+
+def run(steps, env_kwargs):
+    env = gym.make("local/QWOP-v1", **env_kwargs)
 
     try:
         env.reset()
@@ -36,7 +63,171 @@ def benchmark(steps):
                 print("\r%d%%..." % percentage, end="", flush=True)
 
         seconds = time.time() - time_start
-        sps = steps / seconds
-        print("\n\n%.2f steps/s (%s steps in %.2f seconds)" % (sps, steps, seconds))
+        print()
+        return seconds
+    finally:
+        env.close()
+
+
+def time_to_first_obs(env_kwargs):
+    time_start = time.time()
+    env = gym.make("local/QWOP-v1", **env_kwargs)
+
+    try:
+        env.reset()
+        return time.time() - time_start
+    finally:
+        env.close()
+
+
+def benchmark_startup(runs, variants):
+    """
+    Measures the time from env creation to the first observation.
+    The first run is a cold start: with the "hub" transport, subsequent
+    runs get a warm browser page from the hub's pool, as the hub keeps
+    running between them. Other transports launch a new browser every
+    time, so they have no warm time.
+    """
+
+    print("%-40s %12s %12s" % ("variant", "cold (s)", "warm (s)"))
+    default_transport = gym.spec("local/QWOP-v1").kwargs.get("transport", "relay")
+    notes = []
+
+    for variant in variants:
+        hub = variant.get("transport", default_transport) == "hub"
+
+        if hub and hub_is_running(DEFAULT_PORT):
+            notes.append(
+                "%s: the hub was already running, so its pool may have made "
+                "the cold start warm" % (variant or "default")
+            )
+
+        seconds = [time_to_first_obs(variant) for _ in range(runs)]
+        warm = "-"
+
+        if runs > 1 and hub:
+            warm = "%.2f" % (sum(seconds[1:]) / (runs - 1))
+
+        print("%-40s %12.2f %12s" % (variant or "default", seconds[0], warm))
+
+    for note in notes:
+        print("NOTE: %s" % note)
+
+    print()
+
+
+def timed_step(env, action):
+    """
+    Same as env.step(), but with a timing trailer on the CMD message.
+    Returns the step's timestamps and whether the game has ended.
+    """
+
+    t_start = now_ms()
+    env.steps += 1
+    cmd = env._encode_action(action)
+    t_encoded = now_ms()
+    data = env.client.send(cmd + trailer(t_start, t_encoded))
+    t_received = now_ms()
+    reaction = env._build_reaction(data)
+    _obs, _rew, term, trunc, _info = env._complete_step(action, reaction)
+    t_end = now_ms()
+
+    timestamps = stamps(data, WSProto.OBS_SIZE) or (t_start, t_encoded)
+    return timestamps + (t_received, t_end), term or trunc
+
+
+def run_timed(steps, env_kwargs):
+    env = gym.make("local/QWOP-v1", **env_kwargs)
+    qwop = env.unwrapped
+    timestamps = []
+
+    try:
+        qwop.reset()
+
+        for i in range(steps):
+            ts, done = timed_step(qwop, 0)
+            timestamps.append(ts)
+
+            if done:
+                qwop.reset()
+
+        return stage_durations(np.array(timestamps))
     finally:
         env.close()
+
+
+def stage_durations(ts):
+    """
+    Returns the durations of each stage (and the total) for an array of
+    shape (steps, K+2): the trailer's K timestamps + 2 taken by timed_step.
+    """
+
+    names = STAGES[ts.shape[1] - 2]
+    assert len(names) == ts.shape[1] - 1, "bad stage names for %s" % names
+    durations = dict(zip(names, np.diff(ts, axis=1).T))
+    durations["total"] = ts[:, -1] - ts[:, 0]
+    return durations
+
+
+def benchmark_latency(steps, variants, latency_file=None):
+    """
+    Measures where the time of each step goes: each hop stamps the time
+    into a trailer of the step's CMD and OBS messages. Prints (and
+    optionally saves) the p50/p95/p99 of each stage as JSON, in ms.
+    Stages in the browser are precise to ~0.1ms (see performance.now).
+    """
+
+    results = []
+
+    for variant in variants:
+        print("Measuring latency for %s" % (variant or "default env"))
+        stages = {}
+
+        for name, ms in run_timed(steps, variant).items():
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            stages[name] = dict(
+                p50=round(p50, 4),
+                p95=round(p95, 4),
+                p99=round(p99, 4),
+                mean=round(ms.mean(), 4),
+            )
+
+        results.append(dict(variant=variant, stages=stages))
+
+    report = json.dumps(dict(steps=steps, unit="ms", results=results), indent=2)
+    print(report)
+
+    if latency_file:
+        with open(latency_file, "w") as f:
+            f.write(report + "\n")
+
+        print("Saved latency report to %s" % latency_file)
+
+
+def benchmark(steps, variants=None, startup_runs=0, latency_steps=0, latency_file=None):
+    """
+    Runs the env once per variant, where each variant is a dict of
+    env kwargs overriding the ones the env is registered with.
+    """
+
+    variants = variants or [{}]
+    results = []
+
+    if startup_runs:
+        benchmark_startup(startup_runs, variants)
+
+    if latency_steps:
+        benchmark_latency(latency_steps, variants, latency_file)
+
+    for variant in variants:
+        print("Benchmarking %s" % (variant or "default env"))
+        seconds = run(steps, variant)
+        sps = steps / seconds
+        print("%.2f steps/s (%s steps in %.2f seconds)" % (sps, steps, seconds))
+        print("%.2f us per step\n" % (seconds / steps * 1e6))
+        results.append((variant, sps, seconds / steps * 1e6))
+
+    if len(results) > 1:
+        print("%-40s %12s %12s" % ("variant", "steps/s", "us/step"))
+        for variant, sps, us in results:
+            print("%-40s %12.2f %12.2f" % (variant or "default", sps, us))
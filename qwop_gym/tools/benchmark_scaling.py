@@ -0,0 +1,255 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import os
+import sys
+import csv
+import time
+import queue
+import threading
+import multiprocessing
+import gymnasium as gym
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CSV_FIELDS = [
+    "mode",
+    "frames_per_step",
+    "n_envs",
+    "steps_per_sec",
+    "steps_per_sec_per_env",
+    "frames_per_sec",
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "p99_ms_worst_env",
+    "cpu_percent",
+    "browser_rss_mb",
+]
+
+
+def worker(env_kwargs, steps, barrier, results):
+    """
+    Runs `steps` steps in a new env, starting once all workers are ready.
+    Puts (start time, end time, step latencies) in `results`.
+    """
+
+    env = None
+
+    try:
+        env = gym.make("local/QWOP-v1", **env_kwargs)
+        env.reset()
+        barrier.wait()
+
+        latencies = np.empty(steps)
+        time_start = time.time()
+
+        for i in range(steps):
+            t = time.perf_counter()
+            _obs, _rew, term, trunc, _info = env.step(0)
+
+            if term or trunc:
+                env.reset()
+
+            latencies[i] = time.perf_counter() - t
+
+        results.put((time_start, time.time(), latencies))
+    except Exception as e:
+        barrier.abort()
+        results.put(e)
+    finally:
+        env and env.close()
+
+
+class RSSSampler(threading.Thread):
+    """
+    Samples the total RSS of all processes started by the given processes
+    (ie. the envs' browsers, drivers and relays), keeping the max.
+    """
+
+    def __init__(self, pids, interval=1):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.max_rss = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.max_rss = max(self.max_rss, self.sample())
+
+            if self.stopped.wait(self.interval):
+                break
+
+    def sample(self):
+        rss = 0
+
+        for pid in self.pids:
+            try:
+                children = psutil.Process(pid).children(recursive=True)
+            except psutil.NoSuchProcess:
+                continue
+
+            for p in children:
+                try:
+                    rss += p.memory_info().rss
+                except psutil.NoSuchProcess:
+                    pass
+
+        return rss
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.max_rss
+
+
+def run(n_envs, steps, mode, env_kwargs):
+    # The main thread waits on the barrier as well, so that only the steps
+    # (not the browser launches) are measured
+    if mode == "process":
+        ctx = multiprocessing.get_context("fork")
+        barrier = ctx.Barrier(n_envs + 1, timeout=120)
+        results = ctx.Queue()
+        spawn = ctx.Process
+    else:
+        barrier = threading.Barrier(n_envs + 1, timeout=120)
+        results = queue.Queue()
+        spawn = threading.Thread
+
+    workers = [
+        spawn(target=worker, args=(env_kwargs, steps, barrier, results))
+        for _ in range(n_envs)
+    ]
+
+    for w in workers:
+        w.start()
+
+    sampler = None
+
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass  # a worker failed (its error is in the results)
+
+    if psutil:
+        # threads' browsers are children of this process
+        pids = [w.pid for w in workers] if mode == "process" else [os.getpid()]
+        sampler = RSSSampler(pids)
+        sampler.start()
+        psutil.cpu_percent()  # starts the measurement
+
+    runs = [results.get() for _ in workers]
+    cpu_percent = psutil.cpu_percent() if psutil else None
+    browser_rss = sampler.stop() if sampler else None
+
+    for w in workers:
+        w.join()
+
+    # the other workers fail with a BrokenBarrierError
+    errors = [r for r in runs if isinstance(r, Exception)]
+    errors.sort(key=lambda e: isinstance(e, threading.BrokenBarrierError))
+
+    if errors:
+        raise errors[0]
+
+    seconds = max(r[1] for r in runs) - min(r[0] for r in runs)
+    # (n_envs, 3): each env's own percentiles, as the envs may differ
+    percentiles = np.array([np.percentile(r[2] * 1000, [50, 95, 99]) for r in runs])
+    p50, p95, p99 = percentiles.mean(axis=0)
+    sps = n_envs * steps / seconds
+
+    return dict(
+        mode=mode,
+        frames_per_step=env_kwargs["frames_per_step"],
+        n_envs=n_envs,
+        steps_per_sec=round(sps, 2),
+        steps_per_sec_per_env=round(sps / n_envs, 2),
+        frames_per_sec=round(sps * env_kwargs["frames_per_step"], 2),
+        p50_ms=round(p50, 3),
+        p95_ms=round(p95, 3),
+        p99_ms=round(p99, 3),
+        p99_ms_worst_env=round(percentiles[:, 2].max(), 3),
+        cpu_percent=cpu_percent,
+        browser_rss_mb=browser_rss and round(browser_rss / 2**20, 1),
+    )
+
+
+def write_csv(f, rows):
+    writer = csv.DictWriter(f, CSV_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def recommend(rows, tolerance):
+    """
+    Returns the smallest env count whose aggregate steps/s is within
+    `tolerance` (a fraction) of the best one.
+    """
+
+    best = max(row["steps_per_sec"] for row in rows)
+    good = [r for r in rows if r["steps_per_sec"] >= best * (1 - tolerance)]
+    return min(r["n_envs"] for r in good)
+
+
+def benchmark_scaling(
+    env_counts, frames_per_step, steps, mode="process", csv_file=None, tolerance=0.05
+):
+    """
+    Runs 1..N envs in parallel (in separate processes or threads) for each
+    of the given frames_per_step values and measures the aggregate
+    throughput, the step latency percentiles (of each env, averaged over
+    the envs, and the worst env's p99) and (if psutil is installed) the
+    host's CPU utilisation and the browsers' memory usage.
+    Prints the results as CSV (optionally saved to `csv_file`) along with
+    the recommended env count for this host.
+    """
+
+    assert mode in ("process", "thread"), "unknown mode: %s" % mode
+    rows = []
+
+    if not psutil:
+        print("NOTE: psutil is not installed, CPU and memory usage not measured")
+
+    for fps in frames_per_step:
+        for n_envs in env_counts:
+            print("Benchmarking %d envs with frames_per_step=%d..." % (n_envs, fps))
+            env_kwargs = dict(frames_per_step=fps)
+            row = run(n_envs, steps, mode, env_kwargs)
+            print("%.2f steps/s" % row["steps_per_sec"])
+            rows.append(row)
+
+    print()
+    write_csv(sys.stdout, rows)
+
+    if csv_file:
+        with open(csv_file, "w", newline="") as f:
+            write_csv(f, rows)
+
+        print("Saved results to %s" % csv_file)
+
+    print()
+    print("Host has %d CPU cores" % os.cpu_count())
+
+    for fps in frames_per_step:
+        n_envs = recommend([r for r in rows if r["frames_per_step"] == fps], tolerance)
+        print("Recommended env count for frames_per_step=%d: %d" % (fps, n_envs))
+
+    return rows
@@ -94,6 +94,10 @@ def bootstrap():
 
     w1.maybe_write("env.yml", w1.replace_paths)
     w1.maybe_write("benchmark.yml")
+    w1.maybe_write("benchmark_scaling.yml")
+    w1.maybe_write("check_determinism.yml")
+    w1.maybe_write("check_golden.yml")
+    w1.maybe_write("perftest.yml")
     w1.maybe_write("play.yml")
     w1.maybe_write("record.yml")
     w1.maybe_write("replay.yml")
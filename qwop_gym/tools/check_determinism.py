@@ -0,0 +1,147 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import gymnasium as gym
+import numpy as np
+import hashlib
+import time
+
+from ..envs.v1.qwop_env import Snapshot
+
+
+def play_episode(env, seed, actions):
+    """
+    Plays the given actions (until termination) and returns the
+    observed data (raw where possible) as a list of bytes.
+    """
+    obs, info = env.reset(seed=seed)
+    trace = [obs.tobytes() + info["time"].tobytes() + info["distance"].tobytes()]
+    return trace + play_steps(env, actions)
+
+
+def play_steps(env, actions):
+    qwop = env.unwrapped
+    trace = []
+
+    for action in actions:
+        _obs, _rew, term, _trunc, _info = env.step(action)
+        r = qwop.last_reaction
+        flags = bytes([r.game_over, r.is_success])
+        trace.append(flags + r.time.tobytes() + r.distance.tobytes() + r.data.tobytes())
+
+        if term:
+            break
+
+    return trace
+
+
+def first_mismatch(expected, actual):
+    """Returns the first step whose data differs (None if all match)."""
+    i = next((i for i, (a, b) in enumerate(zip(expected, actual)) if a != b), None)
+
+    if i is None and len(expected) != len(actual):
+        i = min(len(expected), len(actual))
+
+    return i
+
+
+def check_restore(env, seed, actions):
+    """
+    Snapshots the game halfway through the actions and verifies that the
+    rest of the actions, replayed after restoring the snapshot, observe
+    the same data. The snapshot is restored both by id (from the page's
+    snapshot store) and from its exported state (as on another page).
+    Returns the first mismatching step of each (None if all match).
+    """
+
+    qwop = env.unwrapped
+    half = len(actions) // 2
+
+    env.reset(seed=seed)
+    play_steps(env, actions[:half])
+    snapshot = qwop.snapshot(export=True)
+    expected = play_steps(env, actions[half:])
+
+    # The page restores from the blob if there is one, else from its store
+    stored = Snapshot(
+        snapshot.id, None, snapshot.steps, snapshot.last_reward, snapshot.total_reward
+    )
+
+    results = []
+
+    for snap in [stored, snapshot]:
+        qwop.restore(snap)
+        results.append(first_mismatch(expected, play_steps(env, actions[half:])))
+
+    return results
+
+
+def play_all(env, seeds, actions, reseed_in_place):
+    env.unwrapped.reseed_in_place = reseed_in_place
+    time_start = time.time()
+    traces = [play_episode(env, seed, actions[seed]) for seed in seeds]
+    return traces, time.time() - time_start
+
+
+def check_determinism(seeds, steps):
+    """
+    Verifies that reseeding the game in-place (H_SEED) is bit-identical
+    to a fresh page load with the same seed, and that restoring a snapshot
+    (H_RES) and replaying the same actions is bit-identical as well.
+    """
+
+    env = gym.make("local/QWOP-v1")
+    env.reset()
+
+    # Same (random) actions for both runs of a seed
+    n = env.action_space.n
+    actions = {s: np.random.default_rng(s).integers(n, size=steps) for s in seeds}
+
+    try:
+        print("Playing %d episodes with page reloads..." % len(seeds))
+        expected, t_reload = play_all(env, seeds, actions, reseed_in_place=False)
+        print("Playing %d episodes with in-place reseeds..." % len(seeds))
+        actual, t_reseed = play_all(env, seeds, actions, reseed_in_place=True)
+        print("Playing %d episodes with snapshot restores..." % len(seeds))
+        restores = [check_restore(env, seed, actions[seed]) for seed in seeds]
+    finally:
+        env.close()
+
+    mismatches = 0
+
+    for seed, exp, act, restore in zip(seeds, expected, actual, restores):
+        digest = hashlib.sha256(b"".join(exp)).hexdigest()[:16]
+        i = first_mismatch(exp, act)
+
+        if i is None:
+            print("seed %d: OK (%d steps, %s)" % (seed, len(exp) - 1, digest))
+        else:
+            mismatches += 1
+            print("seed %d: MISMATCH at step %d (%s)" % (seed, i, digest))
+
+        for source, i in zip(["store", "export"], restore):
+            if i is not None:
+                mismatches += 1
+                print("seed %d: RESTORE MISMATCH (%s) at step %d" % (seed, source, i))
+
+    print("\nreload: %.2fs, reseed: %.2fs" % (t_reload, t_reseed))
+
+    if mismatches:
+        print("FAIL: %d checks mismatched" % mismatches)
+    else:
+        print("PASS: in-place reseeding and snapshot restores are deterministic")
+
+    return mismatches == 0
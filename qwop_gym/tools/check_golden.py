@@ -0,0 +1,148 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import gymnasium as gym
+import hashlib
+import pathlib
+import json
+import time
+
+from .check_determinism import play_episode
+
+CORPUS_FILE = pathlib.Path(__file__).parent / "golden_corpus.json"
+
+# The same corpus, recorded against the "synthetic" browser_mock
+SYNTHETIC_CORPUS_FILE = pathlib.Path(__file__).parent / "golden_corpus_synthetic.json"
+
+
+def load_corpus(corpus_file):
+    with open(corpus_file) as f:
+        return json.load(f)
+
+
+def save_corpus(corpus_file, corpus):
+    with open(corpus_file, "w") as f:
+        json.dump(corpus, f, indent=2)
+        f.write("\n")
+
+
+def decode_actions(actions):
+    # one hex digit per action
+    return [int(a, 16) for a in actions]
+
+
+def play_entry(env, entry):
+    """
+    Replays a corpus entry and returns its (steps, distance, time, hashes),
+    where hashes are the truncated sha256 of each step's observed data.
+    """
+
+    trace = play_episode(env, entry["seed"], decode_actions(entry["actions"]))
+    reaction = env.unwrapped.last_reaction
+    hashes = [hashlib.sha256(data).hexdigest()[:8] for data in trace]
+    return len(trace) - 1, float(reaction.distance), float(reaction.time), hashes
+
+
+def compare(expected, actual):
+    """Returns the first step whose hashes differ (None if all match)."""
+    for i, (exp, act) in enumerate(zip(expected, actual)):
+        if exp != act:
+            return i
+
+    if len(expected) != len(actual):
+        return min(len(expected), len(actual))
+
+
+def check_golden(corpus_file=None, mode="verify", runs=1):
+    """
+    Replays a corpus of fixed seeds and scripted actions, verifying that
+    each step's observation matches the recorded (golden) one and that
+    repeated runs are identical. Reports the steps/s of each run.
+    In "record" mode, the first run's results are saved as the new
+    expectations instead (this requires a real browser and the patched
+    QWOP.min.js whose behaviour is to be captured).
+    Returns True if all checks passed. In "verify" mode, entries without
+    recorded expectations count as failed checks.
+    """
+
+    assert mode in ("verify", "record"), "unknown mode: %s" % mode
+    corpus_file = corpus_file or CORPUS_FILE
+    corpus = load_corpus(corpus_file)
+    entries = corpus["entries"]
+    env = gym.make("local/QWOP-v1", **corpus["env_kwargs"])
+    failures = 0
+    unrecorded = 0
+    first_run = {}
+
+    try:
+        for run in range(runs):
+            print("Run %d of %d:" % (run + 1, runs))
+            total_steps = 0
+            time_start = time.time()
+
+            for entry in entries:
+                name = entry["name"]
+                steps, distance, gtime, hashes = play_entry(env, entry)
+                total_steps += steps
+                expected = entry.get("expected")
+                desc = "%d steps, %.2fm in %.2fs" % (steps, distance, gtime)
+
+                if mode == "record" and run == 0:
+                    entry["expected"] = dict(
+                        steps=steps, distance=distance, time=gtime, hashes=hashes
+                    )
+                    print("  %-16s RECORDED (%s)" % (name, desc))
+                elif expected is None:
+                    unrecorded += run == 0
+                    print("  %-16s UNRECORDED (%s)" % (name, desc))
+                elif (i := compare(expected["hashes"], hashes)) is not None:
+                    failures += 1
+                    exp_desc = "%d steps, %.2fm in %.2fs" % (
+                        expected["steps"],
+                        expected["distance"],
+                        expected["time"],
+                    )
+                    print("  %-16s MISMATCH at step %d (%s)" % (name, i, desc))
+                    print("  %-16s expected: %s" % ("", exp_desc))
+                else:
+                    print("  %-16s OK (%s)" % (name, desc))
+
+                # repeated runs must be identical even without expectations
+                if run == 0:
+                    first_run[name] = hashes
+                elif (i := compare(first_run[name], hashes)) is not None:
+                    failures += 1
+                    print("  %-16s NONDETERMINISTIC from step %d" % (name, i))
+
+            seconds = time.time() - time_start
+            print("  %.2f steps/s (%d steps)" % (total_steps / seconds, total_steps))
+    finally:
+        env.close()
+
+    if mode == "record":
+        save_corpus(corpus_file, corpus)
+        print("Saved expectations to %s" % corpus_file)
+
+    if unrecorded:
+        print("No expectations for %d entries (see `mode: record`)" % unrecorded)
+        failures += unrecorded
+
+    if failures:
+        print("FAIL: %d checks failed" % failures)
+    else:
+        print("PASS")
+
+    return failures == 0
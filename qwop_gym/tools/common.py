@@ -32,6 +32,9 @@ from .. import QwopEnv
 # Keys of user-defined metrics in the `info` dict
 INFO_KEYS = ("time", "distance", "avgspeed", "is_success")
 
+# Max number of recorded actions sent in a single step_many() call
+SKIP_CHUNK_SIZE = 256
+
 
 class Clock:
     """A better alternative to pygame.Clock for our use-case"""
@@ -66,6 +69,15 @@ class Replayer:
         ), f"Unexpected end of recording -- check seed, frames_per_step and steps_per_step"
         return (action, None)
 
+    def peek(self, n):
+        """Returns up to `n` of the upcoming actions without consuming them."""
+        return self.actions[self.i : self.i + n]
+
+    def skip(self, n):
+        """Consumes `n` actions."""
+        for _ in range(n):
+            self.predict(None)
+
 
 def expand_env_kwargs(env_kwargs):
     env_include_cfg = env_kwargs.pop("__include__", None)
@@ -182,7 +194,12 @@ def load_recording(recfile):
 # lead to a completely different outcome than originally observed.
 #
 # We fast-forward the "skip" episodes by disabling auto-draw and calling
-# .step() as fast as possible
+# .step() as fast as possible (or .step_many() when replaying recorded actions)
+def is_absorbed(env):
+    # An env in absorbing mode never terminates, see QwopEnv(absorbing=True)
+    return getattr(env.unwrapped, "terminal_return", None) is not None
+
+
 def skip_episode(env, steps_per_step, model):
     terminated = False
 
@@ -196,12 +213,23 @@ def skip_episode(env, steps_per_step, model):
         # no verbose wrapper => nothing to disable
         pass
 
-    while not terminated:
-        action, _ = model.predict(None)
-        for _ in range(steps_per_step):
-            _, _, terminated, _, _ = env.step(action)
-            if terminated:
-                break
+    if isinstance(model, Replayer) and hasattr(env.unwrapped, "step_many"):
+        # Bypasses any wrappers, which is OK as the env is reset afterwards
+        while not terminated:
+            actions = model.peek(SKIP_CHUNK_SIZE)
+            assert len(actions), "Unexpected end of recording"
+            pairs = [(action, steps_per_step) for action in actions]
+            _, _, term, _, _ = env.unwrapped.step_many(pairs)
+            model.skip(len(term))
+            terminated = term[-1] or is_absorbed(env)
+    else:
+        while not terminated:
+            action, _ = model.predict(None)
+            for _ in range(steps_per_step):
+                _, _, terminated, _, _ = env.step(action)
+                terminated = terminated or is_absorbed(env)
+                if terminated:
+                    break
 
     try:
         env.get_wrapper_attr("enable_verbose_wrapper")()
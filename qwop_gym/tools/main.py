@@ -155,6 +155,9 @@ def run(action, cfg, tag=None):
                     "learner_lr_schedule": cfg.get(
                         "learner_lr_schedule", "const_0.003"
                     ),
+                    "n_envs": cfg.get("n_envs", 1),
+                    "vec_env": cfg.get("vec_env", "dummy"),
+                    "seed_scheme": cfg.get("seed_scheme", "offset"),
                 }
             )
 
@@ -171,7 +174,55 @@ def run(action, cfg, tag=None):
         case "benchmark":
             from .benchmark import benchmark
 
-            benchmark(steps=cfg.get("steps", 10000))
+            benchmark(
+                steps=cfg.get("steps", 10000),
+                variants=cfg.get("variants"),
+                startup_runs=cfg.get("startup_runs", 0),
+                latency_steps=cfg.get("latency_steps", 0),
+                latency_file=cfg.get("latency_file"),
+            )
+        case "benchmark_scaling":
+            from .benchmark_scaling import benchmark_scaling
+
+            benchmark_scaling(
+                env_counts=cfg.get("env_counts", [1, 2, 4, 8]),
+                frames_per_step=cfg.get("frames_per_step", [1]),
+                steps=cfg.get("steps", 2000),
+                mode=cfg.get("mode", "process"),
+                csv_file=cfg.get("csv_file"),
+                tolerance=cfg.get("tolerance", 0.05),
+            )
+        case "perftest":
+            from .perftest import perftest
+
+            ok = perftest(
+                cases=cfg.get("cases"),
+                repeat=cfg.get("repeat", 5),
+                baseline_file=cfg.get("baseline_file"),
+                mode=cfg.get("mode", "compare"),
+                threshold=cfg.get("threshold", 0.1),
+            )
+
+            sys.exit(0 if ok else 1)
+        case "check_determinism":
+            from .check_determinism import check_determinism
+
+            ok = check_determinism(
+                seeds=cfg.get("seeds", [1, 2, 3]),
+                steps=cfg.get("steps", 1000),
+            )
+
+            sys.exit(0 if ok else 1)
+        case "check_golden":
+            from .check_golden import check_golden
+
+            ok = check_golden(
+                corpus_file=cfg.get("corpus_file"),
+                mode=cfg.get("mode", "verify"),
+                runs=cfg.get("runs", 1),
+            )
+
+            sys.exit(0 if ok else 1)
 
         case _:
             print("Unknown action: %s" % action)
@@ -278,6 +329,10 @@ action:
   train_a2c         train using Advantage Actor Critic (A2C)
   spectate          watch a trained model play QWOP, optionally recording actions
   benchmark         evaluate the actions/s achievable with this env
+  benchmark_scaling evaluate the actions/s achievable with 1..N parallel envs
+  perftest          time the env's python-side components against a baseline
+  check_determinism verify that in-place reseeds and restores are deterministic
+  check_golden      replay a corpus of scripted trajectories against recorded ones
   bootstrap         perform initial setup
   patch             apply patch to original QWOP.min.js code
   help              print this help message
@@ -14,26 +14,181 @@
 # limitations under the License.
 # =============================================================================
 
-import random
-import time
+import os
+import json
+import timeit
+import tempfile
+import contextlib
 import gymnasium as gym
+import numpy as np
 
+from . import common
+from ..envs.v1.util.wsclient import WSClientMock
+from ..wrappers.verbose_wrapper import VerboseWrapper
+from ..wrappers.record_wrapper import RecordWrapper
+
+#
+# Each case takes a mock-backed QwopEnv and a temporary directory (removed
+# after the case) and returns the function to time (called once per op)
+#
+
+
+def case_build_reaction(env, _tmpdir):
+    data = WSClientMock.RESPONSE
+    return lambda: env._build_reaction(data)
+
+
+def case_normalize(env, _tmpdir):
+    obs = env._build_reaction(WSClientMock.RESPONSE).data
+    return lambda: env._normalize(obs)
+
+
+def case_calc_reward(env, _tmpdir):
+    reaction = env._build_reaction(WSClientMock.RESPONSE)
+    last_reaction = env.noop_reaction
+    return lambda: env._calc_reward(reaction, last_reaction)
+
+
+def case_encode_action(env, _tmpdir):
+    return lambda: env._encode_action(1)
+
+
+def case_step(env, _tmpdir):
+    return _stepper(env)
+
+
+def case_verbose_wrapper(env, _tmpdir):
+    return _stepper(VerboseWrapper(env))
+
+
+def case_record_wrapper(env, tmpdir):
+    rec_file = os.path.join(tmpdir, "perftest.rec")
+    return _stepper(RecordWrapper(env, rec_file, True, None, None))
+
+
+def case_load_recording(env, tmpdir):
+    # 10 episodes of 100 random actions each
+    rng = np.random.default_rng(0)
+    actions = rng.integers(env.action_space.n, size=(10, 100))
+    rec_file = os.path.join(tmpdir, "perftest.rec")
+
+    with open(rec_file, "w") as f:
+        f.write("seed=0\n")
+        for ep_actions in actions:
+            f.write("\n".join(map(str, ep_actions)) + "\n*\n")
+
+    return lambda: common.load_recording(rec_file)
+
+
+def _stepper(env):
+    env.reset()
+
+    def step():
+        _obs, _rew, term, trunc, _info = env.step(0)
+        if term or trunc:
+            env.reset()
+
+    return step
 
-def perftest():
-    try:
-        n_steps = 100000
-        env = gym.make("QwopEnv-v2")
-        env.reset()
-        t1 = time.time()
 
-        for i in range(n_steps):
-            (obs, rew, term, trunc, inf) = env.step(random.randint(0, 3))
-            if term or trunc:
-                env.reset()
+CASES = {
+    "build_reaction": case_build_reaction,
+    "normalize": case_normalize,
+    "calc_reward": case_calc_reward,
+    "encode_action": case_encode_action,
+    "step": case_step,
+    "verbose_wrapper": case_verbose_wrapper,
+    "record_wrapper": case_record_wrapper,
+    "load_recording": case_load_recording,
+}
 
-        t2 = time.time()
-        print("Done %d in %.2fs" % (n_steps, t2 - t1))
 
-    finally:
-        if locals().get("env"):
+def measure(fn, repeat):
+    """Returns the best of `repeat` timings of `fn`, in microseconds per call."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the results next to the baseline ones.
+    Returns the names of the cases slower than the baseline by more than
+    `threshold` (a fraction, eg. 0.1 for 10%).
+    """
+
+    regressions = []
+    print("%-20s %12s %12s %10s" % ("case", "baseline us", "us", "change"))
+
+    for name, us in results.items():
+        base = baseline.get(name)
+
+        if base is None:
+            print("%-20s %12s %12.3f %10s" % (name, "-", us, "-"))
+            continue
+
+        change = us / base - 1
+        flag = ""
+
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+
+        print("%-20s %12.3f %12.3f %+9.1f%%%s" % (name, base, us, change * 100, flag))
+
+    return regressions
+
+
+def perftest(cases=None, repeat=5, baseline_file=None, mode="compare", threshold=0.1):
+    """
+    Times the python-side components of the env against a mocked browser.
+    In "save" mode, the results are saved as the new baseline. In "compare"
+    mode, they are compared against the baseline (if there is one).
+    Returns False if a case has regressed by more than `threshold`.
+    """
+
+    assert mode in ("compare", "save"), "unknown mode: %s" % mode
+    results = {}
+
+    for name in cases or CASES:
+        env = gym.make("local/QWOP-v1", browser_mock=True).unwrapped
+
+        try:
+            # VerboseWrapper prints on each step and the mock's time never
+            # advances (ie. speeds are 0/0)
+            with open(os.devnull, "w") as devnull, np.errstate(invalid="ignore"):
+                with contextlib.redirect_stdout(devnull):
+                    with tempfile.TemporaryDirectory() as tmpdir:
+                        results[name] = measure(CASES[name](env, tmpdir), repeat)
+        finally:
             env.close()
+
+        print("%-20s %12.3f us" % (name, results[name]))
+
+    print()
+
+    if mode == "save":
+        os.makedirs(os.path.dirname(baseline_file) or ".", exist_ok=True)
+
+        with open(baseline_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+        print("Saved baseline to %s" % baseline_file)
+        return True
+
+    if not baseline_file or not os.path.exists(baseline_file):
+        print("No baseline to compare against (see `mode: save`)")
+        return True
+
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, threshold)
+
+    if regressions:
+        print(
+            "\nRegressions above %d%%: %s" % (threshold * 100, ", ".join(regressions))
+        )
+        return False
+
+    return True
@@ -0,0 +1,80 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import numpy as np
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+
+class ThreadedQwopVecEnv(DummyVecEnv):
+    """
+    A DummyVecEnv which steps its envs concurrently from a thread pool.
+
+    A QwopEnv spends almost all of its step time blocked on the browser's
+    reply (with the GIL released), so threads overlap the round-trips of
+    all envs, without SubprocVecEnv's pickling and process overhead.
+    Observations are written into DummyVecEnv's preallocated buffers.
+
+    The envs themselves (ie. the browsers) are created concurrently too.
+    """
+
+    def __init__(self, env_fns, n_threads=None):
+        self.pool = ThreadPoolExecutor(n_threads or len(env_fns))
+        envs = list(self.pool.map(lambda fn: fn(), env_fns))
+        super().__init__([lambda env=env: env for env in envs])
+
+    def step_wait(self):
+        # list() re-raises any exception from the threads
+        list(self.pool.map(self._step_env, range(self.num_envs)))
+
+        return (
+            self._obs_from_buf(),
+            np.copy(self.buf_rews),
+            np.copy(self.buf_dones),
+            deepcopy(self.buf_infos),
+        )
+
+    def _step_env(self, i):
+        env = self.envs[i]
+        obs, self.buf_rews[i], terminated, truncated, info = env.step(self.actions[i])
+        self.buf_dones[i] = terminated or truncated
+        self.buf_infos[i] = info
+
+        # See DummyVecEnv.step_wait
+        info["TimeLimit.truncated"] = truncated and not terminated
+
+        if self.buf_dones[i]:
+            info["terminal_observation"] = obs
+            obs, self.reset_infos[i] = env.reset()
+
+        self._save_obs(i, obs)
+
+    def reset(self):
+        list(self.pool.map(self._reset_env, range(self.num_envs)))
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs_from_buf()
+
+    def _reset_env(self, i):
+        options = self._options[i]
+        kwargs = {"options": options} if options else {}
+        obs, self.reset_infos[i] = self.envs[i].reset(seed=self._seeds[i], **kwargs)
+        self._save_obs(i, obs)
+
+    def close(self):
+        list(self.pool.map(lambda env: env.close(), self.envs))
+        self.pool.shutdown()
@@ -108,9 +108,7 @@ def create_inf_length_env(**kwargs):
     In the event of early episode completion (i.e., the athlete falls),
     we enter an absorbing state that repeats the final observation and reward.
     """
-    env = gym.make("local/QWOP-v1", **kwargs)
-    env = AbsorbWrapper(env)
-    return env
+    return gym.make("local/QWOP-v1", **dict(kwargs, absorbing=True))
 
 
 #
@@ -14,11 +14,14 @@
 # limitations under the License.
 # =============================================================================
 
-from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
 from stable_baselines3.common import logger
 from stable_baselines3.common.callbacks import BaseCallback, CheckpointCallback
 from stable_baselines3.common.utils import safe_mean
 from gymnasium.wrappers import TimeLimit
+import gymnasium as gym
+import numpy as np
 import os
 import math
 import stable_baselines3
@@ -26,6 +29,7 @@ import sb3_contrib
 
 
 from . import common
+from .threaded_vec_env import ThreadedQwopVecEnv
 
 
 class LogCallback(BaseCallback):
@@ -81,6 +85,44 @@ def init_model(
     return model
 
 
+def derive_seeds(seed, n_envs, seed_scheme):
+    match seed_scheme:
+        case "same":
+            return [seed] * n_envs
+        case "offset":
+            return [(seed + i) % 2**31 for i in range(n_envs)]
+        case "spawn":
+            seqs = np.random.SeedSequence(seed).spawn(n_envs)
+            return [int(s.generate_state(1)[0] % 2**31) for s in seqs]
+        case _:
+            raise Exception("Unexpected seed_scheme: %s" % seed_scheme)
+
+
+# Same as SB3's make_vec_env, but with a different seed for each env
+def create_env_fn(seed, max_episode_steps):
+    # "local/QWOP-v1" is registered at runtime (see main.py), so the spec
+    # itself is passed to SubprocVecEnv's (spawned) subprocesses
+    spec = gym.spec("local/QWOP-v1")
+
+    def env_fn():
+        env = gym.make(spec, seed=seed)
+        env = Monitor(env, info_keywords=common.INFO_KEYS)
+        return TimeLimit(env, max_episode_steps=max_episode_steps)
+
+    return env_fn
+
+
+def ensure_subproc_compatible(env_kwargs):
+    # SubprocVecEnv's workers are daemonic processes, which can't start
+    # the WSServer process of the "relay" transport
+    transport = env_kwargs.get("transport", "relay")
+
+    if transport == "relay" and not env_kwargs.get("browser_mock"):
+        raise ValueError(
+            'vec_env="subproc" requires the "direct", "cdp" or "hub" transport'
+        )
+
+
 #
 # A note about tensorboard logging of user-defined values in `info`:
 #
@@ -96,16 +138,22 @@ def init_model(
 # access to the SB3 log - and that's how user-defined values in `info`
 # (set by QwopEnv) can be logged into tensorboard.
 #
-def create_vec_env(seed, max_episode_steps):
-    venv = make_vec_env(
-        "local/QWOP-v1",
-        env_kwargs={"seed": seed},
-        monitor_kwargs={"info_keywords": common.INFO_KEYS},
-        wrapper_class=TimeLimit,
-        wrapper_kwargs={"max_episode_steps": max_episode_steps},
-    )
-
-    return venv
+def create_vec_env(
+    seed, max_episode_steps, n_envs=1, vec_env="dummy", seed_scheme="offset"
+):
+    seeds = derive_seeds(seed, n_envs, seed_scheme)
+    env_fns = [create_env_fn(s, max_episode_steps) for s in seeds]
+
+    match vec_env:
+        case "dummy":
+            return DummyVecEnv(env_fns)
+        case "subproc":
+            ensure_subproc_compatible(gym.spec("local/QWOP-v1").kwargs)
+            return SubprocVecEnv(env_fns)
+        case "threaded":
+            return ThreadedQwopVecEnv(env_fns)
+        case _:
+            raise Exception("Unexpected vec_env: %s" % vec_env)
 
 
 def train_sb3(
@@ -120,8 +168,11 @@ def train_sb3(
     n_checkpoints,
     out_dir_template,
     log_tensorboard,
+    n_envs=1,
+    vec_env="dummy",
+    seed_scheme="offset",
 ):
-    venv = create_vec_env(seed, max_episode_steps)
+    venv = create_vec_env(seed, max_episode_steps, n_envs, vec_env, seed_scheme)
 
     try:
         out_dir = common.out_dir_from_template(out_dir_template, seed, run_id)
@@ -0,0 +1,57 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import asyncio
+import gymnasium as gym
+import pytest
+
+from qwop_gym import AsyncQwopEnv
+
+
+def test_not_a_gym_env():
+    env = AsyncQwopEnv(browser_mock=True)
+    assert not isinstance(env, gym.Env)
+    assert not hasattr(env, "step_many")
+    asyncio.run(env.close())
+
+
+def test_step_async():
+    async def play():
+        envs = [AsyncQwopEnv(browser_mock=True, seed=i + 1) for i in range(3)]
+        await asyncio.gather(*[env.reset() for env in envs])
+
+        for env in envs:
+            env.step_async(env.action_space.sample())
+
+        results = await asyncio.gather(*[env.step_wait() for env in envs])
+        await asyncio.gather(*[env.close() for env in envs])
+        return results
+
+    for obs, _rew, _term, _trunc, _info in asyncio.run(play()):
+        assert obs.shape == (60,)
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        (dict(transport="direct"), "relay transport only"),
+        (dict(browser_mock="synthetic"), "replayed or synthetic"),
+        (dict(browser_mock=True, capture_file="x.bin"), "capture_file"),
+    ],
+)
+def test_unsupported_args(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        AsyncQwopEnv(**kwargs)
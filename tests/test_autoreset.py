@@ -0,0 +1,85 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import numpy as np
+import pytest
+
+from qwop_gym import QwopEnv, QwopVecEnv
+
+MOCK_KWARGS = dict(episode_steps=[5, 5])
+
+
+class Counter:
+    """Counts the messages sent to a client"""
+
+    def __init__(self, client):
+        self.client = client
+        self.sent = 0
+
+    def send(self, data):
+        self.sent += 1
+        return self.client.send(data)
+
+    def close(self):
+        self.client.close()
+
+
+def make_env(autoreset):
+    # not via gym.make, which has an `autoreset` argument of its own
+    env = QwopEnv(
+        seed=1, browser_mock="synthetic", mock_kwargs=MOCK_KWARGS, autoreset=autoreset
+    )
+    env.client = Counter(env.client)
+    return env
+
+
+@pytest.mark.parametrize("step_many", [False, True])
+def test_autoreset(step_many):
+    envs = [make_env(autoreset=False), make_env(autoreset=True)]
+    results = []
+
+    for env in envs:
+        env.reset()
+
+        if step_many:
+            env.step_many([(1, 255)])
+        else:
+            for _ in range(5):
+                _obs, _rew, term, _trunc, _info = env.step(1)
+            assert term
+
+        sent = env.client.sent
+        obs, _info = env.reset()
+        results.append((obs, env.client.sent - sent))
+        env.close()
+
+    (obs, sent), (obs_autoreset, sent_autoreset) = results
+    np.testing.assert_array_equal(obs, obs_autoreset)
+    assert (sent, sent_autoreset) == (1, 0)
+
+
+def test_vec_autoreset():
+    venv = QwopVecEnv(num_envs=2, browser_mock="synthetic", mock_kwargs=MOCK_KWARGS)
+    venv.client = Counter(venv.client)
+    venv.reset()
+
+    for _ in range(5):
+        _obs, _rew, term, _trunc, info = venv.step(np.array([1, 1]))
+
+    assert term.all()
+    assert all(o is not None for o in info["final_observation"])
+    assert venv.client.sent == 6
+    venv.close()
@@ -0,0 +1,87 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+
+import struct
+import numpy as np
+import pytest
+
+from qwop_gym.envs.v1.util.wsproto import WSProto, trailer, stamp, stamps, now_ms
+from qwop_gym.tools import benchmark
+from qwop_gym.tools.benchmark import (
+    STAGES,
+    stage_durations,
+    run_timed,
+    benchmark_startup,
+)
+
+
+def fake_page(cmd):
+    # What ws.js's handle_cmd_timed replies with: an OBS + 4 more stamps
+    count = cmd[-1]
+    t = now_ms()
+    obs = bytes([WSProto.H_OBS]) + bytes(WSProto.OBS_SIZE - 1)
+    return obs + cmd[WSProto.CMD_SIZE : -1] + struct.pack("=4dB", t, t, t, t, count + 4)
+
+
+def timestamps(relay):
+    cmd = bytes(WSProto.CMD_SIZE) + trailer(now_ms(), now_ms())
+    cmd = stamp(cmd) if relay else cmd
+    obs = fake_page(cmd)
+    obs = stamp(obs) if relay else obs
+    return stamps(obs, WSProto.OBS_SIZE) + (now_ms(), now_ms())
+
+
+@pytest.mark.parametrize(
+    "relay, first, last",
+    [(True, "py_to_relay", "relay_to_py"), (False, "py_to_js", "js_to_py")],
+)
+def test_stage_names(relay, first, last):
+    ts = np.array([timestamps(relay)] * 3)
+    durations = stage_durations(ts)
+    names = list(durations)
+
+    assert len(names) == ts.shape[1]  # stages + total
+    assert names[1] == first
+    assert names[-3] == last
+    assert names[-2] == "decode"
+
+
+def test_stage_names_match_stamp_counts():
+    for k, names in STAGES.items():
+        assert len(names) == k + 1
+
+
+def test_run_timed_synthetic():
+    durations = run_timed(50, dict(browser_mock="synthetic"))
+    assert list(durations) == STAGES[2] + ["total"]
+    assert all(len(d) == 50 for d in durations.values())
+
+
+@pytest.mark.parametrize("running", [False, True])
+def test_startup_warm_time_with_hub(capsys, monkeypatch, running):
+    # browser_mock ignores the transport, but the report does not
+    monkeypatch.setattr(benchmark, "hub_is_running", lambda port: running)
+    benchmark_startup(3, [dict(browser_mock=True, transport="hub")])
+    out = capsys.readouterr().out.splitlines()
+    float(out[1].split()[-1])
+    assert ("hub was already running" in out[-2]) == running
+
+
+def test_startup_no_warm_time_without_hub(capsys):
+    benchmark_startup(2, [dict(browser_mock=True)])
+    row = capsys.readouterr().out.splitlines()[1]
+    assert row.split()[-1] == "-"
@@ -0,0 +1,29 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import pytest
+
+from qwop_gym.tools.benchmark_scaling import CSV_FIELDS, run
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_run_synthetic(mode):
+    env_kwargs = dict(frames_per_step=1, browser_mock="synthetic")
+    row = run(3, 50, mode, env_kwargs)
+
+    assert list(row) == CSV_FIELDS
+    assert row["n_envs"] == 3
+    assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"] <= row["p99_ms_worst_env"]
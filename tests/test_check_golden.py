@@ -0,0 +1,60 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import pytest
+
+from qwop_gym.tools.check_golden import (
+    CORPUS_FILE,
+    SYNTHETIC_CORPUS_FILE,
+    check_golden,
+    load_corpus,
+    save_corpus,
+)
+
+
+@pytest.fixture
+def corpus_file(tmp_path):
+    # The shipped corpus, replayed against a synthetic game
+    corpus = load_corpus(CORPUS_FILE)
+    corpus["env_kwargs"]["browser_mock"] = "synthetic"
+    corpus["entries"] = corpus["entries"][:2]
+    path = tmp_path / "corpus.json"
+    save_corpus(path, corpus)
+    return path
+
+
+def test_verify_fails_without_expectations(corpus_file):
+    assert not check_golden(corpus_file, mode="verify", runs=2)
+
+
+def test_record_then_verify(corpus_file):
+    assert check_golden(corpus_file, mode="record")
+    assert all(e["expected"] for e in load_corpus(corpus_file)["entries"])
+    assert check_golden(corpus_file, mode="verify", runs=2)
+
+
+def test_synthetic_corpus():
+    corpus = load_corpus(SYNTHETIC_CORPUS_FILE)
+    assert all(e["expected"] for e in corpus["entries"])
+    assert check_golden(SYNTHETIC_CORPUS_FILE, mode="verify")
+
+
+def test_verify_mismatch(corpus_file):
+    check_golden(corpus_file, mode="record")
+    corpus = load_corpus(corpus_file)
+    corpus["entries"][0]["expected"]["hashes"][5] = "00000000"
+    save_corpus(corpus_file, corpus)
+    assert not check_golden(corpus_file, mode="verify")
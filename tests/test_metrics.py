@@ -0,0 +1,56 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import gymnasium as gym
+import pytest
+
+from qwop_gym.envs.v1.util import metrics
+
+
+@pytest.fixture
+def env():
+    metrics.REGISTRY.enabled = True
+    env = gym.make("local/QWOP-v1", browser_mock="synthetic").unwrapped
+    yield env
+    env.close()
+    metrics.REGISTRY.enabled = False
+
+
+def count(histogram):
+    return sum(histogram.counts)
+
+
+def test_step_many_normalize_is_timed(env):
+    env.reset()
+    before = count(metrics.NORMALIZE)
+    env.step_many([0, 1, 2])
+    assert count(metrics.NORMALIZE) == before + 1
+
+
+def test_reloads_are_counted(env):
+    resets, reloads = metrics.RESETS.value, metrics.RELOADS.value
+    env.reset()
+    env.reset(seed=5)  # a page reload
+    assert metrics.RESETS.value == resets + 2
+    assert metrics.RELOADS.value == reloads + 1
+
+
+def test_prometheus_format(env):
+    env.reset()
+    env.step(0)
+    text = metrics.REGISTRY.to_prometheus()
+    assert "# TYPE qwop_env_steps_total counter" in text
+    assert 'qwop_client_roundtrip_seconds_bucket{le="+Inf"}' in text
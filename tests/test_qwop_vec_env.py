@@ -0,0 +1,33 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import pytest
+
+from qwop_gym import QwopVecEnv
+from qwop_gym.envs.v1.util.wsproto import WSProto, to_bytes
+
+
+@pytest.mark.parametrize("header", [WSProto.H_SEED, WSProto.H_SAV, WSProto.H_RES])
+def test_single_game_messages_rejected(header):
+    venv = QwopVecEnv(num_envs=2, browser_mock="synthetic", seed=1)
+    venv.reset()
+
+    with pytest.raises(Exception, match="Unsupported header for 2 games"):
+        venv.client.send(to_bytes(header) + to_bytes(1, 4))
+
+    # the games are still usable
+    venv.reset(seed=5)
+    venv.close()
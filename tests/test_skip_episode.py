@@ -0,0 +1,43 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import gymnasium as gym
+import pytest
+
+from qwop_gym.tools import common
+
+
+class Looper:
+    """A model which never stops walking"""
+
+    def predict(self, _obs):
+        return (1, None)
+
+
+@pytest.mark.parametrize("model", [common.Replayer([1] * 1000), Looper()])
+def test_skip_episode_absorbing(model):
+    env = gym.make(
+        "local/QWOP-v1",
+        browser_mock="synthetic",
+        mock_kwargs=dict(episode_steps=[10, 10]),
+        absorbing=True,
+    )
+    env.reset()
+    common.skip_episode(env, 1, model)
+
+    assert common.is_absorbed(env)
+    assert env.unwrapped.steps == 10
+    env.close()
@@ -0,0 +1,85 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from qwop_gym.tools.check_determinism import check_restore
+
+
+@pytest.fixture
+def env():
+    env = gym.make("local/QWOP-v1", browser_mock="synthetic", seed=1)
+    yield env
+    env.close()
+
+
+def test_synthetic_restore_is_deterministic():
+    mock_kwargs = dict(episode_steps=[1000, 1000])
+    env = gym.make("local/QWOP-v1", browser_mock="synthetic", mock_kwargs=mock_kwargs)
+    actions = np.random.default_rng(0).integers(env.action_space.n, size=100)
+    assert check_restore(env, 1, actions) == [None, None]
+    env.close()
+
+
+def test_synthetic_restore_two_seeds_one_page():
+    mock_kwargs = dict(episode_steps=[1000, 1000])
+    env = gym.make("local/QWOP-v1", browser_mock="synthetic", mock_kwargs=mock_kwargs)
+    env.unwrapped.reseed_in_place = True
+    actions = np.random.default_rng(0).integers(env.action_space.n, size=100)
+
+    for seed in [1, 2]:
+        assert check_restore(env, seed, actions) == [None, None]
+
+    env.close()
+
+
+def test_synthetic_blob_takes_precedence(env):
+    qwop = env.unwrapped
+    env.reset(seed=1)
+    stale = qwop.snapshot()
+    env.step(1)
+    snapshot = qwop.snapshot(export=True)
+    obs = env.step(1)[0].copy()
+
+    # the blob is used even if the id refers to another stored state
+    snapshot.id = stale.id
+    qwop.restore(snapshot)
+    assert (env.step(1)[0] == obs).all()
+
+
+def test_synthetic_exported_snapshot(env):
+    qwop = env.unwrapped
+    env.reset(seed=1)
+    snapshot = qwop.snapshot(export=True)
+    obs = [env.step(1)[0].copy() for _ in range(5)]
+
+    # restored on another page
+    other = gym.make("local/QWOP-v1", browser_mock="synthetic", seed=2).unwrapped
+    other.reset(seed=2)
+    other.restore(snapshot)
+    assert all((a == other.step(1)[0]).all() for a in obs)
+    other.close()
+
+
+def test_mock_exported_snapshot():
+    env = gym.make("local/QWOP-v1", browser_mock=True).unwrapped
+    env.reset()
+    obs = env.step(1)[0].copy()
+    snapshot = env.snapshot(export=True)
+    assert (env.restore(snapshot)[0] == obs).all()
+    env.close()
@@ -0,0 +1,83 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+
+def make_env(**kwargs):
+    mock_kwargs = dict(episode_steps=[10, 10])
+    return gym.make(
+        "local/QWOP-v1", browser_mock="synthetic", mock_kwargs=mock_kwargs, **kwargs
+    ).unwrapped
+
+
+def test_steps_counted_until_game_over():
+    env = make_env()
+    env.reset()
+    _obs, _rew, term, _trunc, _info = env.step_many([(1, 3), (2, 255)])
+
+    assert list(term) == [False, True]
+    assert env.steps == 10
+    env.close()
+
+
+def test_steps_counted():
+    env = make_env()
+    env.reset()
+    env.step_many([(1, 3), (2, 4)])
+    env.step_many([0, 1])
+    assert env.steps == 9
+    env.close()
+
+
+@pytest.mark.parametrize("repeat", [0, 256])
+def test_invalid_repeat(repeat):
+    env = make_env()
+    env.reset()
+
+    with pytest.raises(ValueError, match="repeat must be 1..255"):
+        env.step_many([(1, 3), (2, repeat)])
+
+    env.close()
+
+
+def test_rewards_same_as_step():
+    pairs = [(1, 3), (2, 5), (0, 255)]
+    env, other = make_env(seed=1), make_env(seed=1)
+    env.reset()
+    other.reset()
+    _obs, rewards, _term, _trunc, _info = env.step_many(pairs)
+
+    expected = []
+
+    for action, repeat in pairs:
+        reward = 0
+
+        for _ in range(repeat):
+            _obs, rew, term, _trunc, _info = other.step(action)
+            reward += rew
+            if term:
+                break
+
+        expected.append(reward)
+
+    np.testing.assert_allclose(rewards, expected, rtol=1e-4)
+    np.testing.assert_allclose(env.total_reward, other.total_reward, rtol=1e-4)
+    assert env.steps == other.steps == 10
+    env.close()
+    other.close()
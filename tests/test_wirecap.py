@@ -0,0 +1,93 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import gymnasium as gym
+import pytest
+
+from qwop_gym.envs.v1.util.wsproto import WSProto
+from qwop_gym.envs.v1.util.wirecap import CaptureClient, ReplayClient, read_capture
+
+
+class EchoClient:
+    # Replies with the request's header and flags (tagged as a response)
+    def send(self, data):
+        return b"R" + data[:2]
+
+    def close(self):
+        pass
+
+
+def cmd(flags):
+    return bytes([WSProto.H_CMD, flags]) + bytes(WSProto.CMD_SIZE - 2)
+
+
+STEP = cmd(WSProto.CMD_STP)
+STEP_Q = cmd(WSProto.CMD_STP | WSProto.CMD_K_Q)
+RESET = cmd(WSProto.CMD_RST)
+DRAW = cmd(WSProto.CMD_DRW)
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    client = CaptureClient(EchoClient(), path)
+
+    for req in [RESET, STEP, STEP_Q, DRAW, STEP]:
+        client.send(req)
+
+    # the frames are readable before the client is closed
+    assert len(read_capture(path)) == 10
+    client.close()
+    return path
+
+
+def test_replay_matches_cmd_flags(capture):
+    client = ReplayClient(capture)
+
+    # steps are never answered with the response to a RST or a DRW
+    assert client.send(STEP) == b"R" + STEP[:2]
+    assert client.send(DRAW) == b"R" + DRAW[:2]
+    assert client.send(STEP_Q) == b"R" + STEP[:2]
+    assert client.send(RESET) == b"R" + RESET[:2]
+
+
+def test_replay_unknown_request(capture):
+    client = ReplayClient(capture)
+
+    with pytest.raises(Exception, match="No captured response"):
+        client.send(cmd(WSProto.CMD_IMG))
+
+
+def test_replay_strict(capture):
+    client = ReplayClient(capture, strict=True)
+    assert client.send(RESET) == b"R" + RESET[:2]
+    assert client.send(STEP) == b"R" + STEP[:2]
+
+    with pytest.raises(Exception, match="Request #2 does not match"):
+        client.send(STEP)
+
+
+def test_replay_env(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    env = gym.make("local/QWOP-v1", browser_mock=True, capture_file=path)
+    captured = [env.reset()[0]] + [env.step(1)[0] for _ in range(5)]
+    env.close()
+
+    env = gym.make("local/QWOP-v1", browser_mock=path, mock_kwargs=dict(strict=True))
+    replayed = [env.reset()[0]] + [env.step(1)[0] for _ in range(5)]
+    env.close()
+
+    assert all((a == b).all() for a, b in zip(captured, replayed))
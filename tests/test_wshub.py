@@ -0,0 +1,201 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import json
+import types
+import socket
+import asyncio
+import threading
+import pytest
+import websockets
+
+from qwop_gym.envs.v1.util import wshub
+from qwop_gym.envs.v1.util.wsclient import WSClient
+from qwop_gym.envs.v1.util.wsproto import WSProto, to_bytes
+from qwop_gym.envs.v1.util.wshub import (
+    WSHub,
+    WSHubClient,
+    ensure_hub_running,
+    hub_is_running,
+    is_poolable,
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def test_aliases_are_not_leaked():
+    hub = WSHub(0, "WARN")
+    session = types.SimpleNamespace(id=1, page_sid=1)
+    hub.sessions[1] = session
+
+    # handed out, returned to the pool, handed out again
+    hub._rekey(session, 2)
+    hub._rekey(session, 3)
+    hub._rekey(session, 4)
+    assert hub.aliases == {1: 4}
+    assert hub.sessions == {4: session}
+
+    # page reloaded with the new id
+    hub._unalias(session)
+    assert hub.aliases == {}
+    assert session.page_sid == 4
+
+
+def test_hub_is_running():
+    port = free_port()
+    hub = WSHub(port, "WARN")
+    started = threading.Event()
+    stop = None
+
+    async def serve():
+        nonlocal stop
+        stop = asyncio.get_running_loop().create_future()
+
+        async with websockets.serve(hub.handler, "localhost", port):
+            started.set()
+            await stop
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),))
+    thread.start()
+    started.wait(5)
+
+    try:
+        assert hub_is_running(port)
+    finally:
+        loop.call_soon_threadsafe(stop.set_result, None)
+        thread.join()
+        loop.close()
+
+
+def test_hub_is_running_other_server():
+    # a port in use by something else is not a hub
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        s.listen()
+        assert not hub_is_running(s.getsockname()[1])
+
+
+class FakeProc:
+    def __init__(self, exitcode):
+        self.exitcode = exitcode
+
+    def poll(self):
+        return self.exitcode
+
+    def kill(self):
+        pass
+
+
+@pytest.mark.parametrize("exitcode", [1, None])
+def test_ensure_hub_running_race(monkeypatch, exitcode):
+    # the hub comes up on the 3rd probe (after the one before starting it)
+    probes = iter([False, False, True])
+    monkeypatch.setattr(wshub, "hub_is_running", lambda port: next(probes))
+    monkeypatch.setattr(wshub.subprocess, "Popen", lambda *_, **__: proc)
+    proc = FakeProc(exitcode)
+
+    if exitcode is None:
+        assert ensure_hub_running(1, "WARN") is proc
+    else:
+        # lost the race for the port to a hub started by another env
+        assert ensure_hub_running(1, "WARN") is None
+
+
+def test_ensure_hub_running_timeout(monkeypatch):
+    monkeypatch.setattr(wshub, "hub_is_running", lambda port: False)
+    monkeypatch.setattr(wshub.subprocess, "Popen", lambda *_, **__: FakeProc(1))
+
+    with pytest.raises(Exception, match="Timed out waiting for WSHub"):
+        ensure_hub_running(1, "WARN", timeout=0.3)
+
+
+def test_hub_client_gives_up(monkeypatch):
+    # nothing is listening on the port
+    monkeypatch.setattr(wshub, "ensure_hub_running", lambda *args: None)
+    client = WSHubClient.__new__(WSHubClient)
+    client.session = 1
+    client.config = dict(seed=1)
+    client.loglevel = "ERROR"
+    client.max_retries = 0
+
+    with pytest.raises(Exception, match="Giving up"):
+        WSClient.__init__(client, free_port(), "ERROR", threading.Event())
+
+
+def pooled_session(hub, sid, config, reply):
+    quit = []
+    session = types.SimpleNamespace(
+        id=sid,
+        page_sid=sid,
+        key=json.dumps(config, sort_keys=True),
+        js_ready=asyncio.Event(),
+        pooled=True,
+        poolable=is_poolable(config),
+        seed=0,
+        browser=types.SimpleNamespace(quit=lambda: quit.append(True)),
+        quit=quit,
+    )
+
+    async def request(_session, data):
+        assert data[0] == WSProto.H_SEED
+        return reply
+
+    session.js_ready.set()
+    hub.sessions[sid] = session
+    hub.pools.setdefault(session.key, []).append(session)
+    hub._request = request
+    return session
+
+
+def test_checkout_reseeds():
+    hub = WSHub(0, "WARN")
+    config = dict(browser="browser")
+    session = pooled_session(hub, 1, config, to_bytes(WSProto.H_OBS) + bytes(249))
+
+    assert asyncio.run(hub._checkout(2, 42, config)) is session
+    assert hub.sessions == {2: session}
+    assert (session.id, session.seed, session.pooled) == (2, 42, False)
+
+
+def test_checkout_reseed_error():
+    hub = WSHub(0, "WARN")
+    config = dict(browser="browser")
+    session = pooled_session(hub, 1, config, to_bytes(WSProto.H_ERR) + b" error")
+
+    with pytest.raises(Exception, match="Failed to reseed pooled session 2"):
+        asyncio.run(hub._checkout(2, 42, config))
+
+    # the page is not handed out (nor reused) with the wrong seed
+    assert hub.sessions == {}
+    assert session.quit == [True]
+
+
+def test_vec_pages_are_not_pooled():
+    hub = WSHub(0, "WARN")
+    config = dict(browser="browser", n_games=4)
+    session = pooled_session(hub, 1, config, to_bytes(WSProto.H_OBS))
+    hub.pools.clear()
+    assert asyncio.run(hub._checkout(2, 42, config)) is None
+
+    # closing the env quits its page instead of pooling it
+    asyncio.run(hub._close_session(session))
+    assert hub.pools[session.key] == []
+    assert session.quit == [True]
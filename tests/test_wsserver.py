@@ -0,0 +1,83 @@
+# =============================================================================
+# Copyright 2023 Simeon Manolov <s.manolloff@gmail.com>.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =============================================================================
+
+import time
+import types
+import asyncio
+
+from qwop_gym.envs.v1.util.wsserver import WSServer, Peer
+
+
+class SlowBrowser:
+    """A browser whose page loads take a while (and block)"""
+
+    def build_url(self, port, seed, session=0):
+        return "url?seed=%d" % seed
+
+    def load_tab(self, url, name):
+        time.sleep(0.3)
+        return name
+
+    def activate(self, handle):
+        time.sleep(0.3)
+
+
+def make_server():
+    server = WSServer.__new__(WSServer)
+    server.logger = types.SimpleNamespace(info=lambda msg: None)
+    server.port = 1
+    server.seed = 1
+    server.seed_schedule = [1, 2]
+    server._browser = SlowBrowser()
+    server._browser_lock = asyncio.Lock()
+    server._tab_event = asyncio.Event()
+    server._peers = {}
+    server._jspeer = Peer("js")
+    server._jspeer.session = 0
+    server._tabpeer = Peer("js")
+    server._tabpeer.session = 1
+    server._tabpeer.seed = None
+    return server
+
+
+async def ticks_during(coro):
+    # Counts the event loop's 10ms ticks while `coro` runs
+    ticks = 0
+    task = asyncio.create_task(coro)
+
+    while not task.done():
+        await asyncio.sleep(0.01)
+        ticks += 1
+
+    await task
+    return ticks
+
+
+def test_prefetch_does_not_block():
+    server = make_server()
+    assert asyncio.run(ticks_during(server._prefetch())) > 10
+    assert (server._tabpeer.seed, server._tabpeer.handle) == (2, "qwop-1")
+
+
+def test_swap_pages_does_not_block():
+    server = make_server()
+    server._tabpeer.seed = 2
+
+    for peer in (server._jspeer, server._tabpeer):
+        peer.ws = peer.ua = peer.handle = None
+
+    assert asyncio.run(ticks_during(server._swap_pages())) > 10
+    assert (server.seed, server._jspeer.session) == (2, 1)